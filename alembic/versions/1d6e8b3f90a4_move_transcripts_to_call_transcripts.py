@@ -0,0 +1,69 @@
+"""move transcripts out of calls into call_transcripts
+
+Revision ID: 1d6e8b3f90a4
+Revises: f2c9d41b7e60
+Create Date: 2026-10-19 15:31:12.804116
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "1d6e8b3f90a4"
+down_revision: Union[str, Sequence[str], None] = "f2c9d41b7e60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "call_transcripts",
+        sa.Column("call_id", sa.UUID(), nullable=False),
+        sa.Column("transcript", sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(["call_id"], ["calls.call_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("call_id"),
+    )
+    op.execute(
+        """
+        INSERT INTO call_transcripts (call_id, transcript)
+        SELECT call_id, transcript FROM calls
+        """
+    )
+    # The fuzzy-search index follows the text
+    op.create_index(
+        "ix_call_transcripts_transcript_gin",
+        "call_transcripts",
+        ["transcript"],
+        postgresql_using="gin",
+        postgresql_ops={"transcript": "gin_trgm_ops"},
+    )
+
+    op.drop_index("ix_calls_transcript_gin", table_name="calls")
+    op.drop_column("calls", "transcript")
+    # Dropping a column leaves its bytes in every tuple until rewritten.
+    # Run `VACUUM FULL calls` (or pg_repack) in a maintenance window to get
+    # the narrow heap.
+
+
+def downgrade():
+    op.add_column("calls", sa.Column("transcript", sa.Text(), nullable=True))
+    op.execute(
+        """
+        UPDATE calls c SET transcript = t.transcript
+        FROM call_transcripts t
+        WHERE t.call_id = c.call_id
+        """
+    )
+    op.create_index(
+        "ix_calls_transcript_gin",
+        "calls",
+        ["transcript"],
+        postgresql_using="gin",
+        postgresql_ops={"transcript": "gin_trgm_ops"},
+    )
+    op.drop_index("ix_call_transcripts_transcript_gin", table_name="call_transcripts")
+    op.drop_table("call_transcripts")
@@ -0,0 +1,31 @@
+"""add sentiment timeline to calls
+
+Revision ID: 4b7d2e9c1a36
+Revises: 096bb2134412
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4b7d2e9c1a36"
+down_revision: Union[str, Sequence[str], None] = "096bb2134412"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column(
+        "calls",
+        sa.Column("sentiment_timeline", postgresql.JSONB(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column("calls", "sentiment_timeline")
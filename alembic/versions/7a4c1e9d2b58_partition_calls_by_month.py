@@ -0,0 +1,171 @@
+"""partition calls and call_transcripts by month on start_time
+
+Revision ID: 7a4c1e9d2b58
+Revises: 1d6e8b3f90a4
+Create Date: 2026-10-19 16:42:05.311270
+
+"""
+
+from datetime import date, datetime, timezone
+from typing import List, Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7a4c1e9d2b58"
+down_revision: Union[str, Sequence[str], None] = "1d6e8b3f90a4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same as app.core.partitions.PARTITION_MONTHS_AHEAD's default
+MONTHS_AHEAD = 3
+
+
+def _add_months(month: date, n: int) -> date:
+    m = month.year * 12 + month.month - 1 + n
+    return date(m // 12, m % 12 + 1, 1)
+
+
+def _months() -> List[date]:
+    """
+    Every month from the oldest call to MONTHS_AHEAD months from now.
+    """
+    first, last = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT date_trunc('month', min(start_time))::date, "
+                "date_trunc('month', max(start_time))::date FROM calls"
+            )
+        )
+        .one()
+    )
+    today = datetime.now(timezone.utc).date()
+    ahead = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    month = first or date(today.year, today.month, 1)
+    last = max(last or ahead, ahead)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+def _create_partitions(parent: str, prefix: str, months: List[date]) -> None:
+    for month in months:
+        op.execute(
+            f"CREATE TABLE {prefix}_p{month:%Y_%m} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+            f"TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+
+
+def _create_indexes() -> None:
+    # Declared on the parents, so every partition (now and future) gets them
+    op.create_index("ix_calls_agent_id", "calls", ["agent_id"])
+    op.create_index("ix_calls_start_time", "calls", ["start_time"])
+    op.create_index("ix_calls_topic_cluster", "calls", ["topic_cluster"])
+    op.create_index(
+        "ix_call_transcripts_transcript_gin",
+        "call_transcripts",
+        ["transcript"],
+        postgresql_using="gin",
+        postgresql_ops={"transcript": "gin_trgm_ops"},
+    )
+
+
+def upgrade():
+    # The partition key is part of the primary key, so it can't be NULL
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM calls WHERE start_time IS NULL) THEN
+                RAISE EXCEPTION 'calls without start_time cannot be partitioned; '
+                    'fix or delete them first';
+            END IF;
+        END $$
+        """
+    )
+    months = _months()
+
+    op.execute(
+        "CREATE TABLE calls_partitioned (LIKE calls INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (start_time)"
+    )
+    op.execute("ALTER TABLE calls_partitioned ALTER COLUMN start_time SET NOT NULL")
+    op.execute(
+        """
+        CREATE TABLE call_transcripts_partitioned (
+            call_id uuid NOT NULL,
+            start_time timestamp without time zone NOT NULL,
+            transcript text
+        ) PARTITION BY RANGE (start_time)
+        """
+    )
+    _create_partitions("calls_partitioned", "calls", months)
+    _create_partitions("call_transcripts_partitioned", "call_transcripts", months)
+
+    # Copied before the keys and indexes exist: one bulk build per index at
+    # the end instead of maintaining them row by row
+    op.execute("INSERT INTO calls_partitioned SELECT * FROM calls")
+    op.execute(
+        """
+        INSERT INTO call_transcripts_partitioned (call_id, start_time, transcript)
+        SELECT t.call_id, c.start_time, t.transcript
+        FROM call_transcripts t JOIN calls c USING (call_id)
+        """
+    )
+    op.drop_table("call_transcripts")
+    op.drop_table("calls")
+    op.rename_table("calls_partitioned", "calls")
+    op.rename_table("call_transcripts_partitioned", "call_transcripts")
+
+    op.create_primary_key("calls_pkey", "calls", ["call_id", "start_time"])
+    op.create_primary_key(
+        "call_transcripts_pkey", "call_transcripts", ["call_id", "start_time"]
+    )
+    op.create_foreign_key(
+        "call_transcripts_call_id_start_time_fkey",
+        "call_transcripts",
+        "calls",
+        ["call_id", "start_time"],
+        ["call_id", "start_time"],
+        ondelete="CASCADE",
+        onupdate="CASCADE",
+    )
+    _create_indexes()
+
+
+def downgrade():
+    op.execute("CREATE TABLE calls_plain (LIKE calls INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE calls_plain ALTER COLUMN start_time DROP NOT NULL")
+    op.execute(
+        "CREATE TABLE call_transcripts_plain (call_id uuid NOT NULL, transcript text)"
+    )
+    op.execute("INSERT INTO calls_plain SELECT * FROM calls")
+    op.execute(
+        """
+        INSERT INTO call_transcripts_plain (call_id, transcript)
+        SELECT call_id, transcript FROM call_transcripts
+        """
+    )
+    # Dropping the parents drops every partition
+    op.drop_table("call_transcripts")
+    op.drop_table("calls")
+    op.rename_table("calls_plain", "calls")
+    op.rename_table("call_transcripts_plain", "call_transcripts")
+
+    op.create_primary_key("calls_pkey", "calls", ["call_id"])
+    op.create_primary_key("call_transcripts_pkey", "call_transcripts", ["call_id"])
+    op.create_foreign_key(
+        "call_transcripts_call_id_fkey",
+        "call_transcripts",
+        "calls",
+        ["call_id"],
+        ["call_id"],
+        ondelete="CASCADE",
+    )
+    _create_indexes()
@@ -0,0 +1,63 @@
+"""create agent daily rollups
+
+Revision ID: a3f19c0d5e72
+Revises: 4b7d2e9c1a36
+Create Date: 2026-10-19 11:02:17.904552
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a3f19c0d5e72"
+down_revision: Union[str, Sequence[str], None] = "4b7d2e9c1a36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "agent_daily_rollups",
+        sa.Column("agent_id", sa.String(64), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("call_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("sentiment_sum", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("sentiment_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("talk_ratio_sum", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("talk_ratio_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("duration_sum", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("agent_id", "day"),
+    )
+    op.create_index(
+        "ix_agent_daily_rollups_day", "agent_daily_rollups", ["day"], unique=False
+    )
+
+    # Backfill from existing calls; afterwards the loader and populator keep
+    # the touched days up to date.
+    op.execute(
+        """
+        INSERT INTO agent_daily_rollups
+            (agent_id, day, call_count, sentiment_sum, sentiment_count,
+             talk_ratio_sum, talk_ratio_count, duration_sum)
+        SELECT agent_id,
+               start_time::date,
+               count(*),
+               coalesce(sum(customer_sentiment_score), 0),
+               count(customer_sentiment_score),
+               coalesce(sum(agent_talk_ratio), 0),
+               count(agent_talk_ratio),
+               coalesce(sum(duration_seconds), 0)
+        FROM calls
+        WHERE agent_id IS NOT NULL AND start_time IS NOT NULL
+        GROUP BY agent_id, start_time::date
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_agent_daily_rollups_day", table_name="agent_daily_rollups")
+    op.drop_table("agent_daily_rollups")
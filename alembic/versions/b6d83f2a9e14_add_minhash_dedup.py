@@ -0,0 +1,69 @@
+"""add minhash fingerprints, duplicate clusters and deduplicated rollups
+
+Revision ID: b6d83f2a9e14
+Revises: 7a4c1e9d2b58
+Create Date: 2026-10-19 17:41:08.226391
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b6d83f2a9e14"
+down_revision: Union[str, Sequence[str], None] = "7a4c1e9d2b58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Filled by the loader, and for existing calls by the populator's
+    # catch-up step (app.core.dedup)
+    op.add_column("calls", sa.Column("minhash", sa.LargeBinary(), nullable=True))
+    op.add_column(
+        "calls",
+        sa.Column("lsh_bands", postgresql.ARRAY(sa.BigInteger), nullable=True),
+    )
+    # Same type as calls.call_id
+    op.add_column("calls", sa.Column("duplicate_of", postgresql.UUID(), nullable=True))
+    op.create_index(
+        "ix_calls_lsh_bands", "calls", ["lsh_bands"], postgresql_using="gin"
+    )
+    op.create_index("ix_calls_duplicate_of", "calls", ["duplicate_of"])
+
+    # Existing rows are the over-all-calls variant; the deduplicated ones are
+    # written on the next refresh of each day
+    op.add_column(
+        "agent_daily_rollups",
+        sa.Column(
+            "deduplicated", sa.Boolean(), nullable=False, server_default=sa.false()
+        ),
+    )
+    op.drop_constraint(
+        "agent_daily_rollups_pkey", "agent_daily_rollups", type_="primary"
+    )
+    op.create_primary_key(
+        "agent_daily_rollups_pkey",
+        "agent_daily_rollups",
+        ["agent_id", "day", "deduplicated"],
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM agent_daily_rollups WHERE deduplicated")
+    op.drop_constraint(
+        "agent_daily_rollups_pkey", "agent_daily_rollups", type_="primary"
+    )
+    op.create_primary_key(
+        "agent_daily_rollups_pkey", "agent_daily_rollups", ["agent_id", "day"]
+    )
+    op.drop_column("agent_daily_rollups", "deduplicated")
+    op.drop_index("ix_calls_duplicate_of", table_name="calls")
+    op.drop_index("ix_calls_lsh_bands", table_name="calls")
+    op.drop_column("calls", "duplicate_of")
+    op.drop_column("calls", "lsh_bands")
+    op.drop_column("calls", "minhash")
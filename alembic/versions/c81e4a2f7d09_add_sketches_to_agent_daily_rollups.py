@@ -0,0 +1,33 @@
+"""add quantile sketches to agent daily rollups
+
+Revision ID: c81e4a2f7d09
+Revises: a3f19c0d5e72
+Create Date: 2026-10-19 12:26:53.771420
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c81e4a2f7d09"
+down_revision: Union[str, Sequence[str], None] = "a3f19c0d5e72"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Sketches are built in Python; fill them for existing rows with
+#   PYTHONPATH=. python3 scripts/ai_insights_populator.py --rebuild-rollups
+def upgrade():
+    for col in ("sentiment_sketch", "talk_ratio_sketch", "duration_sketch"):
+        op.add_column(
+            "agent_daily_rollups", sa.Column(col, sa.LargeBinary(), nullable=True)
+        )
+
+
+def downgrade():
+    for col in ("duration_sketch", "talk_ratio_sketch", "sentiment_sketch"):
+        op.drop_column("agent_daily_rollups", col)
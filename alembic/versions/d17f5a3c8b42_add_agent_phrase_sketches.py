@@ -0,0 +1,50 @@
+"""add per-agent phrase sketches
+
+Revision ID: d17f5a3c8b42
+Revises: b6d83f2a9e14
+Create Date: 2026-10-19 19:12:55.604718
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d17f5a3c8b42"
+down_revision: Union[str, Sequence[str], None] = "b6d83f2a9e14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Set by the populator once a call's phrases are counted
+    op.add_column("calls", sa.Column("phrases_hash", sa.String(64), nullable=True))
+    op.create_table(
+        "agent_phrase_sketches",
+        sa.Column("agent_id", sa.String(64), nullable=False),
+        sa.Column("sketch", sa.LargeBinary(), nullable=False),
+        sa.Column(
+            "top_phrases",
+            postgresql.JSONB(),
+            nullable=False,
+            server_default=sa.text("'[]'::jsonb"),
+        ),
+        sa.Column("calls_seen", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("phrases_seen", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("agent_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("agent_phrase_sketches")
+    op.drop_column("calls", "phrases_hash")
@@ -0,0 +1,59 @@
+"""add content hash, insights model tag and embedding cache
+
+Revision ID: e5a0b7c3d218
+Revises: c81e4a2f7d09
+Create Date: 2026-10-19 13:40:05.122378
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a0b7c3d218"
+down_revision: Union[str, Sequence[str], None] = "c81e4a2f7d09"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column("calls", sa.Column("content_hash", sa.String(64), nullable=True))
+    op.add_column("calls", sa.Column("insights_hash", sa.String(64), nullable=True))
+    op.add_column("calls", sa.Column("insights_model", sa.String(255), nullable=True))
+
+    # Same digest as app.core.insights_cache.transcript_hash. insights_* stay
+    # NULL, so existing rows are reprocessed once under a model tag.
+    op.execute(
+        """
+        UPDATE calls
+        SET content_hash = encode(
+            sha256(convert_to(coalesce(transcript, ''), 'UTF8')), 'hex'
+        )
+        """
+    )
+
+    op.create_table(
+        "embedding_cache",
+        sa.Column("content_hash", sa.String(64), nullable=False),
+        sa.Column("model", sa.String(255), nullable=False),
+        sa.Column("embedding", postgresql.ARRAY(sa.Float), nullable=False),
+        sa.Column("sentiment_timeline", postgresql.JSONB(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("content_hash", "model"),
+    )
+
+
+def downgrade():
+    op.drop_table("embedding_cache")
+    op.drop_column("calls", "insights_model")
+    op.drop_column("calls", "insights_hash")
+    op.drop_column("calls", "content_hash")
@@ -0,0 +1,72 @@
+"""add composite and partial indexes on calls
+
+Revision ID: e8b15c2d7f63
+Revises: d17f5a3c8b42
+Create Date: 2026-10-19 21:06:37.418205
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e8b15c2d7f63"
+down_revision: Union[str, Sequence[str], None] = "d17f5a3c8b42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INSIGHTS_PENDING = (
+    "embedding IS NULL OR content_hash IS NULL"
+    " OR insights_hash IS DISTINCT FROM content_hash"
+)
+PHRASES_PENDING = (
+    "agent_id IS NOT NULL AND content_hash IS NOT NULL"
+    " AND phrases_hash IS DISTINCT FROM content_hash"
+)
+
+
+def upgrade():
+    # Shown needed by tests/test_query_plans.py. The composite index
+    # replaces ix_calls_agent_id (its leading column)
+    op.create_index(
+        "ix_calls_agent_id_start_time",
+        "calls",
+        ["agent_id", "start_time"],
+        postgresql_include=["customer_sentiment_score", "duplicate_of"],
+    )
+    op.drop_index("ix_calls_agent_id", table_name="calls")
+    op.create_index("ix_calls_insights_model", "calls", ["insights_model"])
+
+    # The populator's work queues, small once it has caught up
+    op.create_index(
+        "ix_calls_insights_pending",
+        "calls",
+        ["call_id"],
+        postgresql_where=sa.text(INSIGHTS_PENDING),
+    )
+    op.create_index(
+        "ix_calls_unfingerprinted",
+        "calls",
+        ["call_id"],
+        postgresql_include=["start_time"],
+        postgresql_where=sa.text("lsh_bands IS NULL"),
+    )
+    op.create_index(
+        "ix_calls_phrases_pending",
+        "calls",
+        ["call_id"],
+        postgresql_include=["start_time", "agent_id", "content_hash"],
+        postgresql_where=sa.text(PHRASES_PENDING),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_calls_phrases_pending", table_name="calls")
+    op.drop_index("ix_calls_unfingerprinted", table_name="calls")
+    op.drop_index("ix_calls_insights_pending", table_name="calls")
+    op.drop_index("ix_calls_insights_model", table_name="calls")
+    op.create_index("ix_calls_agent_id", "calls", ["agent_id"])
+    op.drop_index("ix_calls_agent_id_start_time", table_name="calls")
@@ -0,0 +1,61 @@
+"""add topic clusters and per-agent topic stats
+
+Revision ID: f2c9d41b7e60
+Revises: e5a0b7c3d218
+Create Date: 2026-10-19 15:02:41.530917
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2c9d41b7e60"
+down_revision: Union[str, Sequence[str], None] = "e5a0b7c3d218"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Filled by the populator's clustering stage
+    op.add_column("calls", sa.Column("topic_cluster", sa.Integer(), nullable=True))
+    op.create_index("ix_calls_topic_cluster", "calls", ["topic_cluster"])
+
+    op.create_table(
+        "topic_clusters",
+        sa.Column("cluster_id", sa.Integer(), nullable=False),
+        sa.Column("centroid", postgresql.ARRAY(sa.Float), nullable=False),
+        sa.Column("points_seen", sa.BigInteger(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("top_terms", postgresql.ARRAY(sa.String), nullable=False),
+        sa.Column(
+            "representative_call_ids", postgresql.ARRAY(sa.String), nullable=False
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("cluster_id"),
+    )
+    op.create_table(
+        "agent_topic_stats",
+        sa.Column("cluster_id", sa.Integer(), nullable=False),
+        sa.Column("agent_id", sa.String(64), nullable=False),
+        sa.Column("call_count", sa.Integer(), nullable=False),
+        sa.Column("sentiment_sum", sa.Float(), nullable=False),
+        sa.Column("sentiment_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("cluster_id", "agent_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("agent_topic_stats")
+    op.drop_table("topic_clusters")
+    op.drop_index("ix_calls_topic_cluster", table_name="calls")
+    op.drop_column("calls", "topic_cluster")
@@ -1,46 +1,85 @@
 from __future__ import annotations
 
+import logging
 import math
 import os
-from typing import List
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Iterator, List, Literal, Sequence
 
 import numpy as np
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import and_, func
-from sqlalchemy.orm import Session
-
-from app.db import SessionLocal
-from app.models.call import Call
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from app.core.admission import Ticket, admission, llm_slot
+from app.core.archive import fetch_archived
+from app.core.embedding_index import EmbeddingIndex, get_index
+from app.core.export import ENCODERS, EXPORT_CHUNK_ROWS, MEDIA_TYPES, parquet_available
+from app.core.fastjson import FastJSONResponse, embedding_bytes, encode_embedding
+from app.core.phrases import PHRASE_WORDS, TOP_PHRASES, normalize_phrase
+from app.core.profiling import ProfiledRoute
+from app.core.sketches import CountMinSketch, TDigest
+from app.db import get_read_db
+from app.models.call import Call, CallTranscript
+from app.models.phrase import AgentPhraseSketch
+from app.models.rollup import AgentDailyRollup
+from app.models.topic import AgentTopicStat, TopicCluster
 from app.schemas.call import (
     AgentAggregate,
+    AgentPhrasesResponse,
     AgentsLeaderboardResponse,
-    CallBase,
+    AgentTimeseriesPoint,
+    AgentTimeseriesResponse,
     CallDetail,
     CallListQuery,
     CallListResponse,
+    Histogram,
+    MetricDistribution,
+    PhraseCount,
     RecommendationItem,
+    RecommendationsBatchRequest,
+    RecommendationsBatchResponse,
     RecommendationsResponse,
+    TopicAgentSentiment,
+    TopicsResponse,
+    TopicSummary,
 )
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if OPENAI_API_KEY:
-    try:
-        import openai
+log = logging.getLogger(__name__)
 
-        openai.api_key = OPENAI_API_KEY
-    except Exception:
-        OPENAI_API_KEY = None
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+_openai = None
+
+SKETCH_QUANTILES = (0.1, 0.5, 0.9)
+
+# Nudges generated in parallel by the batch endpoint (each may be an OpenAI call)
+NUDGE_CONCURRENCY = int(os.getenv("NUDGE_CONCURRENCY", "8"))
+# Seconds an OpenAI nudge request may take before the rule-based fallback
+NUDGE_LLM_TIMEOUT = float(os.getenv("NUDGE_LLM_TIMEOUT", "10"))
+
+# The CallBase fields, read straight from the table by the list endpoint; also
+# the columns /calls/export can select (the embedding is opt-in there)
+CALL_COLUMNS = [
+    "call_id",
+    "agent_id",
+    "customer_id",
+    "language",
+    "start_time",
+    "duration_seconds",
+    "transcript",
+    "agent_talk_ratio",
+    "customer_sentiment_score",
+]
+
+# Also returned by /calls/{call_id}
+_DETAIL_EXTRA = ["embedding", "sentiment_timeline"]
 
 # API router for all `/api/v1/calls` endpoints
-router = APIRouter(prefix="/api/v1", tags=["calls"])
-
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Requests carrying the PROFILE_TOKEN are profiled (app/core/profiling.py)
+router = APIRouter(prefix="/api/v1", tags=["calls"], route_class=ProfiledRoute)
 
 
 # Helper functions
@@ -70,50 +109,215 @@ def _to_np(vec):
         return None
 
 
-def _make_nudges(call: Call, neighbors: list[Call]) -> list[str]:
+def _call_filters(
+    agent_id: str | Sequence[str] | None = None,
+    from_date: str | None = None,
+    to_date: str | None = None,
+    min_sentiment: float | None = None,
+    max_sentiment: float | None = None,
+    exclude_agent_ids: Sequence[str] | None = None,
+    languages: Sequence[str] | None = None,
+    exclude_duplicates: bool = False,
+) -> list:
     """
-    Generate ≤ 3 short coaching nudges ≤ 40 words each. If OPENAI_API_KEY is present, ask for 3 nudges; else rule-based.
+    WHERE conditions shared by the list, export and recommendations endpoints.
+    exclude_duplicates keeps one call (the earliest) per near-duplicate
+    cluster (app.core.dedup).
+    """
+    conds = []
+    if isinstance(agent_id, str):
+        conds.append(Call.agent_id == agent_id)
+    elif agent_id:
+        conds.append(Call.agent_id.in_(agent_id))
+    if exclude_agent_ids:
+        conds.append(Call.agent_id.not_in(exclude_agent_ids))
+    if languages:
+        conds.append(Call.language.in_(languages))
+    if from_date:
+        conds.append(Call.start_time >= _bound(from_date))
+    if to_date:
+        conds.append(Call.start_time <= _bound(to_date))
+    if min_sentiment is not None:
+        conds.append(Call.customer_sentiment_score >= min_sentiment)
+    if max_sentiment is not None:
+        conds.append(Call.customer_sentiment_score <= max_sentiment)
+    if exclude_duplicates:
+        conds.append(Call.duplicate_of.is_(None))
+    return conds
+
+
+def _select_calls(select_fn, names: Sequence[str]):
+    """
+    select_fn (select or Session.query) over the named call columns. The
+    transcript comes from call_transcripts, outer-joined only when asked for.
+    """
+    cols = [
+        (
+            CallTranscript.transcript.label("transcript")
+            if n == "transcript"
+            else getattr(Call, n)
+        )
+        for n in names
+    ]
+    stmt = select_fn(*cols).select_from(Call)
+    if "transcript" in names:
+        stmt = stmt.outerjoin(Call.transcript_row)
+    return stmt
+
+
+def _bound(value: str) -> datetime:
+    """
+    An ISO date / datetime query value as an aware datetime: UTC unless it
+    carries an offset. SQL filters and the embedding index both read bounds
+    through here, so a naive bound means the same instant on either path
+    (left to Postgres it would be taken in the session's time zone).
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"invalid date: {value!r}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _timestamp(value: str | None) -> float | None:
+    """
+    Seconds since the epoch of a date query value, for filtering the
+    embedding index.
+    """
+    return _bound(value).timestamp() if value else None
+
+
+def _stream_partitions(bind, stmt) -> Iterator[Sequence]:
+    """
+    Run stmt on a server-side cursor and yield rows EXPORT_CHUNK_ROWS at a time.
+    Uses its own session on the request session's engine, because the body is
+    streamed after the request's dependencies have been torn down.
+    """
+    with Session(bind=bind) as session:
+        result = session.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        for rows in result.partitions():
+            yield rows
+
+
+def _recommendation(call_id: str, similarity: float) -> RecommendationItem:
+    # float32 dot products can land a hair outside [0, 1]
+    return RecommendationItem(
+        call_id=call_id, similarity=min(max(similarity, 0.0), 1.0)
+    )
+
+
+def _ratio(total, count) -> float | None:
+    """
+    Average from a rollup sum and its count; None when nothing was counted.
+    """
+    return float(total) / int(count) if count else None
+
+
+def _distribution(
+    sketches: list[bytes | None],
+    histogram_bins: int | None,
+    value_range: tuple[float, float] | None = None,
+) -> MetricDistribution | None:
+    """
+    Merge serialized t-digests into p10 / p50 / p90 and, if asked, a histogram
+    over value_range (defaults to the merged min..max).
+    Returns None when no sketch holds any value.
     """
+    digest = TDigest.merge([TDigest.from_bytes(b) for b in sketches if b])
+    if digest.count == 0:
+        return None
+
+    p10, p50, p90 = digest.quantiles(SKETCH_QUANTILES)
+    histogram = None
+    if histogram_bins:
+        lo, hi = value_range or (digest.min, max(digest.max, digest.min + 1.0))
+        edges = np.linspace(lo, hi, histogram_bins + 1).tolist()
+        histogram = Histogram(edges=edges, counts=digest.histogram(edges))
+
+    return MetricDistribution(p10=p10, p50=p50, p90=p90, histogram=histogram)
+
+
+def _openai_module():
+    """
+    Import openai on first use, so workers that never call the LLM don't load it.
+    Returns None when no key is configured or the package can't be imported.
+    """
+    global _openai, OPENAI_API_KEY
+    if not OPENAI_API_KEY:
+        return None
+    if _openai is None:
+        try:
+            import openai
 
+            openai.api_key = OPENAI_API_KEY
+            _openai = openai
+        except Exception:
+            OPENAI_API_KEY = None
+    return _openai
+
+
+def _llm_nudges(openai, call: Call) -> list[str]:
+    """
+    Up to 3 nudges from the LLM; empty if it fails or says nothing usable.
+    """
     sent = call.customer_sentiment_score
     ratio = call.agent_talk_ratio
     transcript = (call.transcript or "")[:600]
+    try:
+        prompt = (
+            "You are a sales coaching assistant. Provide exactly three concise coaching nudges "
+            "(each <= 40 words) for a call based on:\n"
+            f"- customer_sentiment_score (−1..+1): {sent}\n"
+            f"- agent_talk_ratio (0..1): {ratio}\n"
+            f"- snippet: ```{transcript}```\n"
+            "Number them 1-3. No preamble."
+        )
 
-    if OPENAI_API_KEY:
-        try:
-            prompt = (
-                "You are a sales coaching assistant. Provide exactly three concise coaching nudges "
-                "(each <= 40 words) for a call based on:\n"
-                f"- customer_sentiment_score (−1..+1): {sent}\n"
-                f"- agent_talk_ratio (0..1): {ratio}\n"
-                f"- snippet: ```{transcript}```\n"
-                "Number them 1-3. No preamble."
-            )
+        resp = openai.ChatCompletion.create(
+            model="gpt-4-turbo",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=150,
+            temperature=0.2,
+            request_timeout=NUDGE_LLM_TIMEOUT,
+        )
 
-            resp = openai.ChatCompletion.create(
-                model="gpt-4-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=150,
-                temperature=0.2,
-            )
+        text = resp["choices"][0]["message"]["content"].strip()
 
-            text = resp["choices"][0]["message"]["content"].strip()
+        # Split lines, sanitize to <= 3 nudges
+        lines = [l.strip("-• ").strip() for l in text.splitlines() if l.strip()]
 
-            # Split lines, sanitize to <= 3 nudges
-            lines = [l.strip("-• ").strip() for l in text.splitlines() if l.strip()]
+        nudges: List[str] = []
+        for ln in lines:
+            if len(nudges) >= 3:
+                break
+            if len(ln.split()) <= 40:
+                nudges.append(ln)
 
-            nudges: List[str] = []
-            for ln in lines:
-                if len(nudges) >= 3:
-                    break
-                if len(ln.split()) <= 40:
-                    nudges.append(ln)
+        return nudges[:3]
+    except Exception:
+        log.warning("LLM nudges failed for call %s", call.call_id, exc_info=True)
+        return []
 
-            if nudges:
-                return nudges[:3]
-        except Exception as e:
-            print("e", e)
-            pass
+
+def _make_nudges(
+    call: Call, neighbors: list[Call], allow_llm: bool = True
+) -> list[str]:
+    """
+    Generate ≤ 3 short coaching nudges ≤ 40 words each. If OPENAI_API_KEY is present, ask for 3 nudges; else rule-based.
+    With allow_llm=False (a degraded request), or when every LLM slot is
+    busy, the rule-based nudges are used straight away.
+    """
+    sent = call.customer_sentiment_score
+    ratio = call.agent_talk_ratio
+
+    openai = _openai_module()
+    if openai is not None:
+        with llm_slot(allow_llm) as may_call:
+            nudges = _llm_nudges(openai, call) if may_call else []
+        if nudges:
+            return nudges
 
     # Fallback rule-based nudges
     nudges = []
@@ -150,7 +354,7 @@ def _make_nudges(call: Call, neighbors: list[Call]) -> list[str]:
 # API Endpoints
 
 
-@router.get("/calls", response_model=CallListResponse)
+@router.get("/calls", response_model=CallListResponse, response_class=FastJSONResponse)
 def get_all_calls(
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
@@ -159,7 +363,8 @@ def get_all_calls(
     to_date: str | None = None,
     min_sentiment: float | None = Query(None, ge=-1, le=1),
     max_sentiment: float | None = Query(None, ge=-1, le=1),
-    db: Session = Depends(get_db),
+    exclude_duplicates: bool = False,
+    db: Session = Depends(get_read_db),
 ):
     """
     Return a paginated list of calls.
@@ -167,71 +372,182 @@ def get_all_calls(
     - agent_id
     - date range
     - sentiment score range
+    - exclude_duplicates: one call per near-duplicate cluster
+    Rows are selected as plain columns and encoded straight to JSON, with
+    no ORM objects or pydantic models per row. The count only touches the
+    narrow calls table; transcripts are joined for the returned page only.
     """
-    q = db.query(Call)
-
-    if agent_id:
-        q = q.filter(Call.agent_id == agent_id)
-    if from_date:
-        q = q.filter(Call.start_time >= from_date)
-    if to_date:
-        q = q.filter(Call.start_time <= to_date)
-    if min_sentiment is not None:
-        q = q.filter(Call.customer_sentiment_score >= min_sentiment)
-    if max_sentiment is not None:
-        q = q.filter(Call.customer_sentiment_score <= max_sentiment)
+    conds = _call_filters(
+        agent_id,
+        from_date,
+        to_date,
+        min_sentiment,
+        max_sentiment,
+        exclude_duplicates=exclude_duplicates,
+    )
 
-    total = q.count()
-    rows: List[Call] = (
-        q.order_by(Call.start_time.desc()).limit(limit).offset(offset).all()
+    total = db.query(func.count()).select_from(Call).filter(*conds).scalar()
+    rows = (
+        _select_calls(db.query, CALL_COLUMNS)
+        .filter(*conds)
+        .order_by(Call.start_time.desc())
+        .limit(limit)
+        .offset(offset)
+        .all()
     )
+    return FastJSONResponse({"total": total, "items": [r._asdict() for r in rows]})
 
-    items = [
-        CallBase(
-            call_id=str(r.call_id),
-            agent_id=r.agent_id,
-            customer_id=r.customer_id,
-            language=r.language,
-            start_time=r.start_time,
-            duration_seconds=r.duration_seconds,
-            transcript=r.transcript,
-            agent_talk_ratio=r.agent_talk_ratio,
-            customer_sentiment_score=r.customer_sentiment_score,
+
+# Declared before /calls/{call_id} so "export" isn't taken for a call id
+@router.get("/calls/export")
+def export_calls(
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    columns: str | None = Query(None, description="comma-separated column names"),
+    include_embedding: bool = False,
+    agent_id: str | None = None,
+    from_date: str | None = None,
+    to_date: str | None = None,
+    min_sentiment: float | None = Query(None, ge=-1, le=1),
+    max_sentiment: float | None = Query(None, ge=-1, le=1),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Stream every call matching the list filters as NDJSON, CSV or Parquet.
+    - Rows come from a server-side cursor in fixed-size chunks, so memory
+      stays flat whatever the result size
+    - `columns` picks a subset of the list columns; embeddings are added
+      only with include_embedding (float32 lists in Parquet)
+    """
+    names = (
+        [c.strip() for c in columns.split(",") if c.strip()]
+        if columns
+        else list(CALL_COLUMNS)
+    )
+    unknown = [n for n in names if n not in CALL_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"unknown columns: {', '.join(unknown)}"
         )
-        for r in rows
-    ]
-    return CallListResponse(total=total, items=rows)
+    if include_embedding:
+        names.append("embedding")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="parquet export requires pyarrow")
+
+    stmt = (
+        _select_calls(select, names)
+        .where(
+            *_call_filters(agent_id, from_date, to_date, min_sentiment, max_sentiment)
+        )
+        .order_by(Call.start_time.desc())
+    )
+    body = ENCODERS[format](names, _stream_partitions(db.get_bind(), stmt))
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="calls.{format}"'},
+    )
 
 
-@router.get("/calls/{call_id}", response_model=CallDetail)
-def get_call(call_id: str, db: Session = Depends(get_db)):
+@router.get(
+    "/calls/{call_id}", response_model=CallDetail, response_class=FastJSONResponse
+)
+def get_call(
+    call_id: str,
+    embedding_format: Literal["json", "b64f32"] = "json",
+    db: Session = Depends(get_read_db),
+):
     """
     Fetch full details of a single call by its ID.
+    - embedding_format=b64f32 returns the embedding as base64 of its
+      little-endian float32 bytes instead of a JSON float list
+    - Calls moved to the archive tier are read from there (archived=true)
     """
-    call = db.query(Call).filter(Call.call_id == call_id).first()
-    if not call:
-        raise HTTPException(status_code=404, detail="call not found")
-    return CallDetail(
-        call_id=str(call.call_id),
-        agent_id=call.agent_id,
-        customer_id=call.customer_id,
-        language=call.language,
-        start_time=call.start_time,
-        duration_seconds=call.duration_seconds,
-        transcript=call.transcript,
-        agent_talk_ratio=call.agent_talk_ratio,
-        customer_sentiment_score=call.customer_sentiment_score,
-        embedding=call.embedding,
+    call = (
+        db.query(Call)
+        .options(joinedload(Call.transcript_row))
+        .filter(Call.call_id == call_id)
+        .first()
+    )
+    if call:
+        row = {n: getattr(call, n) for n in CALL_COLUMNS + _DETAIL_EXTRA}
+        archived = False
+    else:
+        found = fetch_archived(call_id)
+        if found is None:
+            raise HTTPException(status_code=404, detail="call not found")
+        row, archived = found, True
+    return FastJSONResponse(
+        {
+            **{n: row[n] for n in CALL_COLUMNS},
+            "call_id": str(row["call_id"]),
+            "embedding": encode_embedding(row["embedding"], embedding_format),
+            "sentiment_timeline": row["sentiment_timeline"],
+            "archived": archived,
+        }
+    )
+
+
+@router.get(
+    "/calls/{call_id}/embedding",
+    response_class=Response,
+    responses={200: {"content": {"application/octet-stream": {}}}},
+)
+def get_call_embedding(call_id: str, db: Session = Depends(get_read_db)):
+    """
+    The call's embedding as raw little-endian float32 bytes
+    (application/octet-stream), for clients that pull vectors in bulk.
+    The dimension is in the X-Embedding-Dim header. Archived calls are
+    read from the archive tier.
+    """
+    row = db.query(Call.embedding).filter(Call.call_id == call_id).first()
+    if row is not None:
+        embedding = row.embedding
+    else:
+        archived = fetch_archived(call_id)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="call not found")
+        embedding = archived["embedding"]
+    if not embedding:
+        raise HTTPException(status_code=409, detail="call missing embedding")
+    return Response(
+        content=embedding_bytes(embedding),
+        media_type="application/octet-stream",
+        headers={"X-Embedding-Dim": str(len(embedding))},
     )
 
 
 @router.get("/calls/{call_id}/recommendations", response_model=RecommendationsResponse)
-def get_recommendations(call_id: str, db: Session = Depends(get_db)):
+def get_recommendations(
+    call_id: str,
+    agent_id: List[str] | None = Query(None, description="only these agents"),
+    exclude_agent_id: List[str] | None = Query(None, description="not these agents"),
+    language: List[str] | None = Query(None),
+    from_date: str | None = None,
+    to_date: str | None = None,
+    min_sentiment: float | None = Query(None, ge=-1, le=1),
+    max_sentiment: float | None = Query(None, ge=-1, le=1),
+    exclude_duplicates: bool = False,
+    # Before db: a queued request must not hold a session
+    ticket: Ticket = Depends(admission("recommendations")),
+    db: Session = Depends(get_read_db),
+):
     """
     Find the top 5 most similar calls (based on cosine similarity of embeddings)
     and generate 3 coaching nudges for the agent.
+    Neighbours can be restricted with the list filters (agents to include or
+    exclude, language, date and sentiment ranges). With the preloaded index
+    they are applied as a mask over its metadata columns before scoring.
+    exclude_duplicates drops near-duplicates of other calls and the base
+    call's own cluster, so templated copies don't crowd out real neighbours.
+    Admission-controlled (app.core.admission): 503 with Retry-After when
+    the route is saturated, rule-based nudges when it is under pressure.
     """
-    base = db.query(Call).filter(Call.call_id == call_id).first()
+    base = (
+        db.query(Call)
+        .options(joinedload(Call.transcript_row))
+        .filter(Call.call_id == call_id)
+        .first()
+    )
     if not base:
         raise HTTPException(status_code=404, detail="call not found")
     if not base.embedding:
@@ -240,29 +556,74 @@ def get_recommendations(call_id: str, db: Session = Depends(get_db)):
     base_vec = _to_np(base.embedding)
     if base_vec is None:
         raise HTTPException(status_code=409, detail="invalid base embedding")
+    # The base's cluster root; its other members are duplicates already
+    base_root = str(base.duplicate_of) if base.duplicate_of else None
+
+    index = get_index()
+    if index is not None:
+        # Preloaded matrix: one product against every embedded call the
+        # filters keep
+        mask = index.mask(
+            agent_ids=agent_id,
+            exclude_agent_ids=exclude_agent_id,
+            languages=language,
+            from_ts=_timestamp(from_date),
+            to_ts=_timestamp(to_date),
+            min_sentiment=min_sentiment,
+            max_sentiment=max_sentiment,
+            exclude_duplicates=exclude_duplicates,
+        )
+        if exclude_duplicates and base_root is not None:
+            pos = index.positions([base_root])[0]
+            if pos >= 0:
+                mask = mask.copy() if mask is not None else np.ones(len(index), bool)
+                mask[pos] = False
+        top = index.top_k(base_vec, 5, exclude=str(base.call_id), mask=mask)
+        top_ids = [cid for cid, _ in top]
+        similar_calls: List[Call] = (
+            db.query(Call).filter(Call.call_id.in_(top_ids)).all() if top_ids else []
+        )
+    else:
+        # fetch other calls with embeddings
+        skip_ids = [call_id]
+        if exclude_duplicates and base_root is not None:
+            skip_ids.append(base_root)
+        similar_calls = (
+            db.query(Call)
+            .filter(and_(Call.call_id.not_in(skip_ids), Call.embedding.isnot(None)))
+            .filter(
+                *_call_filters(
+                    agent_id,
+                    from_date,
+                    to_date,
+                    min_sentiment,
+                    max_sentiment,
+                    exclude_agent_ids=exclude_agent_id,
+                    languages=language,
+                    exclude_duplicates=exclude_duplicates,
+                )
+            )
+            .limit(1000)
+            .all()
+        )
 
-    # fetch other calls with embeddings
-    similar_calls: List[Call] = (
-        db.query(Call)
-        .filter(and_(Call.call_id != call_id, Call.embedding.isnot(None)))
-        .limit(1000)
-        .all()
-    )
+        scored: list[tuple[str, float]] = []
+        for c in similar_calls:
+            vec = _to_np(c.embedding)
+            if vec is None:
+                continue
+            sim = _cosine_similarity_calculator(base_vec, vec)
+            scored.append((str(c.call_id), sim))
 
-    scored: list[tuple[str, float]] = []
-    for c in similar_calls:
-        vec = _to_np(c.embedding)
-        if vec is None:
-            continue
-        sim = _cosine_similarity_calculator(base_vec, vec)
-        scored.append((str(c.call_id), sim))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        top = scored[:5]
 
-    scored.sort(key=lambda x: x[1], reverse=True)
-    top = scored[:5]
-    rec_items = [RecommendationItem(call_id=cid, similarity=sim) for cid, sim in top]
+    rec_items = [_recommendation(cid, sim) for cid, sim in top]
 
     nudges: list[str] = _make_nudges(
-        base, [c for c in similar_calls if str(c.call_id) in {cid for cid, _ in top}]
+        base,
+        [c for c in similar_calls if str(c.call_id) in {cid for cid, _ in top}],
+        allow_llm=not ticket.degraded,
     )
 
     return RecommendationsResponse(
@@ -272,35 +633,296 @@ def get_recommendations(call_id: str, db: Session = Depends(get_db)):
     )
 
 
+@router.post("/recommendations:batch", response_model=RecommendationsBatchResponse)
+def get_recommendations_batch(
+    body: RecommendationsBatchRequest,
+    ticket: Ticket = Depends(admission("recommendations_batch")),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Recommendations for many calls at once (e.g. a whole shift):
+    - One query fetches every base call, one more every neighbour
+    - All bases are scored against the embedding set with one matrix-matrix
+      product and a row-wise top-k (the preloaded index, or the same
+      1000-call candidate set as the single-call endpoint)
+    - Nudges are generated concurrently, NUDGE_CONCURRENCY at a time
+      (rule-based when the route is under pressure)
+    Unknown calls and calls without an embedding are listed in `missing`.
+    exclude_duplicates works as on the single-call endpoint.
+    """
+    call_ids = list(dict.fromkeys(body.call_ids))
+    # Transcripts are loaded up front: the nudge threads must not lazy-load
+    # through the shared session
+    calls = (
+        db.query(Call)
+        .options(selectinload(Call.transcript_row))
+        .filter(Call.call_id.in_(call_ids))
+    )
+    found = {str(c.call_id): c for c in calls if c.embedding}
+    bases = [found[cid] for cid in call_ids if cid in found]
+    missing = [cid for cid in call_ids if cid not in found]
+    if not bases:
+        return RecommendationsBatchResponse(items=[], missing=missing)
+
+    index = get_index()
+    mask = None
+    if index is None:
+        candidates = (
+            db.query(Call.call_id, Call.embedding)
+            .filter(
+                Call.embedding.isnot(None),
+                *_call_filters(exclude_duplicates=body.exclude_duplicates),
+            )
+            .limit(1000)
+            .all()
+        )
+        index = EmbeddingIndex(
+            np.asarray([str(c[0]) for c in candidates], dtype=str),
+            EmbeddingIndex.normalize(
+                np.asarray([c[1] for c in candidates], dtype=np.float32)
+            ),
+        )
+    elif body.exclude_duplicates:
+        mask = index.mask(exclude_duplicates=True)
+    queries = np.asarray([b.embedding for b in bases], dtype=np.float32)
+    exclude = [str(b.call_id) for b in bases]
+    # With exclude_duplicates, a base's own cluster root is dropped from its
+    # row; one spare neighbour keeps k results when it comes up
+    roots = [
+        str(b.duplicate_of) if body.exclude_duplicates and b.duplicate_of else None
+        for b in bases
+    ]
+    spare = 1 if body.exclude_duplicates else 0
+    tops = [
+        [(cid, sim) for cid, sim in top if cid != root][: body.k]
+        for top, root in zip(
+            index.top_k_batch(queries, body.k + spare, exclude=exclude, mask=mask),
+            roots,
+        )
+    ]
+
+    neighbour_ids = {cid for top in tops for cid, _ in top}
+    neighbours: dict[str, Call] = {}
+    if neighbour_ids:
+        neighbours = {
+            str(c.call_id): c
+            for c in db.query(Call).filter(Call.call_id.in_(neighbour_ids))
+        }
+
+    def nudges_for(pair: tuple[Call, list[tuple[str, float]]]) -> list[str]:
+        base, top = pair
+        return _make_nudges(
+            base,
+            [neighbours[cid] for cid, _ in top if cid in neighbours],
+            allow_llm=not ticket.degraded,
+        )
+
+    with ThreadPoolExecutor(max_workers=NUDGE_CONCURRENCY) as pool:
+        nudges = list(pool.map(nudges_for, zip(bases, tops)))
+
+    items = [
+        RecommendationsResponse(
+            base_call_id=str(base.call_id),
+            recommendations=[_recommendation(cid, sim) for cid, sim in top],
+            coaching_nudges=base_nudges,
+        )
+        for base, top, base_nudges in zip(bases, tops, nudges)
+    ]
+    return RecommendationsBatchResponse(items=items, missing=missing)
+
+
 @router.get("/analytics/agents", response_model=AgentsLeaderboardResponse)
-def get_agents_leaderboard(db: Session = Depends(get_db)):
+def get_agents_leaderboard(
+    from_date: date | None = None,
+    to_date: date | None = None,
+    histogram_bins: int | None = Query(None, ge=1, le=50),
+    dedupe: bool = False,
+    db: Session = Depends(get_read_db),
+):
     """
     Return per-agent aggregated metrics:
-    - Average customer sentiment
-    - Average agent talk ratio
+    - Average customer sentiment, talk ratio and duration
+    - p10 / p50 / p90 of each (and optional histograms)
     - Total number of calls
     Sorted by number of calls (descending).
+    Answered from the daily rollups: sums are added up and the per-day
+    sketches merged, so the cost follows the number of agent-days, not calls.
+    With dedupe, each near-duplicate cluster counts once (the rollups kept
+    over the earliest call of every cluster).
     """
-    # Aggregate by agent: avg sentiment, avg talk ratio, count
-    rows = (
-        db.query(
-            Call.agent_id,
-            func.avg(Call.customer_sentiment_score),
-            func.avg(Call.agent_talk_ratio),
-            func.count(Call.call_id),
+    r = AgentDailyRollup
+    q = db.query(r).filter(r.deduplicated == dedupe)
+    if from_date:
+        q = q.filter(r.day >= from_date)
+    if to_date:
+        q = q.filter(r.day <= to_date)
+
+    per_agent: dict[str, list[AgentDailyRollup]] = defaultdict(list)
+    for row in q:
+        per_agent[row.agent_id].append(row)
+
+    items = []
+    for agent_id, days in per_agent.items():
+        calls = sum(d.call_count for d in days)
+        items.append(
+            AgentAggregate(
+                agent_id=agent_id,
+                avg_sentiment=_ratio(
+                    sum(d.sentiment_sum for d in days),
+                    sum(d.sentiment_count for d in days),
+                ),
+                avg_talk_ratio=_ratio(
+                    sum(d.talk_ratio_sum for d in days),
+                    sum(d.talk_ratio_count for d in days),
+                ),
+                total_calls=calls,
+                avg_duration_seconds=_ratio(sum(d.duration_sum for d in days), calls),
+                sentiment=_distribution(
+                    [d.sentiment_sketch for d in days], histogram_bins, (-1.0, 1.0)
+                ),
+                talk_ratio=_distribution(
+                    [d.talk_ratio_sketch for d in days], histogram_bins, (0.0, 1.0)
+                ),
+                duration_seconds=_distribution(
+                    [d.duration_sketch for d in days], histogram_bins
+                ),
+            )
         )
-        .group_by(Call.agent_id)
-        .order_by(func.count(Call.call_id).desc())
-        .all()
-    )
+
+    items.sort(key=lambda a: a.total_calls, reverse=True)
+    return AgentsLeaderboardResponse(items=items)
+
+
+@router.get("/analytics/agents/timeseries", response_model=AgentTimeseriesResponse)
+def get_agents_timeseries(
+    from_date: date | None = None,
+    to_date: date | None = None,
+    bucket: Literal["day", "week", "month"] = "day",
+    agent_id: str | None = None,
+    dedupe: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Return per-agent metrics per day, week or month.
+    Answered from the daily rollups only: buckets are sums of rollup rows,
+    averages are sum / count over the bucket. dedupe counts each
+    near-duplicate cluster once, as on the leaderboard.
+    """
+    r = AgentDailyRollup
+    bucket_start = func.date_trunc(bucket, r.day).label("bucket_start")
+
+    q = db.query(
+        r.agent_id,
+        bucket_start,
+        func.sum(r.call_count),
+        func.sum(r.sentiment_sum),
+        func.sum(r.sentiment_count),
+        func.sum(r.talk_ratio_sum),
+        func.sum(r.talk_ratio_count),
+        func.sum(r.duration_sum),
+    ).filter(r.deduplicated == dedupe)
+    if agent_id:
+        q = q.filter(r.agent_id == agent_id)
+    if from_date:
+        q = q.filter(r.day >= from_date)
+    if to_date:
+        q = q.filter(r.day <= to_date)
+
+    rows = q.group_by(r.agent_id, bucket_start).order_by(r.agent_id, bucket_start)
 
     items = [
-        AgentAggregate(
-            agent_id=r[0],
-            avg_sentiment=(float(r[1]) if r[1] is not None else None),
-            avg_talk_ratio=(float(r[2]) if r[2] is not None else None),
-            total_calls=int(r[3]),
+        AgentTimeseriesPoint(
+            agent_id=row[0],
+            bucket_start=row[1].date(),
+            total_calls=int(row[2]),
+            avg_sentiment=_ratio(row[3], row[4]),
+            avg_talk_ratio=_ratio(row[5], row[6]),
+            avg_duration_seconds=_ratio(row[7], row[2]),
         )
-        for r in rows
+        for row in rows
     ]
-    return AgentsLeaderboardResponse(items=items)
+    return AgentTimeseriesResponse(bucket=bucket, items=items)
+
+
+@router.get("/analytics/agents/{agent_id}/phrases", response_model=AgentPhrasesResponse)
+def get_agent_phrases(
+    agent_id: str,
+    k: int = Query(20, ge=1, le=TOP_PHRASES),
+    words: int | None = Query(None, ge=1, le=PHRASE_WORDS),
+    phrase: List[str] | None = Query(None, description="also estimate these"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    An agent's most frequent phrases over every call the populator has
+    counted, optionally only those of `words` words.
+    - Read from the agent's precomputed heavy hitters: one row, no scan
+    - Any other phrase (?phrase=refund&phrase=cancel) is estimated from the
+      agent's count-min sketch (app.core.phrases)
+    Counts can be over by at most error_bound, never under.
+    """
+    row = db.get(AgentPhraseSketch, agent_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="no phrases counted for agent")
+
+    sketch = CountMinSketch.from_bytes(row.sketch)
+    top = [
+        PhraseCount(phrase=p, count=c)
+        for p, c in row.top_phrases
+        if words is None or len(p.split()) == words
+    ]
+    lookups = []
+    if phrase:
+        wanted = [w for w in (normalize_phrase(p) for p in phrase) if w]
+        lookups = [
+            PhraseCount(phrase=p, count=c)
+            for p, c in zip(wanted, sketch.estimate(wanted))
+        ]
+    return AgentPhrasesResponse(
+        agent_id=agent_id,
+        calls_seen=row.calls_seen,
+        phrases_seen=row.phrases_seen,
+        error_bound=sketch.error_bound,
+        items=top[:k],
+        lookups=lookups,
+    )
+
+
+@router.get("/analytics/topics", response_model=TopicsResponse)
+def get_topics(agent_id: str | None = None, db: Session = Depends(get_read_db)):
+    """
+    Return the topic clusters the populator maintains, largest first:
+    - Size, top terms and the calls closest to each topic's centroid
+    - Per-agent call count and average customer sentiment within the topic
+    With agent_id, only that agent's stats (and topics they handled) are kept.
+    Answered from topic_clusters and agent_topic_stats only.
+    """
+    stats = db.query(AgentTopicStat)
+    if agent_id:
+        stats = stats.filter(AgentTopicStat.agent_id == agent_id)
+
+    per_topic: dict[int, list[TopicAgentSentiment]] = defaultdict(list)
+    for st in stats:
+        per_topic[st.cluster_id].append(
+            TopicAgentSentiment(
+                agent_id=st.agent_id,
+                total_calls=st.call_count,
+                avg_sentiment=_ratio(st.sentiment_sum, st.sentiment_count),
+            )
+        )
+
+    items = []
+    for topic in db.query(TopicCluster).order_by(TopicCluster.size.desc()):
+        agents = per_topic.get(topic.cluster_id, [])
+        if agent_id and not agents:
+            continue
+        agents.sort(key=lambda a: a.total_calls, reverse=True)
+        items.append(
+            TopicSummary(
+                cluster_id=topic.cluster_id,
+                size=topic.size,
+                top_terms=list(topic.top_terms or []),
+                representative_call_ids=list(topic.representative_call_ids or []),
+                agents=agents,
+            )
+        )
+    return TopicsResponse(items=items)
@@ -1,56 +1,282 @@
 import asyncio
 import json
-import random
+import logging
+import os
+import time
 from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
 
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketState
 
-from app.db import SessionLocal
+from app.core.live import (
+    LiveCall,
+    call_exists,
+    close_call,
+    embed_call,
+    get_live,
+    ingest_allowed,
+    open_call,
+    score_windows,
+    store_call,
+)
+from app.core.sentiment import overall_score
+from app.db import get_db, get_read_db
 from app.models.call import Call
+from app.schemas.call import LiveCallStart
+
+log = logging.getLogger(__name__)
 
 ws_router = APIRouter()
 
+STREAM_TICKS = 120  # once per second for ~2 minutes
+# Seconds between frames (shorter for load tests)
+STREAM_INTERVAL = float(os.getenv("WS_STREAM_INTERVAL", "1"))
+
+# Stream counters of this worker, reported by /healthz/ws
+_streams = {
+    "active": 0,
+    "peak": 0,
+    "opened": 0,
+    "completed": 0,
+    "disconnected": 0,
+    "frames": 0,
+    "send_s": 0.0,
+    "send_max_s": 0.0,
+}
+
+
+def stream_stats() -> dict:
+    """
+    Open, finished and dropped streams, and how long sending a frame takes
+    (a slow reader shows up as a long send once its buffers are full).
+    """
+    frames = _streams["frames"]
+    return {
+        "active": _streams["active"],
+        "peak": _streams["peak"],
+        "opened": _streams["opened"],
+        "completed": _streams["completed"],
+        "disconnected": _streams["disconnected"],
+        "frames": frames,
+        "send_mean_ms": round(_streams["send_s"] * 1000 / frames, 3) if frames else 0.0,
+        "send_max_ms": round(_streams["send_max_s"] * 1000, 3),
+        "interval_s": STREAM_INTERVAL,
+    }
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+async def _send(websocket: WebSocket, payload: dict) -> None:
+    sent = time.perf_counter()
+    await websocket.send_text(json.dumps(payload))
+    took = time.perf_counter() - sent
+    _streams["frames"] += 1
+    _streams["send_s"] += took
+    _streams["send_max_s"] = max(_streams["send_max_s"], took)
 
 
 @ws_router.websocket("/ws/sentiment/{call_id}")
 async def ws_sentiment(
-    websocket: WebSocket, call_id: str, db: Session = Depends(get_db)
+    websocket: WebSocket, call_id: str, db: Session = Depends(get_read_db)
 ):
     """
     - Accepts a WebSocket connection at /ws/sentiment/{call_id}
-    - Seeds the stream from the stored sentiment (or a small positive baseline)
-    - Emits an updated sentiment value once per second for ~2 minutes
-    - Values follow a bounded random walk in [-1, 1]
+    - A call being ingested right now (/ws/ingest) streams live: the segments
+      scored so far, then each new one as soon as it is scored, until the
+      call ends
+    - Otherwise replays the call's stored per-segment sentiment timeline in order,
+      one value per second for at least ~2 minutes, stretching short
+      timelines so every segment is held for an equal share of the stream
+    - Calls without a timeline stream their overall score (or a small positive baseline)
     """
     await websocket.accept()
 
-    call = db.query(Call).filter(Call.call_id == call_id).first()
-    base = (
-        call.customer_sentiment_score
-        if call and call.customer_sentiment_score is not None
-        else 0.1
-    )
-    value = float(base)
+    live = get_live(call_id)
+    timeline = []
+    if live is None:
+        call = db.query(Call).filter(Call.call_id == call_id).first()
+        timeline = (call.sentiment_timeline if call else None) or []
+        if not timeline:
+            base = (
+                call.customer_sentiment_score
+                if call and call.customer_sentiment_score is not None
+                else 0.1
+            )
+            timeline = [[0, 0, float(base)]]
 
+    _streams["opened"] += 1
+    _streams["active"] += 1
+    _streams["peak"] = max(_streams["peak"], _streams["active"])
     try:
-        for _ in range(120):  # once per second for ~2 minutes
-
-            step = random.uniform(-0.08, 0.08)
-            value = max(-1.0, min(1.0, value + step))
-            payload = {
-                "call_id": call_id,
-                "sentiment": round(value, 4),
-                "ts": datetime.now(timezone.utc).isoformat(),
-            }
-            await websocket.send_text(json.dumps(payload))
-            await asyncio.sleep(1)
+        if live is not None:
+            frames = live.subscribe()
+            try:
+                while (frame := await frames.get()) is not None:
+                    await _send(websocket, frame)
+            finally:
+                live.unsubscribe(frames)
+        else:
+            ticks = max(STREAM_TICKS, len(timeline))
+            for tick in range(ticks):
+                segment = tick * len(timeline) // ticks
+                start, end, value = timeline[segment]
+                payload = {
+                    "call_id": call_id,
+                    "sentiment": round(max(-1.0, min(1.0, float(value))), 4),
+                    "segment": segment,
+                    "span": [int(start), int(end)],
+                    "ts": datetime.now(timezone.utc).isoformat(),
+                }
+                await _send(websocket, payload)
+                await asyncio.sleep(STREAM_INTERVAL)
+        # End of stream: without a close frame the viewer would wait forever
+        await websocket.close()
+        _streams["completed"] += 1
     except WebSocketDisconnect:
+        _streams["disconnected"] += 1
         return
+    finally:
+        _streams["active"] -= 1
+
+
+async def _receive(websocket: WebSocket) -> dict:
+    message = json.loads(await websocket.receive_text())
+    if not isinstance(message, dict):
+        raise ValueError("expected a JSON object")
+    return message
+
+
+async def _next_chunk(websocket: WebSocket) -> Optional[str]:
+    """
+    Text of the next chunk message, None on "end".
+    """
+    message = await _receive(websocket)
+    if message.get("type") == "end":
+        return None
+    text = message.get("text")
+    if message.get("type") != "chunk" or not isinstance(text, str):
+        raise ValueError('expected {"type": "chunk", "text": ...} or {"type": "end"}')
+    return text
+
+
+async def _reject(websocket: WebSocket, code: int, reason: str) -> None:
+    await websocket.send_text(json.dumps({"type": "error", "detail": reason}))
+    await websocket.close(code=code, reason=reason[:120])
+
+
+def _ingest_token(websocket: WebSocket) -> Optional[str]:
+    # Browsers can't set headers on a WebSocket, hence the query parameter
+    auth = websocket.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth[len("bearer ") :].strip()
+    return websocket.query_params.get("token")
+
+
+@ws_router.websocket("/ws/ingest/{call_id}")
+async def ws_ingest(websocket: WebSocket, call_id: str, db: Session = Depends(get_db)):
+    """
+    - Accepts a live call's transcript at /ws/ingest/{call_id} as JSON messages:
+      {"type": "start", "agent_id", "customer_id", ...} first (LiveCallStart),
+      then {"type": "chunk", "text"} as the call goes on, then {"type": "end"}
+    - Answers each chunk with the running talk ratio and the sentiment
+      segments it completed; viewers of /ws/sentiment/{call_id} get the same
+      segments as they are scored
+    - On "end", or when the client goes away, scores the rest, embeds the
+      transcript and stores the call with its insights (app.core.live);
+      "end" is answered with the stored scores, then the server closes
+    - Requires the INGEST_TOKEN, as `Authorization: Bearer <token>` or
+      `?token=`; without INGEST_TOKEN set, ingestion is off
+    - An existing call is only overwritten when "start" has "replace": true
+    - Closes with 4401 without a valid token, 1008 on a malformed stream
+      (nothing is stored), 4409 if the call is already being ingested or
+      stored (and not to be replaced), 1011 if the call failed
+    The session only holds a DB connection to look up and store the call.
+    """
+    await websocket.accept()
+    if not ingest_allowed(_ingest_token(websocket)):
+        await _reject(websocket, 4401, "a valid ingest token is required")
+        return
+    try:
+        UUID(call_id)
+        message = await _receive(websocket)
+        if message.pop("type", None) != "start":
+            raise ValueError('the first message must be {"type": "start", ...}')
+        start = LiveCallStart.model_validate(message)
+    except ValueError as e:
+        await _reject(websocket, 1008, str(e))
+        return
+    except WebSocketDisconnect:
+        return
+
+    call = LiveCall(call_id, **start.model_dump())
+    if not open_call(call):
+        await _reject(websocket, 4409, "call is already being ingested")
+        return
+    if not call.replace and await run_in_threadpool(call_exists, db, call_id):
+        close_call(call, "discarded")
+        await _reject(
+            websocket, 4409, 'call already exists; send "replace": true to overwrite'
+        )
+        return
+
+    outcome = "failed"
+    ended = False
+    try:
+        try:
+            while True:
+                try:
+                    text = await _next_chunk(websocket)
+                except ValueError as e:
+                    outcome = "discarded"
+                    await _reject(websocket, 1008, str(e))
+                    return
+                if text is None:
+                    ended = True
+                    break
+                call.append(text)
+                scored = await score_windows(call)
+                progress = {
+                    "type": "progress",
+                    "chars": call.length,
+                    "agent_talk_ratio": round(call.talk.ratio, 4),
+                    "segments": call.timeline[len(call.timeline) - scored :],
+                }
+                await websocket.send_text(json.dumps(progress))
+        except WebSocketDisconnect:
+            # The call is over all the same
+            pass
+
+        if not call.text().strip():
+            outcome = "discarded"
+        else:
+            await score_windows(call, final=True)
+            embedding = await embed_call(call)
+            await run_in_threadpool(store_call, db, call, embedding)
+            outcome = "stored"
+    except Exception:
+        log.exception("Live call %s failed", call_id)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await _reject(websocket, 1011, "live call failed")
+            except (WebSocketDisconnect, RuntimeError):
+                # The client left meanwhile
+                pass
+        return
+    finally:
+        close_call(call, outcome)
+
+    if ended:
+        await websocket.send_text(
+            json.dumps(
+                {
+                    "type": outcome,
+                    "call_id": call_id,
+                    "segments": len(call.timeline),
+                    "agent_talk_ratio": round(call.talk.ratio, 4),
+                    "customer_sentiment_score": overall_score(call.timeline),
+                }
+            )
+        )
+        await websocket.close()
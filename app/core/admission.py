@@ -0,0 +1,231 @@
+"""
+Admission control for the expensive endpoints.
+
+Sync handlers run on a shared threadpool. A burst on a slow route
+(recommendations: DB scans plus a blocking LLM call) could take every
+worker thread and stall cheap routes like /healthz and GET /calls.
+Each expensive route therefore has an AdmissionLimit:
+
+- at most `max_concurrent` requests run at once
+- up to `max_queue` more wait, in arrival order, for at most
+  `queue_timeout` seconds
+- anything beyond that is shed at once with 503 and a Retry-After estimate
+
+Admission is an async dependency, so it waits on the event loop and a
+queued request holds neither a worker thread nor a DB session. Declare it
+before the handler's other dependencies.
+
+Requests admitted under pressure (after queueing, or with `degrade_at` of
+the route's capacity already busy) carry degraded=True. Handlers skip optional
+expensive work for them, e.g. nudges fall back to the rule-based ones
+instead of calling the LLM. The LLM itself has a per-process slot limit
+(llm_slot); a nudge that finds no free slot falls back the same way.
+
+Limits are per process: with N workers a route admits N x max_concurrent.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator
+
+from fastapi import HTTPException
+
+# Concurrent LLM calls per process; more nudges than this use the fallback
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+# Weight of the newest sample in the service time average
+SERVICE_TIME_ALPHA = 0.2
+
+
+@dataclass
+class Ticket:
+    degraded: bool = False
+    admitted_at: float = 0.0
+
+
+class AdmissionLimit:
+    """
+    Concurrency limit with a bounded FIFO wait queue, for one route.
+    Only touched from the event loop, so it needs no lock.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int,
+        queue_timeout: float,
+        degrade_at: float = 0.75,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.degrade_at = degrade_at
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Mean seconds an admitted request holds its slot
+        self.service_time = 0.0
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.degraded = 0
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a slot is likely free: the work ahead of a new request
+        spread over the slots, at the mean service time.
+        """
+        ahead = len(self._waiters) + 1
+        slots = max(self.max_concurrent, 1)
+        return max(1, math.ceil(self.service_time * ahead / slots))
+
+    def _shed(self, reason: str) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail=f"{self.name} is overloaded ({reason}); retry later",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def acquire(self) -> Ticket:
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            waited = False
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self.shed_queue_full += 1
+                raise self._shed("queue full")
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            self.queued += 1
+            try:
+                # release() hands its slot over by resolving the future
+                await asyncio.wait_for(fut, timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._abandon(fut)
+                self.shed_timeout += 1
+                raise self._shed("queue timeout")
+            except asyncio.CancelledError:
+                # Client gone while queued
+                self._abandon(fut)
+                raise
+            waited = True
+
+        self.admitted += 1
+        # Pressure: had to queue, or the other requests running already use
+        # degrade_at of the capacity
+        others = self.active - 1
+        degraded = waited or others >= self.degrade_at * self.max_concurrent
+        if degraded:
+            self.degraded += 1
+        return Ticket(degraded=degraded, admitted_at=time.monotonic())
+
+    def _abandon(self, fut: asyncio.Future) -> None:
+        """
+        Drop a waiter that gives up. If release() resolved its future just
+        before the timeout or cancellation, the slot is already its own and
+        is passed on, or it would be lost for good.
+        """
+        if fut in self._waiters:
+            self._waiters.remove(fut)
+        elif fut.done() and not fut.cancelled():
+            self._hand_over()
+
+    def _hand_over(self) -> None:
+        # To the oldest request still waiting, else the slot is freed
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def release(self, ticket: Ticket) -> None:
+        elapsed = time.monotonic() - ticket.admitted_at
+        self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+        self._hand_over()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "degraded": self.degraded,
+            "service_ms": round(self.service_time * 1000, 1),
+        }
+
+
+def _limit(name: str, concurrent: int, queue: int, timeout: float) -> AdmissionLimit:
+    env = f"ADMISSION_{name.upper()}"
+    return AdmissionLimit(
+        name,
+        max_concurrent=int(os.getenv(f"{env}_CONCURRENCY", str(concurrent))),
+        max_queue=int(os.getenv(f"{env}_QUEUE", str(queue))),
+        queue_timeout=float(os.getenv(f"{env}_TIMEOUT", str(timeout))),
+    )
+
+
+LIMITS: Dict[str, AdmissionLimit] = {
+    "recommendations": _limit("recommendations", 8, 16, 2.0),
+    "recommendations_batch": _limit("recommendations_batch", 2, 4, 5.0),
+}
+
+
+def admission(name: str) -> Callable[[], AsyncIterator[Ticket]]:
+    """
+    Dependency admitting a request to the named limit for the duration of
+    the handler; yields its Ticket.
+    """
+
+    async def dependency() -> AsyncIterator[Ticket]:
+        limit = LIMITS[name]
+        ticket = await limit.acquire()
+        try:
+            yield ticket
+        finally:
+            limit.release(ticket)
+
+    return dependency
+
+
+_llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+_llm_stats = {"calls": 0, "fallbacks": 0}
+
+
+@contextmanager
+def llm_slot(allowed: bool = True) -> Iterator[bool]:
+    """
+    Yields True if the caller may call the LLM now: allowed (not degraded)
+    and a slot is free without waiting. Otherwise yields False and counts a
+    fallback.
+    """
+    if allowed and _llm_slots.acquire(blocking=False):
+        _llm_stats["calls"] += 1
+        try:
+            yield True
+        finally:
+            _llm_slots.release()
+    else:
+        _llm_stats["fallbacks"] += 1
+        yield False
+
+
+def admission_stats() -> dict:
+    return {
+        "routes": {name: limit.stats() for name, limit in LIMITS.items()},
+        "llm": {"max_concurrent": LLM_CONCURRENCY, **_llm_stats},
+    }
@@ -0,0 +1,410 @@
+"""
+Archival tier for old calls.
+
+archive_calls() moves every call that started before a cutoff out of
+Postgres into compressed files under ARCHIVE_DIR, one month at a time:
+
+    ARCHIVE_DIR/calls/month=2024-07/calls-20251019T210000.parquet
+    ARCHIVE_DIR/index.sqlite
+
+For each month it
+1. streams the calls (with transcripts) from a server-side cursor into a
+   temporary file: Parquet with zstd, one row group per batch, or
+   zstd-compressed NDJSON
+2. reads the file back and checks it holds exactly the rows written (same
+   count and the same digest over every row, in order)
+3. renames it into place and records call_id -> (file, row) in a SQLite
+   index next to the files
+4. deletes the archived rows (their transcripts go with them), re-clusters
+   the remaining near-duplicates of archived cluster roots, takes the rows
+   out of their agents' topic stats and, once a whole month is archived,
+   drops its now empty partitions
+
+fetch_archived() is the read path behind GET /calls/{call_id}: one index
+lookup, then a single row group (Parquet) or a scan of one file (NDJSON).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    cast,
+)
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.core.dedup import flag_duplicates
+from app.core.partitions import add_months, drop_empty_partitions, month_start
+from app.core.rollups import ID_CHUNK, refresh_agent_rollups, touched_days
+from app.core.topics import refresh_agent_topic_stats
+from app.models.call import Call, CallTranscript
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# Calls older than this are archived by the scheduled job
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_ROWS = 5000
+INDEX_NAME = "index.sqlite"
+FORMATS = {"parquet": "parquet", "ndjson": "ndjson.zst"}
+
+# Every column of calls, plus the transcript: archived rows are complete
+ARCHIVE_COLUMNS = [c.name for c in Call.__table__.columns] + ["transcript"]
+
+Batches = Iterable[List[Dict[str, Any]]]
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _to_utc(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc) if ts.tzinfo else ts
+
+
+def _plain(value: Any) -> Any:
+    # Timestamps compare as naive UTC: Parquet hands them back tz-aware
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    return value
+
+
+def _row_bytes(row: Dict[str, Any]) -> bytes:
+    return json.dumps(
+        {k: _plain(v) for k, v in row.items()}, sort_keys=True, default=str
+    ).encode()
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {
+        "call_id": pa.string(),
+        "agent_id": pa.string(),
+        "customer_id": pa.string(),
+        "language": pa.string(),
+        "start_time": pa.timestamp("us", tz="UTC"),
+        "duration_seconds": pa.int32(),
+        # float64: what Postgres stores, so the round trip is exact
+        "embedding": pa.list_(pa.float64()),
+        "agent_talk_ratio": pa.float64(),
+        "customer_sentiment_score": pa.float64(),
+        # JSON text
+        "sentiment_timeline": pa.string(),
+        "content_hash": pa.string(),
+        "insights_hash": pa.string(),
+        "insights_model": pa.string(),
+        "topic_cluster": pa.int32(),
+        # Hex text, as in NDJSON
+        "minhash": pa.string(),
+        "lsh_bands": pa.list_(pa.int64()),
+        "duplicate_of": pa.string(),
+        "phrases_hash": pa.string(),
+        "transcript": pa.large_string(),
+    }
+    return pa.schema([(name, types[name]) for name in ARCHIVE_COLUMNS])
+
+
+def _write_parquet(path: str, batches: Batches) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in batches:
+            table = pa.Table.from_pylist(
+                [
+                    {
+                        **row,
+                        "sentiment_timeline": (
+                            json.dumps(row["sentiment_timeline"])
+                            if row["sentiment_timeline"] is not None
+                            else None
+                        ),
+                    }
+                    for row in rows
+                ],
+                schema=schema,
+            )
+            writer.write_table(table)
+
+
+def _parquet_rows(table) -> Iterator[Dict[str, Any]]:
+    for row in table.to_pylist():
+        if row["sentiment_timeline"] is not None:
+            row["sentiment_timeline"] = json.loads(row["sentiment_timeline"])
+        yield row
+
+
+def _read_parquet(path: str) -> Iterator[Dict[str, Any]]:
+    import pyarrow.parquet as pq
+
+    f = pq.ParquetFile(path)
+    for i in range(f.num_row_groups):
+        yield from _parquet_rows(f.read_row_group(i))
+
+
+def _write_ndjson(path: str, batches: Batches) -> None:
+    import pyarrow as pa
+
+    with pa.output_stream(path, compression="zstd") as f:
+        for rows in batches:
+            lines = [json.dumps(row, default=_json_default) for row in rows]
+            f.write(("\n".join(lines) + "\n").encode())
+
+
+def _read_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    import pyarrow as pa
+
+    with pa.input_stream(path, compression="zstd") as stream:
+        for line in io.TextIOWrapper(stream, encoding="utf-8"):
+            row = json.loads(line)
+            if row["start_time"] is not None:
+                row["start_time"] = datetime.fromisoformat(row["start_time"])
+            yield row
+
+
+WRITERS: Dict[str, Callable[[str, Batches], None]] = {
+    "parquet": _write_parquet,
+    "ndjson": _write_ndjson,
+}
+READERS: Dict[str, Callable[[str], Iterator[Dict[str, Any]]]] = {
+    "parquet": _read_parquet,
+    "ndjson": _read_ndjson,
+}
+
+
+def _open_index(root: str, readonly: bool = False) -> Optional[sqlite3.Connection]:
+    path = os.path.join(root, INDEX_NAME)
+    if readonly:
+        if not os.path.exists(path):
+            return None
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    os.makedirs(root, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archived_calls (
+            call_id TEXT PRIMARY KEY,
+            start_time TEXT,
+            path TEXT NOT NULL,
+            row INTEGER NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+def _archive_window(
+    session: Session,
+    lo: datetime,
+    hi: datetime,
+    fmt: str,
+    root: str,
+    batch_rows: int,
+) -> Optional[Tuple[str, int]]:
+    """
+    Archive the calls with lo <= start_time < hi; returns the file written
+    (relative to root) and its row count, or None when there were none.
+    """
+    result = session.execute(
+        select(*[getattr(Call, n) for n in ARCHIVE_COLUMNS[:-1]])
+        .add_columns(CallTranscript.transcript)
+        .outerjoin(Call.transcript_row)
+        .where(Call.start_time >= lo, Call.start_time < hi)
+        .order_by(Call.start_time, Call.call_id)
+        .execution_options(yield_per=batch_rows)
+    )
+    keys: List[Tuple[Any, Any]] = []
+    agents: Set[str] = set()
+    written = hashlib.sha256()
+
+    def batches() -> Iterator[List[Dict[str, Any]]]:
+        for rows in result.partitions():
+            batch = [dict(zip(ARCHIVE_COLUMNS, r)) for r in rows]
+            for row in batch:
+                row["call_id"] = str(row["call_id"])
+                if row["duplicate_of"] is not None:
+                    row["duplicate_of"] = str(row["duplicate_of"])
+                if row["minhash"] is not None:
+                    row["minhash"] = row["minhash"].hex()
+                keys.append((row["call_id"], row["start_time"]))
+                if row["agent_id"] is not None:
+                    agents.add(row["agent_id"])
+                written.update(_row_bytes(row))
+            yield batch
+
+    relpath = os.path.join(
+        "calls",
+        f"month={lo:%Y-%m}",
+        f"calls-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.{FORMATS[fmt]}",
+    )
+    path = os.path.join(root, relpath)
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        WRITERS[fmt](tmp, batches())
+        if not keys:
+            os.remove(tmp)
+            return None
+
+        read = hashlib.sha256()
+        count = 0
+        for row in READERS[fmt](tmp):
+            read.update(_row_bytes(row))
+            count += 1
+        if count != len(keys) or read.digest() != written.digest():
+            raise ArchiveError(
+                f"{relpath}: read back {count} rows that don't match the "
+                f"{len(keys)} written; nothing was deleted"
+            )
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    index = _open_index(root)
+    assert index is not None
+    with index:
+        index.executemany(
+            "INSERT OR REPLACE INTO archived_calls VALUES (?, ?, ?, ?)",
+            [(cid, _plain(start), relpath, i) for i, (cid, start) in enumerate(keys)],
+        )
+    index.close()
+
+    # Only once the file is in place and indexed
+    orphans: Set[str] = set()
+    for i in range(0, len(keys), ID_CHUNK):
+        chunk = keys[i : i + ID_CHUNK]
+        # Copies of an archived root would point at a call that's gone
+        orphans.update(
+            str(r[0])
+            for r in session.execute(
+                select(Call.call_id).where(
+                    Call.duplicate_of.in_([cid for cid, _ in chunk])
+                )
+            )
+        )
+        session.execute(
+            delete(Call)
+            .where(tuple_(Call.call_id, Call.start_time).in_(chunk))
+            .execution_options(synchronize_session=False)
+        )
+    orphans -= {cid for cid, _ in keys}
+    if orphans:
+        changed = flag_duplicates(session, sorted(orphans))
+        refresh_agent_rollups(session, touched_days(session, sorted(changed)))
+    refresh_agent_topic_stats(session, agents)
+    session.commit()
+    return relpath, len(keys)
+
+
+def archive_calls(
+    session: Session,
+    cutoff: datetime,
+    fmt: str = "parquet",
+    root: Optional[str] = None,
+    batch_rows: int = ARCHIVE_BATCH_ROWS,
+) -> dict:
+    """
+    Move every call with start_time < cutoff into the archive, one month
+    (and one file) at a time; see the module docstring. Each month commits
+    on its own, so a failure leaves earlier months archived and the failing
+    one untouched in the DB.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"unknown archive format {fmt!r}")
+    root = root or ARCHIVE_DIR
+    if cutoff.tzinfo is None:
+        cutoff = cutoff.replace(tzinfo=timezone.utc)
+
+    first = cast(
+        Optional[datetime],
+        session.execute(
+            select(func.min(Call.start_time)).where(Call.start_time < cutoff)
+        ).scalar(),
+    )
+    session.commit()
+    stats: Dict[str, Any] = {"archived": 0, "files": [], "dropped": []}
+    if first is None:
+        return stats
+
+    month = month_start(_to_utc(first).date())
+    while True:
+        lo = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+        if lo >= cutoff:
+            break
+        nxt = add_months(month, 1)
+        end = datetime(nxt.year, nxt.month, 1, tzinfo=timezone.utc)
+        done = _archive_window(session, lo, min(end, cutoff), fmt, root, batch_rows)
+        if done:
+            stats["files"].append(done[0])
+            stats["archived"] += done[1]
+        if end <= cutoff:
+            stats["dropped"] += drop_empty_partitions(session, month)
+            session.commit()
+        month = nxt
+    return stats
+
+
+def default_cutoff(days: int = ARCHIVE_AFTER_DAYS) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def fetch_archived(call_id: str, root: Optional[str] = None) -> Optional[dict]:
+    """
+    An archived call's full row (ARCHIVE_COLUMNS), or None if the archive
+    doesn't have it.
+    """
+    root = root or ARCHIVE_DIR
+    index = _open_index(root, readonly=True)
+    if index is None:
+        return None
+    try:
+        hit = index.execute(
+            "SELECT path, row FROM archived_calls WHERE call_id = ?", (call_id,)
+        ).fetchone()
+    finally:
+        index.close()
+    if hit is None:
+        return None
+
+    relpath, row = hit
+    path = os.path.join(root, relpath)
+    if path.endswith(FORMATS["parquet"]):
+        import pyarrow.parquet as pq
+
+        f = pq.ParquetFile(path)
+        for i in range(f.num_row_groups):
+            n = f.metadata.row_group(i).num_rows
+            if row < n:
+                return next(_parquet_rows(f.read_row_group(i).slice(row, 1)))
+            row -= n
+        return None
+    for i, record in enumerate(_read_ndjson(path)):
+        if i == row:
+            return record
+    return None
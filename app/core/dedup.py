@@ -0,0 +1,230 @@
+"""
+Near-duplicate transcripts (re-delivered or templated calls) via MinHash LSH.
+
+Every transcript gets a MinHash signature when it is loaded: NUM_PERM
+minimums of its word SHINGLE-gram hashes under as many random hash
+functions. The share of equal slots between two signatures estimates the
+Jaccard similarity of their shingle sets.
+
+The signature is cut into BANDS bands of ROWS slots, each hashed to one
+bigint and stored in `calls.lsh_bands` (GIN-indexed). Two calls share a
+band with probability 1 - (1 - j^ROWS)^BANDS for Jaccard j (about 0.97 at
+0.8, 0.01 at 0.4), so looking up the bands of a new call (one index lookup per
+band) finds its likely duplicates without comparing it to every stored
+transcript; candidates are then checked against DUPLICATE_THRESHOLD on the
+full signatures.
+
+Duplicates form clusters keyed by their earliest call (by start time, then
+call_id): `calls.duplicate_of` holds that root for every other member, and
+is NULL for roots and for calls without duplicates.
+"""
+
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import or_, select, union_all, update
+from sqlalchemy.orm import Session
+
+from app.core.rollups import ID_CHUNK
+from app.models.call import Call
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Words per shingle
+SHINGLE = 5
+# Estimated Jaccard similarity above which two transcripts are duplicates
+DUPLICATE_THRESHOLD = 0.8
+
+# Hash functions (a * x + b) mod p, fixed so stored signatures stay comparable.
+# a, b < 2^32 and x < 2^32 keep a * x + b inside uint64.
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+_MAX = np.uint32(0xFFFFFFFF)
+
+SPEAKER_RE = re.compile(r"\*\*[^*]+:\*\*")
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def shingles(text: str) -> Set[str]:
+    """
+    Word SHINGLE-grams of the transcript, ignoring case, punctuation and the
+    speaker labels every transcript shares. Texts shorter than a shingle
+    are one shingle.
+    """
+    words = WORD_RE.findall(SPEAKER_RE.sub(" ", text).lower())
+    if len(words) <= SHINGLE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def signature(text: Optional[str]) -> Optional[np.ndarray]:
+    """
+    MinHash signature (uint32 [NUM_PERM]) of a transcript; None when it has
+    no words, since empty transcripts say nothing about each other.
+    """
+    grams = shingles(text or "")
+    if not grams:
+        return None
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), "big")
+            for g in grams
+        ),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+    permuted = (hashes[:, None] * _A + _B) % _PRIME & np.uint64(_MAX)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_hashes(sig: np.ndarray) -> List[int]:
+    """
+    One signed 64-bit hash per band (the band number is mixed in, so equal
+    rows in different bands don't collide).
+    """
+    sig = np.asarray(sig, dtype=np.uint32)
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                band.to_bytes(2, "big")
+                + sig[band * ROWS : (band + 1) * ROWS].tobytes(),
+                digest_size=8,
+            ).digest(),
+            "big",
+            signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def fingerprint(text: Optional[str]) -> Tuple[Optional[bytes], List[int]]:
+    """
+    (minhash, lsh_bands) column values for a transcript. A transcript with
+    no words gets no signature and no bands, so it never matches; a NULL
+    lsh_bands means the call hasn't been fingerprinted yet.
+    """
+    sig = signature(text)
+    if sig is None:
+        return None, []
+    return sig.tobytes(), band_hashes(sig)
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """
+    Estimated Jaccard similarity of two stored signatures.
+    """
+    return float(
+        np.mean(np.frombuffer(a, dtype=np.uint32) == np.frombuffer(b, dtype=np.uint32))
+    )
+
+
+def _candidates(session: Session, call_id: str, bands: Sequence[int]) -> Sequence:
+    """
+    (call_id, minhash, duplicate_of) of the calls sharing a band with
+    `bands`, a call once per band it shares.
+
+    One containment lookup per band rather than one overlap (`&&`) with all
+    of them: band hashes are all distinct, so Postgres keeps no element
+    statistics for them and prices an overlap with BANDS elements at ~8% of
+    the table, which it then reads sequentially. A single element is priced
+    as the GIN lookup it is.
+    """
+    if not bands:
+        return []
+    lookups = [
+        select(Call.call_id, Call.minhash, Call.duplicate_of).where(
+            Call.lsh_bands.contains([band]), Call.call_id != call_id
+        )
+        for band in bands
+    ]
+    return session.execute(union_all(*lookups)).all()
+
+
+def _repoint(session: Session, roots: Iterable[str], winner: str) -> Set[str]:
+    """
+    Merge the clusters of roots into winner's. Returns the calls changed.
+    """
+    losers = [r for r in roots if r != winner]
+    if not losers:
+        return set()
+    changed = session.execute(
+        update(Call)
+        .where(or_(Call.call_id.in_(losers), Call.duplicate_of.in_(losers)))
+        .values(duplicate_of=winner)
+        .returning(Call.call_id)
+        .execution_options(synchronize_session=False)
+    )
+    return {str(r[0]) for r in changed}
+
+
+def flag_duplicates(session: Session, call_ids: Sequence[str]) -> Set[str]:
+    """
+    (Re)cluster the given calls, whose fingerprints must already be stored.
+
+    - Clears duplicate_of on them and on the calls that pointed at them (a
+      changed transcript may have left its cluster); those are re-checked too
+    - In start time order, each call's bands are looked up in the LSH index
+      and the candidates verified on their signatures; the call joins the
+      earliest cluster it matches, and clusters it bridges are merged
+    Returns every call whose duplicate_of may have changed, for the caller
+    to refresh the rollups of their days. The caller commits.
+    """
+    pending: Set[str] = set()
+    ids = list(dict.fromkeys(str(c) for c in call_ids))
+    for i in range(0, len(ids), ID_CHUNK):
+        chunk = ids[i : i + ID_CHUNK]
+        reset = session.execute(
+            update(Call)
+            .where(or_(Call.call_id.in_(chunk), Call.duplicate_of.in_(chunk)))
+            .values(duplicate_of=None)
+            .returning(Call.call_id)
+            .execution_options(synchronize_session=False)
+        )
+        pending.update(str(r[0]) for r in reset)
+    changed = set(pending)
+
+    rows: list = []
+    pending_list = sorted(pending)
+    for i in range(0, len(pending_list), ID_CHUNK):
+        rows.extend(
+            session.execute(
+                select(
+                    Call.call_id, Call.start_time, Call.minhash, Call.lsh_bands
+                ).where(
+                    Call.call_id.in_(pending_list[i : i + ID_CHUNK]),
+                    Call.minhash.isnot(None),
+                )
+            ).all()
+        )
+    rows.sort(key=lambda r: (r.start_time, str(r.call_id)))
+
+    for call_id, start_time, minhash, bands in rows:
+        call_id = str(call_id)
+        candidates = _candidates(session, call_id, bands)
+        roots = {
+            str(c.duplicate_of or c.call_id)
+            for c in candidates
+            if similarity(minhash, c.minhash) >= DUPLICATE_THRESHOLD
+        }
+        if not roots:
+            continue
+        current = session.execute(
+            select(Call.duplicate_of).where(Call.call_id == call_id)
+        ).scalar()
+        roots.add(str(current or call_id))
+
+        # Roots are merged into the earliest one
+        order: Dict[str, tuple] = {
+            str(r.call_id): (r.start_time, str(r.call_id))
+            for r in session.execute(
+                select(Call.call_id, Call.start_time).where(Call.call_id.in_(roots))
+            )
+        }
+        winner = min(roots, key=lambda r: order.get(r, (start_time, r)))
+        changed |= _repoint(session, roots, winner)
+    return changed
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.call import Call
+
+LOAD_BATCH_ROWS = 10000
+# Upper bound on the queries x calls score matrix built by top_k_batch
+SCORE_BLOCK_FLOATS = 32 * 1024 * 1024
+# How often get_index() looks for a newer snapshot (app.core.snapshot)
+SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", "5"))
+
+
+def _encode(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dictionary-encode strings: (sorted distinct values, int32 code per row).
+    None becomes "" so it is just another category.
+    """
+    labels, codes = np.unique(
+        np.asarray([v or "" for v in values], dtype=str), return_inverse=True
+    )
+    return labels, codes.astype(np.int32)
+
+
+class EmbeddingIndex:
+    """
+    All call embeddings as one L2-normalised float32 matrix, aligned with a
+    sorted array of call_ids. Read-only once built, so when it is loaded
+    before workers fork, every worker shares the same pages copy-on-write.
+    Both arrays are plain NumPy buffers (no per-row Python objects whose
+    refcounts would dirty the shared pages); call_id lookup is a binary search.
+
+    Per-call metadata (agent, language, start time, sentiment, whether the
+    call is a near-duplicate of an earlier one) is kept as
+    columnar arrays aligned with the vectors, so similarity filters become a
+    vectorized boolean mask (see mask()) instead of a DB round trip.
+
+    An index opened from a snapshot (from_arrays) holds read-only memory
+    maps instead, shared through the page cache by every process on the host.
+    """
+
+    # Snapshot generation the arrays are mapped from (None: built in memory)
+    generation: Optional[str] = None
+
+    def __init__(
+        self,
+        call_ids: np.ndarray,
+        vectors: np.ndarray,
+        agent_ids: Optional[Sequence[Optional[str]]] = None,
+        languages: Optional[Sequence[Optional[str]]] = None,
+        start_ts: Optional[np.ndarray] = None,
+        sentiment: Optional[np.ndarray] = None,
+        duplicate: Optional[np.ndarray] = None,
+    ):
+        order = np.argsort(call_ids, kind="stable")
+        self.call_ids = call_ids[order]
+        self.vectors = vectors[order] if len(order) else vectors
+
+        n = len(order)
+        self.agents, agent_codes = _encode(agent_ids or [None] * n)
+        self.agent_codes = agent_codes[order]
+        self.languages, language_codes = _encode(languages or [None] * n)
+        self.language_codes = language_codes[order]
+        # Seconds since the epoch (UTC) and score; NaN when unknown
+        self.start_ts = (
+            np.asarray(start_ts, dtype=np.float64)[order]
+            if start_ts is not None
+            else np.full(n, np.nan)
+        )
+        self.sentiment = (
+            np.asarray(sentiment, dtype=np.float32)[order]
+            if sentiment is not None
+            else np.full(n, np.nan, dtype=np.float32)
+        )
+        self.duplicate = (
+            np.asarray(duplicate, dtype=bool)[order]
+            if duplicate is not None
+            else np.zeros(n, dtype=bool)
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        call_ids: np.ndarray,
+        vectors: np.ndarray,
+        agents: np.ndarray,
+        agent_codes: np.ndarray,
+        languages: np.ndarray,
+        language_codes: np.ndarray,
+        start_ts: np.ndarray,
+        sentiment: np.ndarray,
+        duplicate: np.ndarray,
+        generation: Optional[str] = None,
+    ) -> EmbeddingIndex:
+        """
+        Wrap arrays that are already in index order (sorted call_ids,
+        normalised vectors, encoded metadata) without copying them, so
+        memory-mapped snapshot arrays stay mapped.
+        """
+        index = cls.__new__(cls)
+        index.call_ids = call_ids
+        index.vectors = vectors
+        index.agents = agents
+        index.agent_codes = agent_codes
+        index.languages = languages
+        index.language_codes = language_codes
+        index.start_ts = start_ts
+        index.sentiment = sentiment
+        index.duplicate = duplicate
+        index.generation = generation
+        return index
+
+    def __len__(self) -> int:
+        return len(self.call_ids)
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return (vectors / np.where(norms == 0.0, 1.0, norms)).astype(np.float32)
+
+    @classmethod
+    def from_db(cls, session: Session) -> EmbeddingIndex:
+        """
+        Build the index (with its filter metadata) from every call that has
+        an embedding, streaming rows in batches so the ORM never holds them
+        all at once.
+        """
+        ids: List[str] = []
+        agents: List[Optional[str]] = []
+        languages: List[Optional[str]] = []
+        start_ts: List[float] = []
+        sentiment: List[float] = []
+        duplicate: List[bool] = []
+        chunks: List[np.ndarray] = []
+        result = session.execute(
+            select(
+                Call.call_id,
+                Call.embedding,
+                Call.agent_id,
+                Call.language,
+                Call.start_time,
+                Call.customer_sentiment_score,
+                Call.duplicate_of.isnot(None),
+            )
+            .where(Call.embedding.isnot(None))
+            .order_by(Call.call_id)
+            .execution_options(yield_per=LOAD_BATCH_ROWS)
+        )
+        for rows in result.partitions():
+            ids.extend(str(r[0]) for r in rows)
+            chunks.append(np.asarray([r[1] for r in rows], dtype=np.float32))
+            agents.extend(r[2] for r in rows)
+            languages.extend(r[3] for r in rows)
+            start_ts.extend(r[4].timestamp() if r[4] else np.nan for r in rows)
+            sentiment.extend(r[5] if r[5] is not None else np.nan for r in rows)
+            duplicate.extend(bool(r[6]) for r in rows)
+
+        vectors = np.concatenate(chunks) if chunks else np.empty((0, 0), np.float32)
+        return cls(
+            np.asarray(ids, dtype=str),
+            cls.normalize(vectors),
+            agent_ids=agents,
+            languages=languages,
+            start_ts=np.asarray(start_ts, dtype=np.float64),
+            sentiment=np.asarray(sentiment, dtype=np.float32),
+            duplicate=np.asarray(duplicate, dtype=bool),
+        )
+
+    @staticmethod
+    def _lookup(sorted_values: np.ndarray, wanted: Sequence[Optional[str]]):
+        """
+        Index of each wanted value in a sorted array, -1 where it is absent.
+        """
+        keys = np.asarray([w if w is not None else "" for w in wanted], dtype=str)
+        if len(sorted_values) == 0 or len(keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(sorted_values, keys), len(sorted_values) - 1)
+        return np.where(sorted_values[pos] == keys, pos, -1)
+
+    def positions(self, call_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        Row of each call_id in the matrix, -1 where it isn't indexed.
+        """
+        return self._lookup(self.call_ids, call_ids)
+
+    def mask(
+        self,
+        agent_ids: Optional[Sequence[str]] = None,
+        exclude_agent_ids: Optional[Sequence[str]] = None,
+        languages: Optional[Sequence[str]] = None,
+        from_ts: Optional[float] = None,
+        to_ts: Optional[float] = None,
+        min_sentiment: Optional[float] = None,
+        max_sentiment: Optional[float] = None,
+        exclude_duplicates: bool = False,
+    ) -> Optional[np.ndarray]:
+        """
+        Boolean row mask for the given filters, or None when none is set.
+        Like NULL in SQL, an unknown start time or sentiment fails any range
+        filter on that field (NaN compares False). exclude_duplicates keeps
+        one call per near-duplicate cluster.
+        """
+        conds: List[np.ndarray] = []
+        if agent_ids:
+            codes = self._lookup(self.agents, agent_ids)
+            conds.append(np.isin(self.agent_codes, codes[codes >= 0]))
+        if exclude_agent_ids:
+            codes = self._lookup(self.agents, exclude_agent_ids)
+            conds.append(~np.isin(self.agent_codes, codes[codes >= 0]))
+        if languages:
+            codes = self._lookup(self.languages, languages)
+            conds.append(np.isin(self.language_codes, codes[codes >= 0]))
+        if from_ts is not None:
+            conds.append(self.start_ts >= from_ts)
+        if to_ts is not None:
+            conds.append(self.start_ts <= to_ts)
+        if min_sentiment is not None:
+            conds.append(self.sentiment >= min_sentiment)
+        if max_sentiment is not None:
+            conds.append(self.sentiment <= max_sentiment)
+        if exclude_duplicates:
+            conds.append(~self.duplicate)
+
+        if not conds:
+            return None
+        return np.logical_and.reduce(conds)
+
+    def top_k(
+        self,
+        query: np.ndarray,
+        k: int,
+        exclude: Optional[str] = None,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        The k most cosine-similar calls to query, best first.
+        """
+        return self.top_k_batch(np.asarray(query)[None, :], k, [exclude], mask)[0]
+
+    def top_k_batch(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[Sequence[Optional[str]]] = None,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        The k most cosine-similar calls to each row of queries, best first,
+        leaving out exclude[i] (typically the query's own call) for row i and
+        every call the mask (see mask()) rejects.
+
+        Only the rows the mask keeps are scored, so a selective filter makes
+        the search cheaper, not dearer. A block of queries is scored with one
+        matrix-matrix product and each row's top k picked with argpartition;
+        blocks keep the score matrix under SCORE_BLOCK_FLOATS.
+        """
+        queries = self.normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            vectors = self.vectors[rows]
+        else:
+            rows = np.arange(len(self))
+            vectors = self.vectors
+        if len(rows) == 0:
+            return [[] for _ in range(len(queries))]
+
+        # Column of each excluded call among the scored rows (-1: not scored)
+        skip = None
+        if exclude is not None:
+            pos = self.positions(exclude)
+            col = np.minimum(np.searchsorted(rows, pos), len(rows) - 1)
+            skip = np.where((pos >= 0) & (rows[col] == pos), col, -1)
+
+        k = min(k, len(rows))
+        block = max(1, SCORE_BLOCK_FLOATS // len(rows))
+        results: List[List[Tuple[str, float]]] = []
+        for start in range(0, len(queries), block):
+            sims = queries[start : start + block] @ vectors.T
+            if skip is not None:
+                cols = skip[start : start + len(sims)]
+                hit = cols >= 0
+                sims[np.flatnonzero(hit), cols[hit]] = -np.inf
+
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top_sims = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_sims, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_sims = np.take_along_axis(top_sims, order, axis=1)
+            results.extend(
+                [
+                    (str(self.call_ids[rows[i]]), float(sim))
+                    for i, sim in zip(row, row_sims)
+                    if sim != -np.inf
+                ]
+                for row, row_sims in zip(top, top_sims)
+            )
+        return results
+
+
+# Process-wide index: set by app.core.preload or set_index(), or mapped from
+# the latest snapshot (app.core.snapshot)
+_index: Optional[EmbeddingIndex] = None
+# set_index() pins an index; otherwise get_index() follows the snapshots
+_pinned = False
+_checked_at = float("-inf")
+_refreshing = threading.Lock()
+
+
+def get_index() -> Optional[EmbeddingIndex]:
+    """
+    The index to search, None to fall back to the database. Unless one was
+    pinned with set_index(), switches to a newly published snapshot at most
+    SNAPSHOT_CHECK_SECONDS after it appears.
+    """
+    global _checked_at
+    if not _pinned and time.monotonic() - _checked_at >= SNAPSHOT_CHECK_SECONDS:
+        # One thread looks; the others carry on with the current index
+        if _refreshing.acquire(blocking=False):
+            try:
+                from app.core.snapshot import refresh_index
+
+                refresh_index()
+                _checked_at = time.monotonic()
+            finally:
+                _refreshing.release()
+    return _index
+
+
+def set_index(index: Optional[EmbeddingIndex], pin: bool = True) -> None:
+    """
+    Replace the index. A pinned one is used until the next set_index() call,
+    whatever snapshots appear; set_index(None) unpins.
+    """
+    global _index, _pinned
+    _index = index
+    _pinned = pin and index is not None
+
+
+def use_snapshot(index: EmbeddingIndex) -> None:
+    set_index(index, pin=False)
+
+
+def loaded_generation() -> Optional[str]:
+    return _index.generation if _index is not None else None
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence
+
+# Rows fetched per round trip from the server-side cursor; each chunk is
+# encoded and handed to the socket before the next one is fetched.
+EXPORT_CHUNK_ROWS = 5000
+
+Partitions = Iterable[Sequence[Sequence[Any]]]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return json.dumps(value)
+    return value
+
+
+def ndjson_chunks(columns: List[str], partitions: Partitions) -> Iterator[bytes]:
+    """
+    One JSON object per line, one yielded block per cursor chunk.
+    """
+    for rows in partitions:
+        lines = [
+            json.dumps(dict(zip(columns, row)), default=_json_default) for row in rows
+        ]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def csv_chunks(columns: List[str], partitions: Partitions) -> Iterator[bytes]:
+    """
+    CSV with a header row. Embeddings, if exported, are JSON arrays in a cell.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for rows in partitions:
+        for row in rows:
+            writer.writerow([_csv_value(v) for v in row])
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file that keeps what pyarrow wrote since the last drain(),
+    so a Parquet file can be streamed one row group at a time.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:  # type: ignore[override]
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_chunks(columns: List[str], partitions: Partitions) -> Iterator[bytes]:
+    """
+    Parquet file with one row group per cursor chunk.
+    Embeddings are stored as list<float32>.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        "call_id": pa.string(),
+        "agent_id": pa.string(),
+        "customer_id": pa.string(),
+        "language": pa.string(),
+        "start_time": pa.timestamp("us", tz="UTC"),
+        "duration_seconds": pa.int32(),
+        "transcript": pa.large_string(),
+        "agent_talk_ratio": pa.float64(),
+        "customer_sentiment_score": pa.float64(),
+        "embedding": pa.list_(pa.float32()),
+    }
+    schema = pa.schema([(name, types[name]) for name in columns])
+
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in partitions:
+            cols = list(zip(*rows)) if rows else [()] * len(columns)
+            arrays = [
+                pa.array(list(values), type=field.type)
+                for values, field in zip(cols, schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+ENCODERS: Dict[str, Callable[[List[str], Partitions], Iterator[bytes]]] = {
+    "ndjson": ndjson_chunks,
+    "csv": csv_chunks,
+    "parquet": parquet_chunks,
+}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
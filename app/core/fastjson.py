@@ -0,0 +1,59 @@
+"""
+Fast response encoding for the call endpoints.
+
+FastJSONResponse renders with orjson when it is installed (the stdlib json
+encoder otherwise), and handlers return it directly with plain dicts, so a
+response skips pydantic validation and serialization entirely.
+Embeddings can also leave as base64 or raw bytes: little-endian float32,
+4 bytes per dimension instead of ~20 characters of JSON each.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Optional, Sequence
+
+import numpy as np
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None  # type: ignore[assignment]
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(
+                content,
+                option=orjson.OPT_UTC_Z
+                | orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_SERIALIZE_NUMPY,
+            )
+        return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+def embedding_bytes(embedding: Sequence[float]) -> bytes:
+    """
+    Raw little-endian float32 bytes of an embedding.
+    """
+    return np.asarray(embedding, dtype="<f4").tobytes()
+
+
+def encode_embedding(embedding: Optional[Sequence[float]], fmt: str):
+    """
+    An embedding as a JSON float list ("json") or base64 of its float32
+    bytes ("b64f32").
+    """
+    if embedding is None or fmt == "json":
+        return embedding
+    return base64.b64encode(embedding_bytes(embedding)).decode("ascii")
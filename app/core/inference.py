@@ -0,0 +1,263 @@
+"""
+Inference backends for the embedding and sentiment models.
+
+- "torch": eager PyTorch through sentence-transformers / transformers
+- "onnx": both models exported once to ONNX and run with ONNX Runtime
+- "onnx-int8": same, with dynamically quantized int8 weights
+
+Exported models (plus their tokenizer and config) are cached under
+ONNX_CACHE_DIR, so after the first run the ONNX backends need neither torch
+nor network access. Every backend exposes the same two calls:
+embed(texts) -> float32 matrix and classify(texts) -> [{"label", "score"}].
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_REPO = f"sentence-transformers/{EMBEDDING_MODEL}"
+EMBEDDING_DIM = 384
+# sentence-transformers truncates this model at 256 tokens; match it
+EMBEDDING_MAX_TOKENS = 256
+
+SENTIMENT_MODEL = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+SENTIMENT_MAX_TOKENS = 512
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(".cache", "onnx"))
+ONNX_OPSET = 17
+
+
+class TorchBackend:
+    """
+    Eager PyTorch on CPU, exactly what the populator always ran.
+    """
+
+    name = "torch"
+
+    def __init__(self) -> None:
+        from sentence_transformers import SentenceTransformer
+        from transformers import pipeline
+
+        self.encoder = SentenceTransformer(EMBEDDING_MODEL)
+        self.classifier = pipeline(
+            "sentiment-analysis",
+            model=SENTIMENT_MODEL,
+            device=-1,
+            truncation=True,
+        )
+
+    def embed(self, texts: Sequence[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        vectors = self.encoder.encode(
+            list(texts),
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.astype(np.float32)
+
+    def classify(self, texts: Sequence[str], batch_size: int = 64) -> List[dict]:
+        if not texts:
+            return []
+        return self.classifier(list(texts), batch_size=batch_size)
+
+
+def _model_dir(repo: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, repo.replace("/", "__"))
+
+
+def _export_onnx(repo: str, task: str, model_dir: str) -> None:
+    """
+    Export a Hugging Face model to model_dir/model.onnx with dynamic batch and
+    sequence axes, next to its tokenizer and config.
+    Written to a temp dir and renamed, so a crash never leaves half an export.
+    """
+    import torch
+    from transformers import (
+        AutoModel,
+        AutoModelForSequenceClassification,
+        AutoTokenizer,
+    )
+
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    if task == "sentiment":
+        model = AutoModelForSequenceClassification.from_pretrained(repo)
+        output = "logits"
+        output_axes = {0: "batch"}
+    else:
+        model = AutoModel.from_pretrained(repo)
+        output = "last_hidden_state"
+        output_axes = {0: "batch", 1: "seq"}
+    model.config.return_dict = False
+    model.eval()
+
+    os.makedirs(os.path.dirname(model_dir) or ".", exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(model_dir) or ".")
+    try:
+        sample = tokenizer(["hello world"], return_tensors="pt")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"]),
+                os.path.join(tmp_dir, "model.onnx"),
+                input_names=["input_ids", "attention_mask"],
+                output_names=[output],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "seq"},
+                    "attention_mask": {0: "batch", 1: "seq"},
+                    output: output_axes,
+                },
+                opset_version=ONNX_OPSET,
+                do_constant_folding=True,
+            )
+        tokenizer.save_pretrained(tmp_dir)
+        model.config.save_pretrained(tmp_dir)
+        with open(os.path.join(tmp_dir, "export.json"), "w") as f:
+            json.dump({"repo": repo, "task": task, "opset": ONNX_OPSET}, f)
+
+        shutil.rmtree(model_dir, ignore_errors=True)
+        os.replace(tmp_dir, model_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def ensure_onnx_model(
+    repo: str, task: str, quantize: bool, cache_dir: str = ONNX_CACHE_DIR
+) -> str:
+    """
+    Path to the cached ONNX model for repo, exporting (and quantizing) it
+    on first use.
+    """
+    model_dir = _model_dir(repo, cache_dir)
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    if not os.path.exists(fp32_path):
+        _export_onnx(repo, task, model_dir)
+    if not quantize:
+        return fp32_path
+
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp_path = int8_path + ".tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+def _length_batches(texts: Sequence[str], batch_size: int) -> Iterator[List[int]]:
+    """
+    Indices of texts grouped into batches of similar length, so each batch
+    is padded to its own longest text instead of the longest overall.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for i in range(0, len(order), batch_size):
+        yield order[i : i + batch_size]
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime on CPU, fp32 or dynamic int8.
+    Reproduces sentence-transformers' mean pooling + L2 normalisation and the
+    sentiment pipeline's softmax + argmax.
+    """
+
+    def __init__(self, quantize: bool = False, cache_dir: str = ONNX_CACHE_DIR):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError(
+                "the onnx backends need `onnxruntime` (pip install onnxruntime)"
+            ) from e
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.name = "onnx-int8" if quantize else "onnx"
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = os.getenv("INFERENCE_THREADS")
+        if threads:
+            opts.intra_op_num_threads = int(threads)
+
+        def _session(repo: str, task: str):
+            path = ensure_onnx_model(repo, task, quantize, cache_dir)
+            session = ort.InferenceSession(
+                path, opts, providers=["CPUExecutionProvider"]
+            )
+            return session, AutoTokenizer.from_pretrained(os.path.dirname(path))
+
+        self.embed_session, self.embed_tokenizer = _session(
+            EMBEDDING_REPO, "feature-extraction"
+        )
+        self.sent_session, self.sent_tokenizer = _session(SENTIMENT_MODEL, "sentiment")
+        config = AutoConfig.from_pretrained(_model_dir(SENTIMENT_MODEL, cache_dir))
+        self.id2label: Dict[int, str] = {int(k): v for k, v in config.id2label.items()}
+
+    @staticmethod
+    def _feed(tokenizer, texts: List[str], max_tokens: int) -> Dict[str, np.ndarray]:
+        enc = tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=max_tokens,
+            return_tensors="np",
+        )
+        return {
+            "input_ids": enc["input_ids"].astype(np.int64),
+            "attention_mask": enc["attention_mask"].astype(np.int64),
+        }
+
+    def embed(self, texts: Sequence[str], batch_size: int = 32) -> np.ndarray:
+        out = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for idx in _length_batches(texts, batch_size):
+            feed = self._feed(
+                self.embed_tokenizer, [texts[i] for i in idx], EMBEDDING_MAX_TOKENS
+            )
+            hidden = self.embed_session.run(None, feed)[0]
+
+            mask = feed["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            out[idx] = pooled / np.clip(norms, 1e-12, None)
+        return out
+
+    def classify(self, texts: Sequence[str], batch_size: int = 64) -> List[dict]:
+        results: List[dict] = [{} for _ in texts]
+        for idx in _length_batches(texts, batch_size):
+            feed = self._feed(
+                self.sent_tokenizer, [texts[i] for i in idx], SENTIMENT_MAX_TOKENS
+            )
+            logits = self.sent_session.run(None, feed)[0]
+
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs = exp / exp.sum(axis=1, keepdims=True)
+            best = probs.argmax(axis=1)
+            for row, i in enumerate(idx):
+                results[i] = {
+                    "label": self.id2label[int(best[row])],
+                    "score": float(probs[row, best[row]]),
+                }
+        return results
+
+
+def load_backend(name: str = DEFAULT_BACKEND):
+    """
+    Instantiate one of BACKENDS.
+    """
+    if name == "torch":
+        return TorchBackend()
+    if name in ("onnx", "onnx-int8"):
+        return OnnxBackend(quantize=name == "onnx-int8")
+    raise ValueError(f"unknown inference backend {name!r}; expected one of {BACKENDS}")
@@ -0,0 +1,64 @@
+import hashlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.inference import EMBEDDING_MODEL, SENTIMENT_MODEL
+from app.core.sentiment import WINDOW_CHARS, WINDOW_STRIDE
+from app.models.embedding_cache import EmbeddingCache
+
+# Stored on every processed call and used as the cache key: changing a model
+# or the sentiment windows makes existing rows stale and reprocesses them.
+INSIGHTS_MODEL = (
+    f"{EMBEDDING_MODEL}|{SENTIMENT_MODEL}|win{WINDOW_CHARS}s{WINDOW_STRIDE}"
+)
+
+# (embedding, sentiment timeline) as stored on a call
+Insights = Tuple[list, Optional[list]]
+
+
+def transcript_hash(transcript: Optional[str]) -> str:
+    """
+    sha256 hex digest of the transcript text; matches
+    encode(sha256(convert_to(coalesce(transcript, ''), 'UTF8')), 'hex') in SQL.
+    """
+    return hashlib.sha256((transcript or "").encode("utf-8")).hexdigest()
+
+
+def lookup_insights(
+    session: Session, hashes: Iterable[str], model: str
+) -> Dict[str, Insights]:
+    """
+    Cached insights for the given content hashes computed with `model`.
+    """
+    keys = list(set(hashes))
+    if not keys:
+        return {}
+    rows = session.query(EmbeddingCache).filter(
+        EmbeddingCache.model == model, EmbeddingCache.content_hash.in_(keys)
+    )
+    return {r.content_hash: (r.embedding, r.sentiment_timeline) for r in rows}
+
+
+def store_insights(session: Session, model: str, entries: Dict[str, Insights]) -> None:
+    """
+    Add freshly computed insights to the cache; existing keys are left as is.
+    The caller commits.
+    """
+    if not entries:
+        return
+    stmt = insert(EmbeddingCache).values(
+        [
+            dict(
+                content_hash=h,
+                model=model,
+                embedding=embedding,
+                sentiment_timeline=timeline,
+            )
+            for h, (embedding, timeline) in entries.items()
+        ]
+    )
+    session.execute(
+        stmt.on_conflict_do_nothing(index_elements=["content_hash", "model"])
+    )
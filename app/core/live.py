@@ -0,0 +1,461 @@
+"""
+Live calls: transcripts streamed in over /ws/ingest/{call_id} while the
+call is going on, analysed as they grow and stored when the stream ends.
+
+- Talk ratio is kept as running word counts (app.core.talk_ratio), so a
+  chunk costs its own length, not the transcript's
+- Sentiment uses the populator's windows (split_windows). A window is scored
+  as soon as the text that decides its edges is in, so the live timeline is
+  the one the batch run would have computed
+- Windows of every live call go through one BatchWorker: while the model
+  runs, new windows queue up and are scored together in the next batch
+- Viewers of /ws/sentiment/{call_id} subscribe to the LiveCall and get the
+  segments scored so far, then each new one as it is scored
+- When the stream ends the transcript is embedded (through its own
+  BatchWorker) and the call is stored with its insights, fingerprint,
+  duplicate flag and rollups, as the loader plus populator would have
+
+Live calls and workers are per process: a viewer connected to another
+worker sees the call once it is stored.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import hmac
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.dedup import fingerprint, flag_duplicates
+from app.core.inference import DEFAULT_BACKEND, load_backend
+from app.core.insights_cache import INSIGHTS_MODEL, store_insights, transcript_hash
+from app.core.partitions import ensure_partitions_for
+from app.core.rollups import refresh_agent_rollups, touched_days
+from app.core.sentiment import (
+    WINDOW_CHARS,
+    Span,
+    build_timeline,
+    normalize_sentiment,
+    overall_score,
+    split_windows,
+)
+from app.core.talk_ratio import TalkRatio
+from app.models.call import Call, CallTranscript
+
+log = logging.getLogger(__name__)
+
+LIVE_INFERENCE_BACKEND = os.getenv("LIVE_INFERENCE_BACKEND", DEFAULT_BACKEND)
+# Most windows / transcripts per model call
+LIVE_SENTIMENT_BATCH = int(os.getenv("LIVE_SENTIMENT_BATCH", "64"))
+LIVE_EMBEDDING_BATCH = 32
+# How long a batch waits for more work once its first item is in
+LIVE_BATCH_WAIT_MS = float(os.getenv("LIVE_BATCH_WAIT_MS", "10"))
+# Ingest clients must present this token; without it ingestion is off
+INGEST_TOKEN = os.getenv("INGEST_TOKEN", "")
+
+Job = Tuple[List[str], concurrent.futures.Future]
+
+
+class BatchWorker:
+    """
+    One thread running a model function for any number of coroutines.
+
+    run() queues a list of texts and waits on the event loop. The thread
+    takes the oldest job, then whatever else arrives within `max_wait`
+    seconds, up to `max_batch` texts, makes one model call for all of them
+    and hands each job its slice of the outputs. The thread starts on first
+    use, so a process that forks its workers never starts one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[List[str]], Sequence],
+        max_batch: int,
+        max_wait: float,
+    ) -> None:
+        self.name = name
+        self._fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Job]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._starting = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.busy_s = 0.0
+
+    async def run(self, texts: List[str]) -> list:
+        if not texts:
+            return []
+        if self._thread is None:
+            with self._starting:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._loop, name=f"live-{self.name}", daemon=True
+                    )
+                    self._thread.start()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((texts, future))
+        return await asyncio.wrap_future(future)
+
+    def _take(self) -> List[Job]:
+        jobs = [self._queue.get()]
+        size = len(jobs[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            try:
+                job = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            jobs.append(job)
+            size += len(job[0])
+        return jobs
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self._run_batch(self._take())
+            except Exception:
+                # Never lose the thread: later run() calls would wait forever
+                log.exception("Live %s worker batch failed", self.name)
+
+    def _run_batch(self, jobs: List[Job]) -> None:
+        # A job whose awaiter was cancelled (asyncio.wrap_future cancels the
+        # future) takes no part in the batch
+        jobs = [job for job in jobs if job[1].set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        texts = [t for job_texts, _ in jobs for t in job_texts]
+        started = time.perf_counter()
+        try:
+            outputs = self._fn(texts)
+        except Exception as e:
+            for _, future in jobs:
+                future.set_exception(e)
+            return
+        finally:
+            self.busy_s += time.perf_counter() - started
+        self.batches += 1
+        self.items += len(texts)
+        pos = 0
+        for job_texts, future in jobs:
+            future.set_result(list(outputs[pos : pos + len(job_texts)]))
+            pos += len(job_texts)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "busy_s": round(self.busy_s, 3),
+            "queued": self._queue.qsize(),
+        }
+
+
+# Inference backend of the live workers: the preloaded one if any, else
+# loaded on first use; set_live_models() replaces it (tests)
+_models: Optional[Any] = None
+_loading = threading.Lock()
+
+
+def live_models() -> Any:
+    global _models
+    with _loading:
+        if _models is None:
+            from app.core import preload
+
+            _models = preload.models or load_backend(LIVE_INFERENCE_BACKEND)
+    return _models
+
+
+def set_live_models(models: Optional[Any]) -> None:
+    global _models
+    _models = models
+
+
+sentiment_worker = BatchWorker(
+    "sentiment",
+    lambda texts: live_models().classify(texts, batch_size=LIVE_SENTIMENT_BATCH),
+    max_batch=LIVE_SENTIMENT_BATCH,
+    max_wait=LIVE_BATCH_WAIT_MS / 1000,
+)
+embedding_worker = BatchWorker(
+    "embedding",
+    lambda texts: live_models().embed(texts, batch_size=LIVE_EMBEDDING_BATCH),
+    max_batch=LIVE_EMBEDDING_BATCH,
+    max_wait=LIVE_BATCH_WAIT_MS / 1000,
+)
+
+
+class LiveCall:
+    """
+    A call being ingested. Only touched from the event loop.
+    """
+
+    def __init__(
+        self,
+        call_id: str,
+        agent_id: str,
+        customer_id: str,
+        language: str,
+        start_time: Optional[datetime] = None,
+        duration_seconds: Optional[int] = None,
+        replace: bool = False,
+    ) -> None:
+        self.call_id = call_id
+        self.agent_id = agent_id
+        self.customer_id = customer_id
+        self.language = language
+        if start_time is None:
+            start_time = datetime.now(timezone.utc)
+        elif start_time.tzinfo is None:
+            start_time = start_time.replace(tzinfo=timezone.utc)
+        self.start_time = start_time
+        self.duration_seconds = duration_seconds
+        # May overwrite a stored call with the same id
+        self.replace = replace
+        self.opened_at = time.monotonic()
+
+        self.talk = TalkRatio()
+        self.timeline: List[list] = []
+        self._parts: List[str] = []
+        self.length = 0
+        # Text from the start of the last scored window (or 0) on: windows
+        # are re-split from there, so no earlier text is looked at again
+        self._tail = ""
+        self._tail_at = 0
+        self._handed_out = False
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def append(self, chunk: str) -> None:
+        self._parts.append(chunk)
+        self.length += len(chunk)
+        self.talk.add(chunk)
+        self._tail += chunk
+
+    def ready_windows(self, final: bool = False) -> List[Tuple[Span, str]]:
+        """
+        Windows not scored yet whose edges can't move any more, with their
+        text; with final=True (stream over) every remaining one.
+
+        A window's end is picked within WINDOW_CHARS of its start, so it is
+        settled once the text reaches past that. Windows are handed out
+        once: the caller scores them and passes them to add_scores().
+        """
+        spans = split_windows(self._tail)
+        if self._handed_out:
+            # The tail starts with the last window handed out
+            spans = spans[1:]
+        if not final:
+            spans = [(s, e) for s, e in spans if s + WINDOW_CHARS < len(self._tail)]
+        ready = [
+            ((self._tail_at + s, self._tail_at + e), self._tail[s:e]) for s, e in spans
+        ]
+        if spans:
+            self._handed_out = True
+            cut = spans[-1][0]
+            self._tail = self._tail[cut:]
+            self._tail_at += cut
+        return ready
+
+    def add_scores(self, spans: Sequence[Span], scores: Sequence[float]) -> None:
+        """
+        Append scored windows to the timeline and push them to the viewers.
+        """
+        for segment in build_timeline(spans, scores):
+            self.timeline.append(segment)
+            self._publish(self.frame(len(self.timeline) - 1))
+
+    def frame(self, segment: int) -> dict:
+        """
+        A /ws/sentiment frame for one segment, live values included.
+        """
+        start, end, value = self.timeline[segment]
+        return {
+            "call_id": self.call_id,
+            "sentiment": round(max(-1.0, min(1.0, float(value))), 4),
+            "segment": segment,
+            "span": [int(start), int(end)],
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "live": True,
+            "agent_talk_ratio": round(self.talk.ratio, 4),
+        }
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        A queue with the frames of the segments scored so far, then every
+        new one; None once the call has ended.
+        """
+        frames: asyncio.Queue = asyncio.Queue()
+        for segment in range(len(self.timeline)):
+            frames.put_nowait(self.frame(segment))
+        self._subscribers.add(frames)
+        return frames
+
+    def unsubscribe(self, frames: asyncio.Queue) -> None:
+        self._subscribers.discard(frames)
+
+    def _publish(self, frame: Optional[dict]) -> None:
+        for frames in self._subscribers:
+            frames.put_nowait(frame)
+
+    def end(self) -> None:
+        self._publish(None)
+        self._subscribers.clear()
+
+
+def ingest_allowed(token: Optional[str]) -> bool:
+    """
+    Whether an ingest client's token is INGEST_TOKEN; always False when no
+    token is configured.
+    """
+    if not INGEST_TOKEN:
+        return False
+    return token is not None and hmac.compare_digest(token, INGEST_TOKEN)
+
+
+def call_exists(session: Session, call_id: str) -> bool:
+    """
+    Whether a call is stored under this id. Ends the session's transaction,
+    so a stream that goes on doesn't hold a connection.
+    """
+    try:
+        return (
+            session.execute(
+                select(Call.call_id).where(Call.call_id == call_id).limit(1)
+            ).first()
+            is not None
+        )
+    finally:
+        session.rollback()
+
+
+# Calls being ingested by this process, and what became of the finished ones
+_live: Dict[str, LiveCall] = {}
+_counts = {"opened": 0, "stored": 0, "discarded": 0, "failed": 0}
+
+
+def open_call(call: LiveCall) -> bool:
+    """
+    Register a live call; False if the call is already being ingested.
+    """
+    if call.call_id in _live:
+        return False
+    _live[call.call_id] = call
+    _counts["opened"] += 1
+    return True
+
+
+def get_live(call_id: str) -> Optional[LiveCall]:
+    return _live.get(call_id)
+
+
+def close_call(call: LiveCall, outcome: str) -> None:
+    """
+    Unregister a call ("stored", "discarded" or "failed") and end its
+    viewers' streams.
+    """
+    if _live.get(call.call_id) is call:
+        del _live[call.call_id]
+    _counts[outcome] += 1
+    call.end()
+
+
+async def score_windows(call: LiveCall, final: bool = False) -> int:
+    """
+    Score the call's newly settled windows on the sentiment worker and
+    publish them. Returns how many were scored.
+    """
+    ready = call.ready_windows(final=final)
+    if not ready:
+        return 0
+    outputs = await sentiment_worker.run([text for _, text in ready])
+    call.add_scores(
+        [span for span, _ in ready], [normalize_sentiment(o) for o in outputs]
+    )
+    return len(ready)
+
+
+async def embed_call(call: LiveCall) -> List[float]:
+    vectors = await embedding_worker.run([call.text()])
+    return [float(x) for x in vectors[0]]
+
+
+def store_call(session: Session, call: LiveCall, embedding: List[float]) -> None:
+    """
+    Write a finished live call with its insights, so the populator has
+    nothing left to do for it but topics and phrases. A call that already
+    exists is replaced, as on a re-import, only if the stream asked to;
+    otherwise this raises ValueError. Commits.
+    """
+    if not call.replace and call_exists(session, call.call_id):
+        raise ValueError(f"call {call.call_id} already exists")
+    ensure_partitions_for(session, [call.start_time])
+    session.commit()
+
+    text = call.text()
+    content_hash = transcript_hash(text)
+    minhash, lsh_bands = fingerprint(text)
+    timeline = call.timeline
+    duration = call.duration_seconds
+    if duration is None:
+        duration = int(time.monotonic() - call.opened_at)
+
+    # A replaced call may move to another day
+    days = touched_days(session, [call.call_id])
+    session.merge(
+        Call(
+            call_id=call.call_id,
+            agent_id=call.agent_id,
+            customer_id=call.customer_id,
+            language=call.language,
+            start_time=call.start_time,
+            duration_seconds=duration,
+            transcript_row=CallTranscript(call_id=call.call_id, transcript=text),
+            content_hash=content_hash,
+            minhash=minhash,
+            lsh_bands=lsh_bands,
+            embedding=embedding,
+            sentiment_timeline=timeline,
+            customer_sentiment_score=overall_score(timeline),
+            agent_talk_ratio=call.talk.ratio,
+            insights_hash=content_hash,
+            insights_model=INSIGHTS_MODEL,
+            topic_cluster=None,
+        )
+    )
+    store_insights(session, INSIGHTS_MODEL, {content_hash: (embedding, timeline)})
+    session.commit()
+
+    flagged = flag_duplicates(session, [call.call_id])
+    days |= touched_days(session, [call.call_id, *flagged])
+    session.commit()
+    refresh_agent_rollups(session, days)
+    session.commit()
+
+
+def live_stats() -> dict:
+    """
+    Calls being ingested, their viewers, and how well the model workers
+    batch (mean_batch near 1 means the workers are mostly idle).
+    """
+    return {
+        "active": len(_live),
+        "viewers": sum(len(c._subscribers) for c in _live.values()),
+        **_counts,
+        "sentiment": sentiment_worker.stats(),
+        "embedding": embedding_worker.stats(),
+    }
@@ -0,0 +1,222 @@
+"""
+Monthly range partitions of calls and call_transcripts on start_time.
+
+- Every month has one partition per table, named `<table>_pYYYY_MM` and
+  bounded [first of the month, first of the next) in UTC.
+- There is no default partition: a row for a month without a partition is
+  rejected, so writers create the months they need first
+  (ensure_partitions_for) and the nightly populator keeps
+  PARTITION_MONTHS_AHEAD months ready (ensure_future_partitions).
+- Retention is drop_partitions_before: dropping a month's tables is a
+  catalog operation, with no row-by-row DELETE and no dead tuples to vacuum.
+  The archiver (app.core.archive) uses drop_empty_partitions once it has
+  moved a whole month out.
+
+Indexes are declared on the parents, so Postgres creates them on every new
+partition. Queries filtering on start_time only touch the partitions in
+range (partition pruning).
+"""
+
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Referenced table first; drops go in reverse
+PARTITIONED_TABLES = ("calls", "call_transcripts")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    m = month.year * 12 + month.month - 1 + n
+    return date(m // 12, m % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _bound(month: date) -> str:
+    # Explicit UTC offset; ignored if the column is timestamp without time zone
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def _utc_date(value: str) -> date:
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return ts.date()
+
+
+def is_partitioned(session: Session, table: str) -> bool:
+    return bool(
+        session.execute(
+            text(
+                """
+                SELECT 1 FROM pg_partitioned_table p
+                JOIN pg_class c ON c.oid = p.partrelid
+                WHERE c.oid = to_regclass(:table)
+                """
+            ),
+            {"table": table},
+        ).scalar()
+    )
+
+
+def list_partitions(
+    session: Session, table: str
+) -> List[Tuple[str, Optional[date], Optional[date]]]:
+    """
+    (name, from, to) of each partition of table, oldest first; the bounds
+    are None for a default partition.
+    """
+    rows = session.execute(
+        text(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:table)
+            """
+        ),
+        {"table": table},
+    )
+    parts: List[Tuple[str, Optional[date], Optional[date]]] = []
+    for name, bound in rows:
+        m = BOUND_RE.search(bound or "")
+        if m:
+            parts.append((name, _utc_date(m.group(1)), _utc_date(m.group(2))))
+        else:
+            parts.append((name, None, None))
+    return sorted(parts, key=lambda p: (p[1] is not None, p[1] or date.min))
+
+
+def ensure_partitions(
+    session: Session,
+    months: Iterable[date],
+    tables: Sequence[str] = PARTITIONED_TABLES,
+) -> List[str]:
+    """
+    Create the monthly partitions covering the given dates, for each table
+    that is partitioned. Returns the partitions created; existing ones are
+    left alone. The caller commits.
+    """
+    wanted = sorted({month_start(m) for m in months})
+    created: List[str] = []
+    for table in tables:
+        if not wanted or not is_partitioned(session, table):
+            continue
+        existing = {name for name, _, _ in list_partitions(session, table)}
+        for month in wanted:
+            name = partition_name(table, month)
+            if name in existing:
+                continue
+            session.execute(
+                text(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                    f"FOR VALUES FROM ({_bound(month)}) "
+                    f"TO ({_bound(add_months(month, 1))})"
+                )
+            )
+            created.append(name)
+    return created
+
+
+def ensure_partitions_for(
+    session: Session,
+    timestamps: Iterable[Optional[datetime]],
+    tables: Sequence[str] = PARTITIONED_TABLES,
+) -> List[str]:
+    """
+    Partitions for the months of the given start times (naive ones are taken
+    as UTC), so a batch of rows can be inserted.
+    """
+    months = {
+        (ts.astimezone(timezone.utc) if ts.tzinfo else ts).date()
+        for ts in timestamps
+        if ts is not None
+    }
+    return ensure_partitions(session, months, tables)
+
+
+def ensure_future_partitions(
+    session: Session,
+    ahead: int = PARTITION_MONTHS_AHEAD,
+    today: Optional[date] = None,
+    tables: Sequence[str] = PARTITIONED_TABLES,
+) -> List[str]:
+    """
+    Partitions for the current month and the `ahead` months after it.
+    """
+    this_month = month_start(today or datetime.now(timezone.utc).date())
+    months = [add_months(this_month, i) for i in range(ahead + 1)]
+    return ensure_partitions(session, months, tables)
+
+
+def _drop(session: Session, table: str, name: str) -> None:
+    # A partition the foreign key points at can't be dropped while attached;
+    # detaching checks that nothing references it any more
+    session.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+    session.execute(text(f'DROP TABLE "{name}"'))
+
+
+def drop_partitions_before(
+    session: Session,
+    cutoff: date,
+    tables: Sequence[str] = PARTITIONED_TABLES,
+) -> List[str]:
+    """
+    Drop every partition that ends on or before cutoff, i.e. holds only
+    calls older than it. Transcripts go first so the foreign key never sees
+    a dangling row. Daily rollups are not touched, so the analytics history
+    outlives the raw calls. The caller commits.
+    """
+    dropped: List[str] = []
+    for table in reversed(tables):
+        if not is_partitioned(session, table):
+            continue
+        for name, _, upper in list_partitions(session, table):
+            if upper is not None and upper <= cutoff:
+                _drop(session, table, name)
+                dropped.append(name)
+    return dropped
+
+
+def drop_empty_partitions(
+    session: Session,
+    month: date,
+    tables: Sequence[str] = PARTITIONED_TABLES,
+) -> List[str]:
+    """
+    Drop the month's partitions if all of them are empty (e.g. once the
+    archiver has deleted its rows), giving the space back at once instead of
+    leaving dead tuples for vacuum. The partitions are locked before the
+    check, so a row written concurrently keeps them. The caller commits.
+    """
+    parts = [
+        (table, partition_name(table, month))
+        for table in tables
+        if is_partitioned(session, table)
+    ]
+    parts = [
+        (table, name)
+        for table, name in parts
+        if session.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar()
+    ]
+    for _, name in parts:
+        session.execute(text(f'LOCK TABLE "{name}" IN ACCESS EXCLUSIVE MODE'))
+    for _, name in parts:
+        if session.execute(text(f'SELECT 1 FROM "{name}" LIMIT 1')).first():
+            return []
+    for table, name in reversed(parts):
+        _drop(session, table, name)
+    return [name for _, name in parts]
@@ -0,0 +1,155 @@
+"""
+Per-agent phrase frequencies, kept as count-min sketches.
+
+Each populator run counts the 1 to PHRASE_WORDS word phrases of the calls
+it hasn't counted yet and adds them to their agent's sketch
+(`agent_phrase_sketches`), so a run costs the new transcripts only and a
+sketch stays the same size however many calls it has seen.
+
+Next to the sketch, each agent keeps its TOP_PHRASES heavy hitters: after a
+batch is added, the previous heavy hitters and every phrase of the batch
+are re-estimated from the sketch and the most frequent kept. The sketch
+remembers everything, so a phrase that climbs back into the top is
+counted in full. GET /analytics/agents/{agent_id}/phrases reads that list
+(one row), and estimates any other phrase straight from the sketch.
+
+Phrases don't cross sentence boundaries and don't start or end with a
+stopword or a word under three letters, so "refund" and "cancel my
+subscription" count, "the" and "to a" don't.
+"""
+
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.core.sketches import CountMinSketch
+from app.core.topics import SPEAKER_RE, STOPWORDS, transcripts_by_id
+from app.models.call import Call
+from app.models.phrase import AgentPhraseSketch
+
+PHRASE_WORDS = 3
+# Heavy hitters kept per agent (the endpoint's k is at most this)
+TOP_PHRASES = 200
+PHRASE_BATCH_ROWS = 1000
+
+SENTENCE_RE = re.compile(r"[.!?;\n]+")
+# Unlike the topic terms, short words stay: they are inside phrases
+WORD_RE = re.compile(r"[a-z][a-z0-9']*")
+
+
+def _edge_word(word: str) -> bool:
+    return len(word) > 2 and word not in STOPWORDS
+
+
+def normalize_phrase(text: str) -> str:
+    """
+    A phrase as it is counted: lowercase words, single spaces.
+    """
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+def phrases(text: str) -> Counter:
+    """
+    Occurrences of every countable phrase in a transcript.
+    """
+    counts: Counter = Counter()
+    for sentence in SENTENCE_RE.split(SPEAKER_RE.sub("\n", text.lower())):
+        words = WORD_RE.findall(sentence)
+        for n in range(1, PHRASE_WORDS + 1):
+            for i in range(len(words) - n + 1):
+                if not (_edge_word(words[i]) and _edge_word(words[i + n - 1])):
+                    continue
+                counts[" ".join(words[i : i + n])] += 1
+    return counts
+
+
+def _fold(session: Session, agent_id: str, counts: Counter, calls: int) -> None:
+    """
+    Add one batch of an agent's phrase counts to its sketch and re-pick
+    its heavy hitters.
+    """
+    row = session.get(AgentPhraseSketch, agent_id)
+    if row is None:
+        sketch = CountMinSketch()
+        row = AgentPhraseSketch(agent_id=agent_id, calls_seen=0, top_phrases=[])
+        session.add(row)
+    else:
+        sketch = CountMinSketch.from_bytes(row.sketch)
+    sketch.add(counts)
+
+    candidates = list({p for p, _ in row.top_phrases} | set(counts))
+    estimates = sketch.estimate(candidates)
+    top = sorted(zip(candidates, estimates), key=lambda pc: (-pc[1], pc[0]))
+
+    row.sketch = sketch.to_bytes()
+    row.top_phrases = [[p, int(c)] for p, c in top[:TOP_PHRASES]]
+    row.calls_seen += calls
+    row.phrases_seen = sketch.total
+
+
+def update_phrase_sketches(session: Session, rebuild: bool = False) -> Dict:
+    """
+    Count the phrases of every call whose current transcript isn't counted
+    yet (phrases_hash != content_hash), batch by batch, committing each.
+
+    A transcript that changed is counted again; its old version stays in the
+    sketch, which can't subtract it. rebuild=True starts from empty sketches.
+    Returns {"calls": counted, "agents": sketches updated}.
+    """
+    if rebuild:
+        session.execute(delete(AgentPhraseSketch))
+        session.execute(
+            update(Call)
+            .where(Call.phrases_hash.isnot(None))
+            .values(phrases_hash=None)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+    counted = 0
+    agents: set[str] = set()
+    while True:
+        # Index-only on ix_calls_phrases_pending; the transcripts are read
+        # by id afterwards
+        rows = session.execute(
+            select(Call.call_id, Call.start_time, Call.agent_id, Call.content_hash)
+            .where(
+                Call.agent_id.isnot(None),
+                Call.content_hash.isnot(None),
+                Call.phrases_hash.is_distinct_from(Call.content_hash),
+            )
+            .limit(PHRASE_BATCH_ROWS)
+        ).all()
+        if not rows:
+            break
+        texts = transcripts_by_id(session, [str(r.call_id) for r in rows])
+
+        per_agent: Dict[str, Tuple[Counter, List[str]]] = defaultdict(
+            lambda: (Counter(), [])
+        )
+        for r in rows:
+            counts, ids = per_agent[r.agent_id]
+            counts.update(phrases(texts.get(str(r.call_id), "")))
+            ids.append(str(r.call_id))
+        for agent_id, (counts, ids) in per_agent.items():
+            _fold(session, agent_id, counts, len(ids))
+
+        # The full table key sends each UPDATE straight to its partition
+        session.execute(
+            update(Call),
+            [
+                {
+                    "call_id": r.call_id,
+                    "start_time": r.start_time,
+                    "phrases_hash": r.content_hash,
+                }
+                for r in rows
+            ],
+        )
+        session.commit()
+        counted += len(rows)
+        agents.update(per_agent)
+    return {"calls": counted, "agents": len(agents)}
@@ -0,0 +1,82 @@
+"""
+Heavy, read-only state loaded once per host.
+
+In the gunicorn serving mode (gunicorn.conf.py, preload_app) preload_state()
+runs in the master before workers fork, so the embedding matrix and any
+models are shared copy-on-write. gc.freeze() moves everything allocated so
+far out of the collector's reach, so later collections in the workers don't
+touch (and un-share) those pages.
+
+A published embedding snapshot (app.core.snapshot) is memory-mapped instead
+of read from Postgres: instant, and shared through the page cache.
+"""
+
+import gc
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from app.core.embedding_index import (
+    EmbeddingIndex,
+    get_index,
+    loaded_generation,
+    set_index,
+)
+from app.core.procstats import memory_stats
+from app.core.snapshot import refresh_index
+from app.db import SessionLocal, dispose_engines
+
+log = logging.getLogger(__name__)
+
+PRELOAD_EMBEDDINGS = os.getenv("PRELOAD_EMBEDDINGS", "1") == "1"
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+
+# Inference backend (app.core.inference) when PRELOAD_MODELS is set
+models: Optional[Any] = None
+_preloaded = False
+
+
+def is_preloaded() -> bool:
+    return _preloaded
+
+
+def preload_state() -> None:
+    """
+    Load the embedding index (and the inference models, if enabled), then
+    freeze the GC so the loaded objects stay shared after fork.
+    """
+    global models, _preloaded
+
+    started = time.perf_counter()
+    gc.disable()
+    try:
+        if PRELOAD_EMBEDDINGS:
+            refresh_index()
+            if loaded_generation() is None:
+                # No snapshot yet. Not pinned: workers switch over once one
+                # is published
+                with SessionLocal() as session:
+                    set_index(EmbeddingIndex.from_db(session), pin=False)
+        if PRELOAD_MODELS:
+            from app.core.inference import load_backend
+
+            models = load_backend()
+    finally:
+        gc.freeze()
+        gc.enable()
+    # Never hand pooled connections (open sockets) down to forked workers
+    dispose_engines()
+    _preloaded = True
+
+    index = get_index()
+    log.info(
+        "Preloaded state in %.2fs (pid %d): %d embeddings (snapshot %s), "
+        "models=%s, memory=%s",
+        time.perf_counter() - started,
+        os.getpid(),
+        len(index) if index is not None else 0,
+        index.generation if index is not None else None,
+        getattr(models, "name", None),
+        memory_stats(),
+    )
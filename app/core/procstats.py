@@ -0,0 +1,64 @@
+import os
+import resource
+import time
+from typing import Dict
+
+
+def memory_stats() -> Dict[str, float]:
+    """
+    Memory of the current process in MB.
+
+    On Linux, /proc/self/smaps_rollup splits RSS into pages shared with other
+    processes (e.g. state preloaded before fork) and private ones; PSS charges
+    each shared page proportionally, so summing PSS over workers gives the
+    real footprint. Elsewhere only the peak RSS is available.
+    """
+    fields = {
+        "Rss": "rss_mb",
+        "Pss": "pss_mb",
+        "Shared_Clean": "shared_mb",
+        "Shared_Dirty": "shared_mb",
+        "Private_Clean": "private_mb",
+        "Private_Dirty": "private_mb",
+    }
+    try:
+        stats: Dict[str, float] = {}
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    mb = int(rest.split()[0]) / 1024
+                    stats[fields[key]] = round(stats.get(fields[key], 0.0) + mb, 1)
+        return stats
+    except OSError:
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        divisor = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+        return {"peak_rss_mb": round(peak / divisor, 1)}
+
+
+def open_fds() -> int:
+    """
+    Number of open file descriptors (-1 where /proc is unavailable).
+    """
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def process_uptime() -> float:
+    """
+    Seconds since this process started (for a forked worker: since the fork).
+    Falls back to CPU time where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime, in clock ticks since boot); the command name
+            # in field 2 may contain spaces, so split after its closing paren
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.process_time()
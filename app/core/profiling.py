@@ -0,0 +1,410 @@
+"""
+Opt-in sampling profiler for single requests and script runs.
+
+While a profile is active, a background thread samples the Python stacks
+of the threads it watches every PROFILE_INTERVAL seconds. SQL statements
+run under the profile are timed, and a sample taken while a statement is
+in flight gets a `sql: ...` leaf frame, so database time shows up in the
+flame graph next to the Python frames that issued it.
+
+- Requests: routes on a ProfiledRoute router are profiled when the request
+  carries the PROFILE_TOKEN, as an `X-Profile` header or a `?profile=`
+  query parameter. The response names the written file in `X-Profile`.
+  Without PROFILE_TOKEN set, profiling is off entirely.
+- Scripts: `with profile_run("populator"):` profiles the whole block
+  (the `--profile` flag of the populator and loader).
+
+Profiles are written to PROFILE_DIR as speedscope JSON (open in
+https://www.speedscope.app; the SQL timings are under "sql") or as
+collapsed stacks for flamegraph.pl, with the SQL timings in a .sql.json
+file next to them.
+
+With no profile active, a request pays for one header lookup and each SQL
+statement for one context variable lookup.
+"""
+
+from __future__ import annotations
+
+import functools
+import hmac
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Seconds between samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_FORMATS = ("speedscope", "collapsed")
+# Statements kept verbatim per profile; the rest are only aggregated
+SQL_LOG_LIMIT = 200
+SQL_TEXT_CHARS = 120
+
+# (function, file, first line) of one stack frame
+Frame = Tuple[str, str, int]
+
+_current: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+# Request profiles run one at a time; another authorized request meanwhile
+# runs unprofiled
+_request_slot = threading.Lock()
+
+
+def _sql_text(statement: str) -> str:
+    return " ".join(statement.split())[:SQL_TEXT_CHARS]
+
+
+def _sql_frame(statement: str) -> Frame:
+    return ("sql: " + _sql_text(statement), "<sql>", 0)
+
+
+class Profile:
+    """
+    Samples collected for one request or script run, with its SQL timings.
+    """
+
+    def __init__(self, name: str, all_threads: bool = False):
+        self.name = name
+        self.all_threads = all_threads
+        self.threads: Dict[int, int] = defaultdict(int)
+        # Samples in order, consecutive identical stacks merged: [stack, seconds]
+        self.samples: List[list] = []
+        # Statement in flight per thread, with its start time
+        self.in_flight: Dict[int, Tuple[str, float]] = {}
+        self.sql: List[dict] = []
+        self.sql_totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    # --- threads ---
+
+    @contextmanager
+    def watching(self) -> Iterator[None]:
+        """
+        Sample the calling thread while the block runs (re-entrant).
+        """
+        tid = threading.get_ident()
+        self.threads[tid] += 1
+        try:
+            yield
+        finally:
+            self.threads[tid] -= 1
+            if not self.threads[tid]:
+                del self.threads[tid]
+
+    def start(self) -> None:
+        self._sampler = threading.Thread(
+            target=self._run, name=f"profiler-{self.name}", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(PROFILE_INTERVAL):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frames = sys._current_frames()
+            tids = frames.keys() if self.all_threads else list(self.threads)
+            for tid in tids:
+                frame = frames.get(tid)
+                if frame is None or tid == own:
+                    continue
+                stack = self._stack(frame)
+                running = self.in_flight.get(tid)
+                if running is not None:
+                    stack = stack + (_sql_frame(running[0]),)
+                if self.samples and self.samples[-1][0] == stack:
+                    self.samples[-1][1] += weight
+                else:
+                    self.samples.append([stack, weight])
+
+    @staticmethod
+    def _stack(frame) -> Tuple[Frame, ...]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    # --- SQL ---
+
+    def sql_started(self, statement: str) -> None:
+        self.in_flight[threading.get_ident()] = (statement, time.perf_counter())
+
+    def sql_finished(self) -> None:
+        running = self.in_flight.pop(threading.get_ident(), None)
+        if running is None:
+            return
+        statement, started = running
+        ms = (time.perf_counter() - started) * 1000
+        key = _sql_text(statement)
+        totals = self.sql_totals[key]
+        totals[0] += 1
+        totals[1] += ms
+        if len(self.sql) < SQL_LOG_LIMIT:
+            self.sql.append(
+                {
+                    "at_ms": round((started - self.started) * 1000, 3),
+                    "ms": round(ms, 3),
+                    "statement": key,
+                }
+            )
+
+    def sql_summary(self) -> dict:
+        totals = sorted(self.sql_totals.items(), key=lambda item: -item[1][1])
+        return {
+            "count": int(sum(n for n, _ in self.sql_totals.values())),
+            "total_ms": round(sum(ms for _, ms in self.sql_totals.values()), 3),
+            "by_statement": [
+                {"statement": s, "count": int(n), "total_ms": round(ms, 3)}
+                for s, (n, ms) in totals
+            ],
+            "statements": self.sql,
+        }
+
+    # --- output ---
+
+    def speedscope(self) -> dict:
+        frames: Dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, weight in self.samples:
+            samples.append([frames.setdefault(f, len(frames)) for f in stack])
+            weights.append(round(weight * 1000, 3))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "call-analytics profiler",
+            "shared": {
+                "frames": [
+                    {"name": name, "file": file, "line": line}
+                    for name, file, line in frames
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": self.name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": round(sum(weights), 3),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "elapsed_ms": round(self.elapsed * 1000, 3),
+            "sql": self.sql_summary(),
+        }
+
+    def collapsed(self) -> str:
+        totals: Dict[str, float] = defaultdict(float)
+        for stack, weight in self.samples:
+            key = ";".join(
+                f"{name} ({os.path.basename(file)}:{line})" if line else name
+                for name, file, line in stack
+            )
+            totals[key] += weight
+        # flamegraph.pl wants integer counts: microseconds
+        return "".join(
+            f"{key} {max(1, round(w * 1e6))}\n" for key, w in sorted(totals.items())
+        )
+
+    def write(self, fmt: str = "speedscope", directory: Optional[str] = None) -> str:
+        """
+        Write the profile into directory (PROFILE_DIR); returns the path.
+        """
+        if fmt not in PROFILE_FORMATS:
+            raise ValueError(f"unknown profile format {fmt!r}")
+        directory = directory or PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S.%f")
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in self.name)
+        base = os.path.join(directory, f"{stamp}-{safe}")
+        if fmt == "speedscope":
+            path = base + ".speedscope.json"
+            with open(path, "w") as f:
+                json.dump(self.speedscope(), f)
+        else:
+            path = base + ".collapsed.txt"
+            with open(path, "w") as f:
+                f.write(self.collapsed())
+            with open(base + ".sql.json", "w") as f:
+                json.dump(self.sql_summary(), f)
+        return path
+
+
+# --- SQL hooks ---
+
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None:
+        profile.sql_started(statement)
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None:
+        profile.sql_finished()
+
+
+def _handle_error(exception_context):
+    profile = _current.get()
+    if profile is not None:
+        profile.sql_finished()
+
+
+def _install_sql_hooks() -> None:
+    """
+    Time statements on every engine. Installed with the first profile, so a
+    process that never profiles has no listeners at all.
+    """
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_execute)
+        event.listen(Engine, "after_cursor_execute", _after_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+        _hooks_installed = True
+
+
+@contextmanager
+def profiling(name: str, all_threads: bool = False) -> Iterator[Profile]:
+    """
+    Profile the block: SQL run in this context is timed, and the threads
+    that enter profile.watching() (or all threads) are sampled. The caller
+    writes the result.
+    """
+    _install_sql_hooks()
+    profile = Profile(name, all_threads=all_threads)
+    token = _current.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _current.reset(token)
+
+
+@contextmanager
+def profile_run(
+    name: str, fmt: Optional[str] = "speedscope", directory: Optional[str] = None
+) -> Iterator[Optional[Profile]]:
+    """
+    For scripts: profile every thread of the block when fmt is set, then
+    write the profile and print where. With fmt=None it does nothing.
+    """
+    if fmt is None:
+        yield None
+        return
+    profile = None
+    try:
+        with profiling(name, all_threads=True) as profile:
+            yield profile
+    finally:
+        # Written even when the run fails: that is often the one to look at
+        if profile is not None:
+            path = profile.write(fmt, directory)
+            summary = profile.sql_summary()
+            print(
+                f"Profile written to {path} ({profile.elapsed:.1f}s, "
+                f"{summary['count']} SQL statements, "
+                f"{summary['total_ms'] / 1000:.1f}s in SQL)"
+            )
+
+
+# --- requests ---
+
+
+def _requested(request: Request) -> bool:
+    if not PROFILE_TOKEN:
+        return False
+    given = request.headers.get("x-profile") or request.query_params.get("profile")
+    return given is not None and hmac.compare_digest(given, PROFILE_TOKEN)
+
+
+def _watched(endpoint: Callable) -> Callable:
+    """
+    Wrap an endpoint so the thread it runs on (a threadpool worker for sync
+    endpoints) is sampled by the request's profile, if it has one.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def watched_async(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            with profile.watching():
+                return await endpoint(*args, **kwargs)
+
+        setattr(watched_async, "_profiled", True)
+        return watched_async
+
+    @functools.wraps(endpoint)
+    def watched(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        with profile.watching():
+            return endpoint(*args, **kwargs)
+
+    setattr(watched, "_profiled", True)
+    return watched
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Route class profiling requests that carry the PROFILE_TOKEN.
+    `X-Profile-Format: collapsed` picks the output format.
+    """
+
+    def get_route_handler(self) -> Callable:
+        # Wrapped here rather than in __init__: FastAPI has already read the
+        # endpoint's signature from the original function by now
+        call = self.dependant.call
+        if call is not None and not getattr(call, "_profiled", False):
+            self.dependant.call = _watched(call)
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request: Request) -> Response:
+            if not _requested(request) or not _request_slot.acquire(blocking=False):
+                return await handler(request)
+            try:
+                fmt = request.headers.get("x-profile-format", "speedscope")
+                if fmt not in PROFILE_FORMATS:
+                    fmt = "speedscope"
+                with profiling(f"{request.method} {self.path}") as profile:
+                    response = await handler(request)
+                path = profile.write(fmt)
+            finally:
+                _request_slot.release()
+            response.headers["X-Profile"] = path
+            return response
+
+        return profiled_handler
@@ -0,0 +1,120 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, Sequence, Set, Tuple
+
+from sqlalchemy import Date, cast, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.sketches import TDigest
+from app.models.call import Call
+from app.models.rollup import AgentDailyRollup
+
+# Keeps the IN (...) lists sent to Postgres at a sane size
+ID_CHUNK = 1000
+
+# Calendar day of a call in UTC, the same day boundaries the API filters use
+call_day = cast(func.timezone("UTC", Call.start_time), Date)
+
+
+def touched_days(session: Session, call_ids: Sequence[str]) -> Set[date]:
+    """
+    Return the days the given calls currently fall on in the DB.
+    Run it before and after committing an update to catch calls moved between days.
+    """
+    days: Set[date] = set()
+    for i in range(0, len(call_ids), ID_CHUNK):
+        chunk = list(call_ids[i : i + ID_CHUNK])
+        rows = (
+            session.query(call_day)
+            .filter(Call.call_id.in_(chunk), Call.start_time.isnot(None))
+            .distinct()
+            .all()
+        )
+        days.update(r[0] for r in rows)
+    return days
+
+
+def all_call_days(session: Session) -> Set[date]:
+    """
+    Every day that has at least one call, for a full rollup rebuild.
+    """
+    rows = session.query(call_day).filter(Call.start_time.isnot(None)).distinct()
+    return {r[0] for r in rows}
+
+
+def refresh_agent_rollups(session: Session, days: Iterable[date]) -> int:
+    """
+    Recompute `agent_daily_rollups` for the given days only.
+
+    - Deletes the existing rows for those days
+    - Re-reads the matching calls once and, per agent and day, writes the sums
+      plus t-digest sketches of sentiment, talk ratio and duration
+    - Writes each agent-day again with deduplicated=True, over only the calls
+      that aren't near-duplicates of an earlier one (app.core.dedup)
+    Returns the number of rollup rows written. The caller commits.
+    """
+    day_list = sorted(set(days))
+    if not day_list:
+        return 0
+
+    session.execute(delete(AgentDailyRollup).where(AgentDailyRollup.day.in_(day_list)))
+
+    calls = session.execute(
+        select(
+            Call.agent_id,
+            call_day,
+            Call.customer_sentiment_score,
+            Call.agent_talk_ratio,
+            Call.duration_seconds,
+            Call.duplicate_of.is_(None),
+        ).where(
+            # The range lets Postgres use ix_calls_start_time; the IN list
+            # drops the untouched days inside that range.
+            Call.start_time >= _utc_midnight(day_list[0]),
+            Call.start_time < _utc_midnight(day_list[-1] + timedelta(days=1)),
+            call_day.in_(day_list),
+            Call.agent_id.isnot(None),
+        )
+    ).all()
+
+    groups: Dict[Tuple[str, date, bool], list] = defaultdict(list)
+    for agent_id, day, sentiment, ratio, duration, unique in calls:
+        groups[(agent_id, day, False)].append((sentiment, ratio, duration))
+        if unique:
+            groups[(agent_id, day, True)].append((sentiment, ratio, duration))
+
+    rows = []
+    for (agent_id, day, deduplicated), values in groups.items():
+        sentiment, ratio, duration = (list(col) for col in zip(*values))
+        rows.append(
+            dict(
+                agent_id=agent_id,
+                day=day,
+                deduplicated=deduplicated,
+                call_count=len(values),
+                sentiment_sum=_sum(sentiment),
+                sentiment_count=_count(sentiment),
+                talk_ratio_sum=_sum(ratio),
+                talk_ratio_count=_count(ratio),
+                duration_sum=int(_sum(duration)),
+                sentiment_sketch=TDigest.from_values(sentiment).to_bytes(),
+                talk_ratio_sketch=TDigest.from_values(ratio).to_bytes(),
+                duration_sketch=TDigest.from_values(duration).to_bytes(),
+            )
+        )
+
+    if rows:
+        session.execute(insert(AgentDailyRollup), rows)
+    return len(rows)
+
+
+def _utc_midnight(day: date) -> datetime:
+    return datetime.combine(day, time(), tzinfo=timezone.utc)
+
+
+def _sum(values: list) -> float:
+    return float(sum(v for v in values if v is not None))
+
+
+def _count(values: list) -> int:
+    return sum(1 for v in values if v is not None)
@@ -1,36 +1,128 @@
 import logging
+import os
 import subprocess
+from typing import Optional
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from pytz import timezone
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from app.db import engine
 
 log = logging.getLogger(__name__)
-scheduler = BackgroundScheduler(timezone=timezone("Asia/Kolkata"))
+
+# Every API worker calls start_scheduler(); only the process holding this
+# Postgres advisory lock runs the jobs, across all hosts sharing the database.
+# The lock is tied to a connection held for the process's lifetime, so it dies
+# with the process (or its connection) and a restarted worker can take over.
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", "7243110"))
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+# Monthly archival of old calls (scripts/archive_calls.py); opt-in, since it
+# deletes rows from Postgres
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "0") == "1"
+
+scheduler = None
+_lock_conn: Optional[Connection] = None
+
+
+def _acquire_leader_lock() -> bool:
+    """
+    Take (or confirm) the scheduler's advisory lock on the held connection,
+    opening a new one when there is none or the old one broke. Session locks
+    are re-entrant, so confirming one this process holds always succeeds.
+    """
+    global _lock_conn
+    for fresh in (False, True):
+        if _lock_conn is None or fresh:
+            _release_leader_lock()
+            _lock_conn = engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+        try:
+            held = _lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"),
+                {"key": SCHEDULER_LOCK_KEY},
+            ).scalar()
+        except DBAPIError:
+            if fresh:
+                raise
+            log.warning("Scheduler lock connection lost; reconnecting.")
+            continue
+        if not held:
+            _release_leader_lock()
+        return bool(held)
+    return False
+
+
+def _release_leader_lock() -> None:
+    global _lock_conn
+    if _lock_conn is not None:
+        # Invalidated rather than returned to the pool: ending the Postgres
+        # session is what releases its advisory locks
+        conn, _lock_conn = _lock_conn, None
+        conn.invalidate()
+        conn.close()
 
 
 def start_scheduler():
+    global scheduler
+    if not SCHEDULER_ENABLED:
+        log.info("Scheduler disabled (SCHEDULER_ENABLED=0).")
+        return
+    try:
+        leader = _acquire_leader_lock()
+    except DBAPIError as e:
+        log.error("Scheduler not started: cannot reach the database (%s)", e)
+        return
+    if not leader:
+        log.info("Scheduler runs in another process; pid %d skips it.", os.getpid())
+        return
+
+    # Imported here so workers that don't run the scheduler never load it
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from pytz import timezone
+
+    scheduler = BackgroundScheduler(timezone=timezone("Asia/Kolkata"))
     # Run every night at 02:30 IST
     scheduler.add_job(run_ai_populator, CronTrigger(hour=2, minute=30))
+    if ARCHIVE_ENABLED:
+        # 04:00 IST on the 1st of each month
+        scheduler.add_job(run_archiver, CronTrigger(day=1, hour=4, minute=0))
     scheduler.start()
-    log.info("Nightly AI insights job scheduled for 02:30 IST.")
+    log.info("Nightly AI insights job scheduled for 02:30 IST (pid %d).", os.getpid())
 
 
-def run_ai_populator():
-    log.info("Starting nightly AI insights populator...")
+def _run_script(name: str, path: str):
+    # If the lock's connection dropped, another worker may have taken over
     try:
-        result = subprocess.run(
-            ["python3", "scripts/ai_insights_populator.py"],
-            capture_output=True,
-            text=True,
-        )
+        leader = _acquire_leader_lock()
+    except DBAPIError as e:
+        log.error("Skipping %s: cannot reach the database (%s)", name, e)
+        return
+    if not leader:
+        log.warning("Skipping %s: another process took the scheduler lock.", name)
+        return
+    log.info("Starting %s...", name)
+    try:
+        result = subprocess.run(["python3", path], capture_output=True, text=True)
         if result.returncode == 0:
-            log.info("AI insights populator finished successfully:\n%s", result.stdout)
+            log.info("%s finished successfully:\n%s", name, result.stdout)
         else:
-            log.error("AI insights populator failed:\n%s", result.stderr)
+            log.error("%s failed:\n%s", name, result.stderr)
     except Exception as e:
-        log.exception("Error running AI insights populator: %s", e)
+        log.exception("Error running %s: %s", name, e)
+
+
+def run_ai_populator():
+    _run_script("AI insights populator", "scripts/ai_insights_populator.py")
+
+
+def run_archiver():
+    _run_script("call archiver", "scripts/archive_calls.py")
 
 
 def shutdown_scheduler():
-    scheduler.shutdown()
+    if scheduler is not None:
+        scheduler.shutdown()
+    _release_leader_lock()
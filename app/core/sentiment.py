@@ -0,0 +1,83 @@
+from typing import List, Optional, Sequence, Tuple
+
+# Sliding windows over the transcript, in characters. Windows overlap by
+# WINDOW_CHARS - WINDOW_STRIDE so a sentence cut at one edge is seen whole
+# by the neighbouring window.
+WINDOW_CHARS = 512
+WINDOW_STRIDE = 384
+
+Span = Tuple[int, int]
+
+
+def split_windows(
+    text: str, size: int = WINDOW_CHARS, stride: int = WINDOW_STRIDE
+) -> List[Span]:
+    """
+    Split a transcript into overlapping (start, end) character windows
+    covering the whole text.
+    Window edges are moved to whitespace so words are not cut in half.
+    """
+    n = len(text)
+    spans: List[Span] = []
+    start = 0
+
+    while start < n:
+        end = min(start + size, n)
+        if end < n:
+            cut = max(text.rfind(" ", start, end), text.rfind("\n", start, end))
+            if cut > start + size // 2:
+                end = cut
+
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end >= n:
+            break
+
+        # Next window starts one stride later (never past this window's end)
+        # and is nudged forward to the beginning of the next word.
+        nxt = min(start + stride, end)
+        if not text[nxt - 1].isspace():
+            ws = text.find(" ", nxt, end)
+            if ws != -1:
+                nxt = ws + 1
+        start = nxt
+
+    return spans
+
+
+def normalize_sentiment(label_score) -> float:
+    """
+    Convert a Hugging Face sentiment output to a numeric score:
+    - Positive → positive number
+    - Negative → negative number
+    - Magnitude = confidence score from the model
+    """
+    label = label_score["label"].lower()
+    score = label_score["score"]
+    if "neg" in label:
+        return -score
+    return score
+
+
+def build_timeline(spans: Sequence[Span], scores: Sequence[float]) -> List[list]:
+    """
+    Pack windows and their scores into the compact timeline stored per call:
+    [[start, end, score], ...] with scores rounded to 4 decimals.
+    """
+    return [[s, e, round(float(v), 4)] for (s, e), v in zip(spans, scores)]
+
+
+def overall_score(timeline: Sequence[Sequence[float]]) -> Optional[float]:
+    """
+    Length-weighted mean of the segment scores, so a long stretch of the
+    call counts more than a one-line greeting.
+    Returns None for an empty timeline.
+    """
+    total = 0.0
+    weighted = 0.0
+    for start, end, score in timeline:
+        length = max(int(end) - int(start), 1)
+        total += length
+        weighted += length * float(score)
+
+    return (weighted / total) if total else None
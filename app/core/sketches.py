@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import struct
+import zlib
+from typing import Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+
+# Compression of the digest: roughly COMPRESSION / 2 centroids are kept, with
+# the smallest ones at the tails where p10 / p90 need the resolution.
+COMPRESSION = 100
+
+# Serialized layout: version, min, max, then float32 means and float32 weights
+_HEADER = struct.Struct("<Bdd")
+_VERSION = 1
+
+# Count-min shape: an estimate exceeds the true count by at most e / CMS_WIDTH
+# of everything counted, with probability 1 - exp(-CMS_DEPTH)
+CMS_WIDTH = 4096
+CMS_DEPTH = 4
+# Serialized layout: version, depth, width, total, then zlib'd int64 counters
+_CMS_HEADER = struct.Struct("<BHIq")
+_CMS_VERSION = 1
+
+
+def _scale(q: np.ndarray, delta: float) -> np.ndarray:
+    """
+    t-digest k1 scale function: maps a quantile to its k index.
+    Adjacent centroids may merge while they share a unit of k.
+    """
+    return delta / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0.0, 1.0) - 1)
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest).
+
+    Centroids are held as two NumPy arrays, and both building and merging are
+    a sort plus one grouped reduction, so merging k sketches costs
+    O(total centroids), not O(values seen).
+    """
+
+    def __init__(
+        self,
+        means: np.ndarray,
+        weights: np.ndarray,
+        vmin: float = float("nan"),
+        vmax: float = float("nan"),
+        delta: int = COMPRESSION,
+    ):
+        self.means = means
+        self.weights = weights
+        self.min = vmin
+        self.max = vmax
+        self.delta = delta
+
+    @classmethod
+    def from_values(
+        cls, values: Iterable[Optional[float]], delta: int = COMPRESSION
+    ) -> TDigest:
+        """
+        Build a digest from raw values; None / NaN are skipped.
+        """
+        arr = np.array([v for v in values if v is not None], dtype=np.float64)
+        arr = arr[~np.isnan(arr)]
+        if arr.size == 0:
+            return cls.empty(delta)
+        return cls._compress(
+            arr, np.ones_like(arr), float(arr.min()), float(arr.max()), delta
+        )
+
+    @classmethod
+    def empty(cls, delta: int = COMPRESSION) -> TDigest:
+        return cls(np.empty(0), np.empty(0), delta=delta)
+
+    @classmethod
+    def merge(cls, digests: Sequence[TDigest], delta: int = COMPRESSION) -> TDigest:
+        """
+        Merge any number of digests into one.
+        """
+        parts = [d for d in digests if d.count > 0]
+        if not parts:
+            return cls.empty(delta)
+        return cls._compress(
+            np.concatenate([d.means for d in parts]),
+            np.concatenate([d.weights for d in parts]),
+            min(d.min for d in parts),
+            max(d.max for d in parts),
+            delta,
+        )
+
+    @classmethod
+    def _compress(
+        cls,
+        means: np.ndarray,
+        weights: np.ndarray,
+        vmin: float,
+        vmax: float,
+        delta: int,
+    ) -> TDigest:
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        # Group neighbouring centroids whose mid-point falls in the same unit of k
+        cum = np.cumsum(weights)
+        q_mid = (cum - weights / 2) / cum[-1]
+        k = np.floor(_scale(q_mid, delta))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+
+        new_w = np.add.reduceat(weights, starts)
+        new_m = np.add.reduceat(means * weights, starts) / new_w
+        return cls(new_m, new_w, vmin, vmax, delta)
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def _knots(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Piecewise-linear CDF knots: (cumulative weight, value) from min to max
+        through each centroid's centre.
+        """
+        centres = np.cumsum(self.weights) - self.weights / 2
+        xs = np.concatenate([[0.0], centres, [self.count]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return xs, ys
+
+    def quantiles(self, qs: Sequence[float]) -> list[float]:
+        """
+        Estimated values at the given quantiles (0..1).
+        """
+        if self.count == 0:
+            return [float("nan")] * len(qs)
+        xs, ys = self._knots()
+        return np.interp(np.asarray(qs) * self.count, xs, ys).tolist()
+
+    def histogram(self, edges: Sequence[float]) -> list[int]:
+        """
+        Estimated number of values per bin for the given ascending bin edges.
+        Counts are rounded on the cumulative curve, so they sum to the values
+        that fall inside [edges[0], edges[-1]].
+        """
+        if self.count == 0:
+            return [0] * (len(edges) - 1)
+        xs, ys = self._knots()
+        cdf = np.rint(np.interp(np.asarray(edges, dtype=np.float64), ys, xs))
+        return np.diff(cdf).astype(int).tolist()
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact encoding for the DB: a 17 byte header + 8 bytes per centroid.
+        """
+        body = np.stack([self.means, self.weights]).astype("<f4").tobytes()
+        return _HEADER.pack(_VERSION, self.min, self.max) + body
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, delta: int = COMPRESSION) -> TDigest:
+        version, vmin, vmax = _HEADER.unpack_from(raw)
+        if version != _VERSION:
+            raise ValueError(f"unsupported sketch version {version}")
+        body = np.frombuffer(raw, dtype="<f4", offset=_HEADER.size).astype(np.float64)
+        means, weights = body.reshape(2, -1)
+        return cls(means, weights, vmin, vmax, delta)
+
+
+class CountMinSketch:
+    """
+    Mergeable frequency sketch (count-min): depth rows of width counters.
+
+    An item adds its count to one counter per row, picked by that row's hash
+    (double hashing over one blake2b digest); its estimate is the smallest
+    of those counters. Estimates never undercount, and sketches of the same
+    shape merge by adding their counters, so a sketch can be grown batch by
+    batch and stored in a fixed amount of space whatever it has seen.
+    """
+
+    def __init__(
+        self,
+        counts: Optional[np.ndarray] = None,
+        total: int = 0,
+        width: int = CMS_WIDTH,
+        depth: int = CMS_DEPTH,
+    ):
+        self.counts = (
+            counts if counts is not None else np.zeros((depth, width), dtype=np.int64)
+        )
+        self.total = total
+
+    @property
+    def depth(self) -> int:
+        return self.counts.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.counts.shape[1]
+
+    @property
+    def error_bound(self) -> float:
+        """
+        How much an estimate may exceed the true count (with probability
+        1 - exp(-depth)).
+        """
+        return math.e / self.width * self.total
+
+    def _columns(self, items: Sequence[str]) -> np.ndarray:
+        """
+        Counter of each item in each row: int64 [depth, len(items)].
+        """
+        digests = np.frombuffer(
+            b"".join(
+                hashlib.blake2b(item.encode(), digest_size=16).digest()
+                for item in items
+            ),
+            dtype="<u8",
+        ).reshape(-1, 2)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        cols = (digests[:, 0] + rows * (digests[:, 1] | np.uint64(1))) % np.uint64(
+            self.width
+        )
+        return cols.astype(np.int64)
+
+    def add(self, counts: Mapping[str, int]) -> None:
+        """
+        Count every item counts[item] more times.
+        """
+        if not counts:
+            return
+        items = list(counts)
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(items))
+        cols = self._columns(items)
+        for row in range(self.depth):
+            np.add.at(self.counts[row], cols[row], values)
+        self.total += int(values.sum())
+
+    def estimate(self, items: Sequence[str]) -> list[int]:
+        if not items:
+            return []
+        cols = self._columns(items)
+        rows = np.arange(self.depth)[:, None]
+        return self.counts[rows, cols].min(axis=0).tolist()
+
+    @classmethod
+    def merge(cls, sketches: Sequence[CountMinSketch]) -> CountMinSketch:
+        if not sketches:
+            return cls()
+        shapes = {s.counts.shape for s in sketches}
+        if len(shapes) != 1:
+            raise ValueError(f"can't merge sketches of shapes {sorted(shapes)}")
+        return cls(
+            np.sum([s.counts for s in sketches], axis=0),
+            sum(s.total for s in sketches),
+        )
+
+    def to_bytes(self) -> bytes:
+        """
+        A 15 byte header + the compressed counters (mostly zeros for a
+        sketch that hasn't seen much).
+        """
+        header = _CMS_HEADER.pack(_CMS_VERSION, self.depth, self.width, self.total)
+        return header + zlib.compress(self.counts.astype("<i8").tobytes())
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> CountMinSketch:
+        version, depth, width, total = _CMS_HEADER.unpack_from(raw)
+        if version != _CMS_VERSION:
+            raise ValueError(f"unsupported sketch version {version}")
+        body = zlib.decompress(raw[_CMS_HEADER.size :])
+        counts = np.frombuffer(body, dtype="<i8").astype(np.int64)
+        return cls(counts.reshape(depth, width), total)
@@ -0,0 +1,225 @@
+"""
+Immutable on-disk snapshots of the embedding index, memory-mapped by workers.
+
+The populator publishes a new generation after every run:
+
+    SNAPSHOT_DIR/
+      CURRENT                    name of the live generation
+      20250101T020000123456Z/    one generation, never modified once published
+        manifest.json            count, dim, agent / language labels, arrays
+        vectors.npy              float32 [count, dim], L2-normalised
+        call_ids.npy             sorted, aligned with the vector rows
+        agent_codes.npy ...      the filter metadata columns
+
+A generation is written into a hidden temp directory, fsynced and renamed
+into place, and only then does CURRENT switch to it (write-then-rename
+again), so a reader never sees a half-written snapshot.
+
+Workers open the arrays with np.load(mmap_mode="r"): nothing is copied onto
+the heap, every worker on the host reads the same page-cached file, and
+opening one is instant. get_index() (app.core.embedding_index) checks
+CURRENT every SNAPSHOT_CHECK_SECONDS and maps a new generation when it
+appears. Old generations are pruned down to SNAPSHOT_KEEP; a worker still
+using one keeps its mapping after the files are unlinked.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.embedding_index import EmbeddingIndex, loaded_generation, use_snapshot
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+# Generations kept on disk, the live one included
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
+CURRENT = "CURRENT"
+MANIFEST = "manifest.json"
+FORMAT = 2
+ARRAYS = (
+    "vectors",
+    "call_ids",
+    "agent_codes",
+    "language_codes",
+    "start_ts",
+    "sentiment",
+    "duplicate",
+)
+# Temp directories of publishes that died are removed after this long
+STALE_TMP_SECONDS = 3600
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_durably(path: str, write) -> None:
+    with open(path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _prune(root: str, live: str) -> None:
+    generations = sorted(
+        name
+        for name in os.listdir(root)
+        if not name.startswith(".") and name != CURRENT
+    )
+    for name in generations[: max(len(generations) - SNAPSHOT_KEEP, 0)]:
+        if name != live:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith(".tmp-") and time.time() - os.path.getmtime(path) > (
+            STALE_TMP_SECONDS
+        ):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def publish_snapshot(
+    index: EmbeddingIndex, root: Optional[str] = None, meta: Optional[Dict] = None
+) -> str:
+    """
+    Write index as a new generation and make it the current one. Returns
+    the generation name. meta is stored in the manifest as is.
+    """
+    root = root or SNAPSHOT_DIR
+    os.makedirs(root, exist_ok=True)
+    generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    tmp = os.path.join(root, f".tmp-{generation}")
+    os.makedirs(tmp)
+
+    arrays = {
+        "vectors": np.ascontiguousarray(index.vectors, dtype=np.float32),
+        "call_ids": index.call_ids,
+        "agent_codes": index.agent_codes,
+        "language_codes": index.language_codes,
+        "start_ts": index.start_ts,
+        "sentiment": index.sentiment,
+        "duplicate": index.duplicate,
+    }
+    files = {}
+    for name, array in arrays.items():
+        _write_durably(
+            os.path.join(tmp, f"{name}.npy"),
+            lambda f, a=array: np.save(f, a, allow_pickle=False),
+        )
+        files[name] = {"file": f"{name}.npy", "dtype": str(array.dtype)}
+    manifest = {
+        "format": FORMAT,
+        "generation": generation,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "count": len(index),
+        "dim": int(arrays["vectors"].shape[1]) if arrays["vectors"].ndim == 2 else 0,
+        "agents": index.agents.tolist(),
+        "languages": index.languages.tolist(),
+        "arrays": files,
+        "meta": meta or {},
+    }
+    _write_durably(
+        os.path.join(tmp, MANIFEST),
+        lambda f: f.write(json.dumps(manifest, indent=2).encode()),
+    )
+    _fsync_dir(tmp)
+
+    os.rename(tmp, os.path.join(root, generation))
+    pointer = os.path.join(root, f".{CURRENT}.tmp")
+    _write_durably(pointer, lambda f: f.write(generation.encode()))
+    os.replace(pointer, os.path.join(root, CURRENT))
+    _fsync_dir(root)
+
+    _prune(root, generation)
+    return generation
+
+
+def current_generation(root: Optional[str] = None) -> Optional[str]:
+    """
+    Name of the live generation, None if nothing was published yet.
+    """
+    try:
+        with open(os.path.join(root or SNAPSHOT_DIR, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_snapshot(
+    root: Optional[str] = None, generation: Optional[str] = None
+) -> EmbeddingIndex:
+    """
+    Open a generation (the current one by default) as a read-only,
+    memory-mapped EmbeddingIndex.
+    """
+    root = root or SNAPSHOT_DIR
+    generation = generation or current_generation(root)
+    if generation is None:
+        raise SnapshotError(f"no snapshot published in {root}")
+    path = os.path.join(root, generation)
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT:
+        raise SnapshotError(f"{path}: unsupported format {manifest.get('format')}")
+
+    count = manifest["count"]
+    arrays = {}
+    for name in ARRAYS:
+        file = os.path.join(path, manifest["arrays"][name]["file"])
+        # An empty array can't be mapped; there is nothing to share anyway
+        arrays[name] = np.load(file, mmap_mode="r" if count else None)
+        if len(arrays[name]) != count:
+            raise SnapshotError(f"{file}: {len(arrays[name])} rows, expected {count}")
+
+    return EmbeddingIndex.from_arrays(
+        call_ids=arrays["call_ids"],
+        vectors=arrays["vectors"],
+        agents=np.asarray(manifest["agents"], dtype=str),
+        agent_codes=arrays["agent_codes"],
+        languages=np.asarray(manifest["languages"], dtype=str),
+        language_codes=arrays["language_codes"],
+        start_ts=arrays["start_ts"],
+        sentiment=arrays["sentiment"],
+        duplicate=arrays["duplicate"],
+        generation=generation,
+    )
+
+
+def refresh_index(root: Optional[str] = None) -> bool:
+    """
+    Map the current generation if this process isn't using it yet. True if
+    the index was swapped; a snapshot that fails to load is logged and the
+    previous index kept.
+    """
+    generation = current_generation(root)
+    if generation is None or generation == loaded_generation():
+        return False
+    try:
+        index = load_snapshot(root, generation)
+    except (OSError, ValueError, KeyError, SnapshotError):
+        log.warning("Could not load embedding snapshot %s", generation, exc_info=True)
+        return False
+    use_snapshot(index)
+    log.info(
+        "Mapped embedding snapshot %s (pid %d): %d embeddings",
+        generation,
+        os.getpid(),
+        len(index),
+    )
+    return True
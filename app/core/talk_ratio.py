@@ -0,0 +1,79 @@
+"""
+Agent talk ratio: the share of a transcript's words on agent lines.
+
+compute_agent_talk_ratio scans a finished transcript; TalkRatio gives the
+same value for a transcript that arrives in pieces (live ingestion,
+app.core.live) while looking at every character only once.
+"""
+
+import re
+
+AGENT_PREFIX = "**Customer Service Agent:**"
+
+# Trailing run of non-whitespace: a word that may continue in the next piece
+_OPEN_WORD_RE = re.compile(r"\S*\Z")
+# Line boundaries of str.splitlines
+_LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+def compute_agent_talk_ratio(transcript: str) -> float:
+    """
+    Calculate the ratio of words spoken by the agent
+    compared to the total number of words in the transcript.
+
+    - Only counts lines starting with "**Customer Service Agent:**"
+    - Returns a value between 0 and 1.
+    """
+    agent_lines = [
+        line for line in transcript.splitlines() if line.startswith(AGENT_PREFIX)
+    ]
+    words_agent = sum(len(line.split()) for line in agent_lines)
+    total_words = len(transcript.split())
+
+    return (words_agent / total_words) if total_words else 0.0
+
+
+class TalkRatio:
+    """
+    Running word counts of a transcript fed with add(); `ratio` always equals
+    compute_agent_talk_ratio of the text added so far.
+
+    - Words are counted once they are complete; only an unfinished last word
+      is held back until the next piece
+    - Of the open line only its first len(AGENT_PREFIX) characters are kept,
+      enough to tell whether it is an agent line
+    """
+
+    def __init__(self) -> None:
+        # Complete words: all of them, and those of finished agent lines
+        self.total_words = 0
+        self.agent_words = 0
+        self._head = ""
+        self._line_words = 0
+        self._open_word = ""
+
+    def add(self, piece: str) -> None:
+        text = self._open_word + piece
+        open_word = _OPEN_WORD_RE.search(text)
+        assert open_word is not None
+        self._open_word = open_word.group()
+        for part in text[: open_word.start()].splitlines(keepends=True):
+            if len(self._head) < len(AGENT_PREFIX):
+                self._head += part[: len(AGENT_PREFIX) - len(self._head)]
+            words = len(part.split())
+            self.total_words += words
+            self._line_words += words
+            if part[-1] in _LINE_BREAKS:
+                if self._head.startswith(AGENT_PREFIX):
+                    self.agent_words += self._line_words
+                self._head = ""
+                self._line_words = 0
+
+    @property
+    def ratio(self) -> float:
+        open_words = 1 if self._open_word else 0
+        total = self.total_words + open_words
+        agent = self.agent_words
+        if (self._head + self._open_word[: len(AGENT_PREFIX)]).startswith(AGENT_PREFIX):
+            agent += self._line_words + open_words
+        return (agent / total) if total else 0.0
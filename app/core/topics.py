@@ -0,0 +1,477 @@
+"""
+Topic clusters over call embeddings (spherical mini-batch k-means).
+
+The centroids live in `topic_clusters`. Each populator run moves them with
+the newly embedded calls only, using the per-centroid learning rate of
+mini-batch k-means (1 / points seen), instead of refitting over every call.
+A fit from scratch happens on the first run or with refit=True.
+
+After the assignments, the summaries the API reads are recomputed:
+- topic_clusters: size, representative calls (closest to the centroid) and
+  top terms (class-based TF-IDF over the calls nearest each centroid)
+- agent_topic_stats: per-agent call count and sentiment sums per topic
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from typing import AbstractSet, Collection, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core.rollups import ID_CHUNK
+from app.models.call import Call, CallTranscript
+from app.models.topic import AgentTopicStat, TopicCluster
+
+TOPIC_CLUSTERS = int(os.getenv("TOPIC_CLUSTERS", "12"))
+TOPIC_BATCH_ROWS = 2048
+# Initial fit: passes over a random sample of the stored embeddings
+TOPIC_INIT_SAMPLE = 20000
+TOPIC_INIT_PASSES = 10
+REPRESENTATIVE_CALLS = 5
+# Calls nearest each centroid whose transcripts feed the top terms
+TERM_SAMPLE_CALLS = 50
+TOP_TERMS = 8
+
+TOKEN_RE = re.compile(r"[a-z][a-z']{2,}")
+SPEAKER_RE = re.compile(r"\*\*[^*]+:\*\*")
+STOPWORDS = frozenset(
+    """
+    about above after again all also am an and any are aren't as at be because
+    been before being below between both but by can can't could couldn't did
+    didn't do does doesn't doing don't down during each few for from further
+    get got had hadn't has hasn't have haven't having he her here hers herself
+    him himself his how i'd i'll i'm i've if in into is isn't it it's its
+    itself just let's like me more most my myself no nor not now of off on
+    once only or other our ours ourselves out over own same she should so
+    some such than that that's the their theirs them themselves then there
+    these they they're this those through to too under until up very was
+    wasn't we we're we've were weren't what what's when where which while who
+    whom why will with won't would you you'd you'll you're you've your yours
+    yourself yourselves hello hi thank thanks thank-you please sorry okay yes
+    yeah sure great good well welcome day today help assist anything else
+    moment name customer agent service really one see know understand able
+    """.split()
+)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.where(norms == 0.0, 1.0, norms)).astype(np.float32)
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Nearest centroid (cosine) of each normalised vector, and its similarity.
+    """
+    sims = vectors @ centroids.T
+    labels = sims.argmax(axis=1)
+    return labels, sims[np.arange(len(vectors)), labels]
+
+
+def kmeans_plus_plus(
+    vectors: np.ndarray, k: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    k-means++ seeding with cosine distance: each next centroid is drawn with
+    probability proportional to its distance from the nearest one so far.
+    """
+    n = len(vectors)
+    chosen = [int(rng.integers(n))]
+    dist = 1.0 - vectors @ vectors[chosen[0]]
+    for _ in range(1, min(k, n)):
+        weights = np.clip(dist, 0.0, None)
+        total = weights.sum()
+        nxt = (
+            int(rng.choice(n, p=weights / total)) if total > 0 else int(rng.integers(n))
+        )
+        chosen.append(nxt)
+        dist = np.minimum(dist, 1.0 - vectors @ vectors[nxt])
+    return vectors[chosen].copy()
+
+
+def minibatch_step(
+    centroids: np.ndarray, points_seen: np.ndarray, batch: np.ndarray
+) -> np.ndarray:
+    """
+    One mini-batch k-means update, in place. Returns the batch's labels.
+
+    Each centroid moves to the running mean of every point it has absorbed:
+    with h hits in this batch and n points before, it becomes
+    (n * c + sum(batch points)) / (n + h), then is re-normalised.
+    """
+    labels, _ = assign(batch, centroids)
+    hits = np.bincount(labels, minlength=len(centroids))
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, labels, batch)
+
+    touched = hits > 0
+    seen = points_seen[touched]
+    centroids[touched] = (seen[:, None] * centroids[touched] + sums[touched]) / (
+        seen + hits[touched]
+    )[:, None]
+    centroids[touched] = normalize(centroids[touched])
+    points_seen += hits
+    return labels
+
+
+def fit(
+    vectors: np.ndarray,
+    k: int,
+    rng: np.random.Generator,
+    passes: int = TOPIC_INIT_PASSES,
+    batch_rows: int = TOPIC_BATCH_ROWS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit k centroids from scratch on normalised vectors.
+    Returns (centroids, points_seen).
+    """
+    centroids = kmeans_plus_plus(vectors, k, rng)
+    points_seen = np.zeros(len(centroids), dtype=np.int64)
+    for _ in range(passes):
+        order = rng.permutation(len(vectors))
+        for i in range(0, len(order), batch_rows):
+            minibatch_step(centroids, points_seen, vectors[order[i : i + batch_rows]])
+    return centroids, points_seen
+
+
+def top_terms(docs: Dict[int, List[str]], n: int = TOP_TERMS) -> Dict[int, List[str]]:
+    """
+    Terms that best characterise each cluster's documents (class-based
+    TF-IDF: term frequency within the cluster, weighted down by how many
+    clusters use the term).
+    """
+    tf: Dict[int, Counter] = {}
+    for cluster_id, texts in docs.items():
+        counts: Counter = Counter()
+        for text in texts:
+            text = SPEAKER_RE.sub(" ", (text or "").lower().replace("’", "'"))
+            counts.update(t for t in TOKEN_RE.findall(text) if t not in STOPWORDS)
+        tf[cluster_id] = counts
+
+    df: Counter = Counter()
+    for counts in tf.values():
+        df.update(counts.keys())
+
+    terms = {}
+    for cluster_id, counts in tf.items():
+        total = sum(counts.values()) or 1
+        scored = sorted(
+            counts.items(),
+            key=lambda kv: (-kv[1] / total * math.log(1 + len(tf) / df[kv[0]]), kv[0]),
+        )
+        terms[cluster_id] = [t for t, _ in scored[:n]]
+    return terms
+
+
+def _load_centroids(session: Session) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    rows = session.execute(
+        select(TopicCluster.centroid, TopicCluster.points_seen).order_by(
+            TopicCluster.cluster_id
+        )
+    ).all()
+    if not rows:
+        return None, np.zeros(0, dtype=np.int64)
+    centroids = np.asarray([r[0] for r in rows], dtype=np.float32)
+    return centroids, np.asarray([r[1] for r in rows], dtype=np.int64)
+
+
+def _assign_pending(
+    session: Session,
+    centroids: np.ndarray,
+    points_seen: np.ndarray,
+    fitted_ids: AbstractSet[str] = frozenset(),
+) -> Tuple[int, Set[int], Set[str]]:
+    """
+    Fold every embedded but unassigned call into the centroids, one mini-batch
+    at a time, and store its cluster. Returns the number of calls assigned
+    and the clusters and agents they went to.
+
+    Calls in `fitted_ids` (the sample a fresh fit was just computed on) are
+    only labelled: folding them in again would count them twice in
+    points_seen and slow down the centroids' learning rates.
+    """
+    result = session.execute(
+        select(Call.call_id, Call.start_time, Call.embedding, Call.agent_id)
+        .where(Call.embedding.isnot(None), Call.topic_cluster.is_(None))
+        .execution_options(yield_per=TOPIC_BATCH_ROWS)
+    )
+    updates: List[dict] = []
+    agents: Set[str] = set()
+    for rows in result.partitions():
+        batch = normalize(np.asarray([r[2] for r in rows], dtype=np.float32))
+        if batch.shape[1] != centroids.shape[1]:
+            raise ValueError(
+                f"embeddings have {batch.shape[1]} dimensions but the topic "
+                f"centroids have {centroids.shape[1]}; refit the topics"
+            )
+        fitted = np.fromiter(
+            (str(r[0]) in fitted_ids for r in rows), dtype=bool, count=len(rows)
+        )
+        labels = np.empty(len(rows), dtype=np.int64)
+        if fitted.any():
+            labels[fitted] = assign(batch[fitted], centroids)[0]
+        if not fitted.all():
+            labels[~fitted] = minibatch_step(centroids, points_seen, batch[~fitted])
+        # The full table key (with the partition key, start_time) lets each
+        # UPDATE go straight to its month's partition
+        updates.extend(
+            {"call_id": r[0], "start_time": r[1], "topic_cluster": int(label)}
+            for r, label in zip(rows, labels)
+        )
+        agents.update(r[3] for r in rows if r[3] is not None)
+
+    # Written once the stream is consumed: the server-side cursor and the
+    # UPDATEs share the session's connection
+    if updates:
+        session.execute(update(Call), updates)
+    return len(updates), {u["topic_cluster"] for u in updates}, agents
+
+
+def _nearest_calls(
+    session: Session,
+    centroids: np.ndarray,
+    keep: int,
+    clusters: Optional[Collection[int]] = None,
+) -> Dict[int, List[str]]:
+    """
+    Per cluster (every one, or only `clusters`), the ids of the `keep`
+    assigned calls closest to its centroid, best first.
+    """
+    best: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    query = select(Call.call_id, Call.topic_cluster, Call.embedding).where(
+        Call.embedding.isnot(None), Call.topic_cluster.isnot(None)
+    )
+    if clusters is not None:
+        query = query.where(Call.topic_cluster.in_(sorted(clusters)))
+    result = session.execute(query.execution_options(yield_per=TOPIC_BATCH_ROWS))
+    for rows in result.partitions():
+        ids = np.asarray([r[0] for r in rows], dtype=object)
+        labels = np.asarray([r[1] for r in rows], dtype=np.int64)
+        vectors = normalize(np.asarray([r[2] for r in rows], dtype=np.float32))
+        sims = np.einsum("ij,ij->i", vectors, centroids[labels])
+
+        for label in np.unique(labels):
+            cluster_id = int(label)
+            mask = labels == cluster_id
+            cand_ids, cand_sims = ids[mask], sims[mask]
+            if cluster_id in best:
+                cand_ids = np.concatenate([best[cluster_id][0], cand_ids])
+                cand_sims = np.concatenate([best[cluster_id][1], cand_sims])
+            if len(cand_sims) > keep:
+                top = np.argpartition(-cand_sims, keep - 1)[:keep]
+                cand_ids, cand_sims = cand_ids[top], cand_sims[top]
+            best[cluster_id] = (cand_ids, cand_sims)
+
+    return {
+        cluster_id: [str(i) for i in ids[np.argsort(-sims)]]
+        for cluster_id, (ids, sims) in best.items()
+    }
+
+
+def transcripts_by_id(session: Session, call_ids: Sequence[str]) -> Dict[str, str]:
+    """
+    call_id -> transcript ("" when it has none) for the given calls, read
+    from call_transcripts alone.
+    """
+    texts: Dict[str, str] = {}
+    for i in range(0, len(call_ids), ID_CHUNK):
+        rows = session.execute(
+            select(CallTranscript.call_id, CallTranscript.transcript).where(
+                CallTranscript.call_id.in_(call_ids[i : i + ID_CHUNK])
+            )
+        )
+        texts.update((str(cid), text or "") for cid, text in rows)
+    return texts
+
+
+def _stale_clusters(session: Session) -> Set[int]:
+    """
+    Clusters whose stored representative calls are no longer assigned to
+    them (re-embedded into another cluster, or archived, since last run).
+    """
+    owner: Dict[str, int] = {
+        cid: c
+        for c, ids in session.execute(
+            select(TopicCluster.cluster_id, TopicCluster.representative_call_ids)
+        )
+        for cid in ids or []
+    }
+    reps = list(owner)
+    current: Dict[str, Optional[int]] = {}
+    for i in range(0, len(reps), ID_CHUNK):
+        rows = session.execute(
+            select(Call.call_id, Call.topic_cluster).where(
+                Call.call_id.in_(reps[i : i + ID_CHUNK])
+            )
+        )
+        current.update((str(cid), c) for cid, c in rows)
+    return {c for cid, c in owner.items() if current.get(cid) != c}
+
+
+def _refresh_summaries(
+    session: Session,
+    centroids: np.ndarray,
+    points_seen: np.ndarray,
+    clusters: Optional[AbstractSet[int]] = None,
+) -> None:
+    """
+    Rewrite topic_clusters: every row, or with `clusters` only those rows'
+    centroid, representatives and top terms plus every row's size.
+
+    Only the given clusters' embeddings are scanned. The other clusters'
+    representative calls stand in for them in the top-terms weighting, and
+    keep their stored summaries (their centroids haven't moved).
+    """
+    sizes: Dict[int, int] = {
+        int(c): int(n)
+        for c, n in session.execute(
+            select(Call.topic_cluster, func.count())
+            .where(Call.topic_cluster.isnot(None))
+            .group_by(Call.topic_cluster)
+        )
+    }
+    nearest = _nearest_calls(session, centroids, TERM_SAMPLE_CALLS, clusters)
+    if clusters is not None:
+        stored = session.execute(
+            select(TopicCluster.cluster_id, TopicCluster.representative_call_ids)
+        )
+        for c, ids in stored:
+            if c not in clusters and ids:
+                nearest[c] = list(ids)
+    texts = transcripts_by_id(session, [cid for ids in nearest.values() for cid in ids])
+    terms = top_terms(
+        {c: [texts.get(cid, "") for cid in ids] for c, ids in nearest.items()}
+    )
+
+    def summary(c: int) -> dict:
+        return dict(
+            cluster_id=c,
+            centroid=centroids[c].tolist(),
+            points_seen=int(points_seen[c]),
+            size=sizes.get(c, 0),
+            top_terms=terms.get(c, []),
+            representative_call_ids=nearest.get(c, [])[:REPRESENTATIVE_CALLS],
+        )
+
+    if clusters is None:
+        session.execute(delete(TopicCluster))
+        session.execute(
+            insert(TopicCluster), [summary(c) for c in range(len(centroids))]
+        )
+        return
+    session.execute(
+        update(TopicCluster),
+        [
+            (summary(c) if c in clusters else dict(cluster_id=c, size=sizes.get(c, 0)))
+            for c in range(len(centroids))
+        ],
+    )
+
+
+def refresh_agent_topic_stats(
+    session: Session, agent_ids: Optional[Collection[str]] = None
+) -> None:
+    """
+    Recompute agent_topic_stats from the calls' clusters: for every agent, or
+    only the given ones. The caller commits.
+    """
+    columns = [
+        "cluster_id",
+        "agent_id",
+        "call_count",
+        "sentiment_sum",
+        "sentiment_count",
+    ]
+    stats = (
+        select(
+            Call.topic_cluster,
+            Call.agent_id,
+            func.count(),
+            func.coalesce(func.sum(Call.customer_sentiment_score), 0.0),
+            func.count(Call.customer_sentiment_score),
+        )
+        .where(Call.topic_cluster.isnot(None), Call.agent_id.isnot(None))
+        .group_by(Call.topic_cluster, Call.agent_id)
+    )
+    if agent_ids is None:
+        session.execute(delete(AgentTopicStat))
+        session.execute(insert(AgentTopicStat).from_select(columns, stats))
+        return
+
+    agents = sorted(agent_ids)
+    for i in range(0, len(agents), ID_CHUNK):
+        chunk = agents[i : i + ID_CHUNK]
+        session.execute(
+            delete(AgentTopicStat).where(AgentTopicStat.agent_id.in_(chunk))
+        )
+        session.execute(
+            insert(AgentTopicStat).from_select(
+                columns, stats.where(Call.agent_id.in_(chunk))
+            )
+        )
+
+
+def update_topics(
+    session: Session,
+    n_clusters: int = TOPIC_CLUSTERS,
+    refit: bool = False,
+    seed: int = 0,
+) -> dict:
+    """
+    Bring the topic clusters up to date with the stored embeddings.
+
+    - Fits n_clusters centroids on a random sample when none exist yet (or
+      with refit, which also clears every call's assignment)
+    - Otherwise updates the existing centroids with the calls that have no
+      cluster yet (new, or re-embedded since the last run) and assigns them
+    - Recomputes topic_clusters' summaries and agent_topic_stats: all of
+      them after a fit, otherwise only for the clusters and agents the
+      newly assigned calls touched
+    Returns counts for logging. The caller commits.
+    """
+    rng = np.random.default_rng(seed)
+    centroids, points_seen = (
+        (None, np.zeros(0, dtype=np.int64)) if refit else _load_centroids(session)
+    )
+
+    if centroids is None:
+        sample = session.execute(
+            select(Call.call_id, Call.embedding)
+            .where(Call.embedding.isnot(None))
+            .order_by(func.random())
+            .limit(TOPIC_INIT_SAMPLE)
+        ).all()
+        session.execute(
+            update(Call)
+            .where(Call.topic_cluster.isnot(None))
+            .values(topic_cluster=None)
+        )
+        if not sample:
+            session.execute(delete(TopicCluster))
+            session.execute(delete(AgentTopicStat))
+            return {"clusters": 0, "assigned": 0, "fitted": False}
+        vectors = normalize(np.asarray([r[1] for r in sample], dtype=np.float32))
+        centroids, points_seen = fit(vectors, n_clusters, rng)
+        fitted_ids = {str(r[0]) for r in sample}
+    else:
+        fitted_ids = set()
+
+    assigned, clusters, agents = _assign_pending(
+        session, centroids, points_seen, fitted_ids
+    )
+    if fitted_ids:
+        _refresh_summaries(session, centroids, points_seen)
+        refresh_agent_topic_stats(session)
+    else:
+        clusters |= _stale_clusters(session)
+        _refresh_summaries(session, centroids, points_seen, clusters)
+        refresh_agent_topic_stats(session, agents)
+    return {
+        "clusters": len(centroids),
+        "assigned": assigned,
+        "fitted": bool(fitted_ids),
+    }
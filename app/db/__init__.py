@@ -0,0 +1,25 @@
+from app.db.base import Base
+from app.db.session import (
+    DATABASE_REPLICA_URLS,
+    DATABASE_URL,
+    SessionLocal,
+    db_stats,
+    dispose_engines,
+    engine,
+    get_db,
+    get_read_db,
+    read_router,
+)
+
+__all__ = [
+    "Base",
+    "DATABASE_REPLICA_URLS",
+    "DATABASE_URL",
+    "SessionLocal",
+    "db_stats",
+    "dispose_engines",
+    "engine",
+    "get_db",
+    "get_read_db",
+    "read_router",
+]
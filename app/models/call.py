@@ -1,24 +1,152 @@
 from typing import List, Optional
 
-from sqlalchemy import Column, DateTime, Float, Integer, String, Text
-from sqlalchemy.dialects.postgresql import ARRAY, UUID
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Float,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    LargeBinary,
+    PrimaryKeyConstraint,
+    String,
+    Text,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
+from sqlalchemy.ext.associationproxy import AssociationProxy, association_proxy
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db import Base
 
 
 class Call(Base):
+    """
+    Hot, narrow call metadata. The transcript lives in call_transcripts so
+    list, count and aggregate queries don't drag it through shared buffers;
+    `call.transcript` reads and writes it through a lazy one-to-one.
+
+    Both tables are range-partitioned by month on start_time (see
+    app.core.partitions). Postgres requires the partition key in every
+    unique constraint, so the table key is (call_id, start_time); the ORM
+    still identifies a call by call_id alone.
+    """
+
     __tablename__ = "calls"
+    __table_args__ = (
+        PrimaryKeyConstraint("call_id", "start_time", name="calls_pkey"),
+        Index("ix_calls_lsh_bands", "lsh_bands", postgresql_using="gin"),
+        # Agent-filtered lists come back newest first straight from the
+        # index; their counts (with sentiment bounds, without duplicates)
+        # are index-only
+        Index(
+            "ix_calls_agent_id_start_time",
+            "agent_id",
+            "start_time",
+            postgresql_include=["customer_sentiment_score", "duplicate_of"],
+        ),
+        Index("ix_calls_insights_model", "insights_model"),
+        # Work queues of the populator: each holds only the calls its stage
+        # still has to process, and what it reads of them, so finding them
+        # is an index-only scan. (Postgres can't estimate a column compared
+        # with another one and would otherwise prefer scanning the table.)
+        Index(
+            "ix_calls_insights_pending",
+            "call_id",
+            postgresql_where=text(
+                "embedding IS NULL OR content_hash IS NULL"
+                " OR insights_hash IS DISTINCT FROM content_hash"
+            ),
+        ),
+        Index(
+            "ix_calls_unfingerprinted",
+            "call_id",
+            postgresql_include=["start_time"],
+            postgresql_where=text("lsh_bands IS NULL"),
+        ),
+        Index(
+            "ix_calls_phrases_pending",
+            "call_id",
+            postgresql_include=["start_time", "agent_id", "content_hash"],
+            postgresql_where=text(
+                "agent_id IS NOT NULL AND content_hash IS NOT NULL"
+                " AND phrases_hash IS DISTINCT FROM content_hash"
+            ),
+        ),
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
 
-    call_id: Mapped[str] = mapped_column(String(64), primary_key=True)
-    agent_id: Mapped[str] = mapped_column(String(64), index=True)
+    call_id: Mapped[str] = mapped_column(String(64))
+    agent_id: Mapped[str] = mapped_column(String(64))
     customer_id: Mapped[str] = mapped_column(String(64))
     language: Mapped[str] = mapped_column(String(16), default="en")
-    start_time: Mapped[DateTime] = mapped_column(DateTime(timezone=True))
+    start_time: Mapped[DateTime] = mapped_column(DateTime(timezone=True), index=True)
     duration_seconds: Mapped[int] = mapped_column(Integer)
-    transcript: Mapped[str] = mapped_column(Text)
     embedding: Mapped[Optional[List[float]]] = mapped_column(
         ARRAY(Float), nullable=True
     )
     agent_talk_ratio: Mapped[float] = mapped_column(Float, default=0.0)
     customer_sentiment_score: Mapped[float] = mapped_column(Float, default=0.0)
+    # Per-segment sentiment over the whole transcript: [[start, end, score], ...]
+    sentiment_timeline: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
+    # sha256 of the current transcript, set by the loader
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    # Hash and model tag the insights above were computed from; the populator
+    # reprocesses a call when either no longer matches
+    insights_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    insights_model: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    # topic_clusters.cluster_id, set by the populator's clustering stage
+    topic_cluster: Mapped[Optional[int]] = mapped_column(
+        Integer, nullable=True, index=True
+    )
+    # MinHash signature and its LSH band hashes, set by the loader (see
+    # app.core.dedup); duplicate_of is the earliest call of the call's
+    # near-duplicate cluster, NULL for that call and for unique ones
+    minhash: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    lsh_bands: Mapped[Optional[List[int]]] = mapped_column(
+        ARRAY(BigInteger), nullable=True
+    )
+    duplicate_of: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True, index=True
+    )
+    # content_hash of the transcript whose phrases are in the agent's phrase
+    # sketch (app.core.phrases)
+    phrases_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
+    transcript_row: Mapped[Optional["CallTranscript"]] = relationship(
+        lazy="select", cascade="all, delete-orphan", passive_deletes=True
+    )
+    transcript: AssociationProxy[Optional[str]] = association_proxy(
+        "transcript_row",
+        "transcript",
+        creator=lambda text: CallTranscript(transcript=text),
+    )
+
+    __mapper_args__ = {"primary_key": [call_id]}
+
+
+class CallTranscript(Base):
+    """
+    A call's transcript, partitioned like calls so a month's transcripts
+    are dropped with its calls. start_time is copied from the call (the
+    composite foreign key keeps it in step, including when a re-import moves
+    a call to another month).
+    """
+
+    __tablename__ = "call_transcripts"
+    __table_args__ = (
+        PrimaryKeyConstraint("call_id", "start_time", name="call_transcripts_pkey"),
+        ForeignKeyConstraint(
+            ["call_id", "start_time"],
+            ["calls.call_id", "calls.start_time"],
+            ondelete="CASCADE",
+            onupdate="CASCADE",
+        ),
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
+
+    call_id: Mapped[str] = mapped_column(String(64))
+    start_time: Mapped[DateTime] = mapped_column(DateTime(timezone=True))
+    transcript: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    __mapper_args__ = {"primary_key": [call_id]}
@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import DateTime, Float, String, func
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class EmbeddingCache(Base):
+    """
+    Text-derived insights keyed by (transcript content hash, model tag).
+    Identical transcripts reuse the row instead of running inference again.
+    """
+
+    __tablename__ = "embedding_cache"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(255), primary_key=True)
+    embedding: Mapped[List[float]] = mapped_column(ARRAY(Float))
+    sentiment_timeline: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Integer, LargeBinary, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class AgentPhraseSketch(Base):
+    """
+    Per-agent phrase counts over every transcript the populator has seen:
+    a serialized count-min sketch (app.core.sketches) plus the heavy hitters
+    read off it, which is all GET /analytics/agents/{agent_id}/phrases reads.
+    """
+
+    __tablename__ = "agent_phrase_sketches"
+
+    agent_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    sketch: Mapped[bytes] = mapped_column(LargeBinary)
+    # [[phrase, estimated count], ...], most frequent first
+    top_phrases: Mapped[list] = mapped_column(JSONB, default=list)
+    calls_seen: Mapped[int] = mapped_column(Integer, default=0)
+    phrases_seen: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
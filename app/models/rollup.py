@@ -0,0 +1,39 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import BigInteger, Boolean, Date, Float, Integer, LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class AgentDailyRollup(Base):
+    """
+    Per-agent, per-day sums over `calls`.
+    Averages are derived at query time (sum / count), so rows for any range of
+    days can be added together into weeks or months. The *_sketch columns hold
+    serialized t-digests (see app.core.sketches) that merge the same way.
+
+    Every agent-day is written twice: over all calls, and with deduplicated
+    set over one call per near-duplicate cluster (app.core.dedup).
+    """
+
+    __tablename__ = "agent_daily_rollups"
+
+    agent_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True, index=True)
+    deduplicated: Mapped[bool] = mapped_column(Boolean, primary_key=True, default=False)
+    call_count: Mapped[int] = mapped_column(Integer, default=0)
+    # Separate counts: sentiment / talk ratio stay NULL until the populator runs
+    sentiment_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    sentiment_count: Mapped[int] = mapped_column(Integer, default=0)
+    talk_ratio_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    talk_ratio_count: Mapped[int] = mapped_column(Integer, default=0)
+    duration_sum: Mapped[int] = mapped_column(BigInteger, default=0)
+    sentiment_sketch: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary, nullable=True
+    )
+    talk_ratio_sketch: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary, nullable=True
+    )
+    duration_sketch: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import BigInteger, DateTime, Float, Integer, String, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class TopicCluster(Base):
+    """
+    One topic: its k-means centroid plus the summary the API serves.
+    `points_seen` is how many embeddings have moved the centroid so far; it
+    sets the learning rate of the next mini-batch update (app.core.topics).
+    """
+
+    __tablename__ = "topic_clusters"
+
+    cluster_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    centroid: Mapped[List[float]] = mapped_column(ARRAY(Float))
+    points_seen: Mapped[int] = mapped_column(BigInteger, default=0)
+    size: Mapped[int] = mapped_column(Integer, default=0)
+    top_terms: Mapped[List[str]] = mapped_column(ARRAY(String), default=list)
+    representative_call_ids: Mapped[List[str]] = mapped_column(
+        ARRAY(String), default=list
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class AgentTopicStat(Base):
+    """
+    Per-topic, per-agent call count and sentiment sums, recomputed by the
+    populator after each clustering run.
+    """
+
+    __tablename__ = "agent_topic_stats"
+
+    cluster_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    agent_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    call_count: Mapped[int] = mapped_column(Integer, default=0)
+    sentiment_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    sentiment_count: Mapped[int] = mapped_column(Integer, default=0)
@@ -39,7 +39,12 @@ class CallBase(BaseModel):
 
 
 class CallDetail(CallBase):
-    embedding: Optional[list[float]] = None
+    # A float list, or base64 little-endian float32 with embedding_format=b64f32
+    embedding: Optional[list[float] | str] = None
+    # [[start_char, end_char, score], ...] over sliding transcript windows
+    sentiment_timeline: Optional[List[List[float]]] = None
+    # Served from the archive tier (app.core.archive) rather than Postgres
+    archived: bool = False
 
 
 class CallListResponse(BaseModel):
@@ -58,12 +63,105 @@ class RecommendationsResponse(BaseModel):
     coaching_nudges: List[str]
 
 
+class RecommendationsBatchRequest(BaseModel):
+    call_ids: List[str] = Field(..., min_length=1, max_length=500)
+    k: int = Field(5, ge=1, le=50)
+    # Leave out near-duplicates of other calls and each base's own cluster
+    exclude_duplicates: bool = False
+
+
+class RecommendationsBatchResponse(BaseModel):
+    items: List[RecommendationsResponse]
+    # Requested ids that don't exist or have no embedding yet
+    missing: List[str]
+
+
+class Histogram(BaseModel):
+    edges: List[float]
+    counts: List[int]
+
+
+class MetricDistribution(BaseModel):
+    p10: float
+    p50: float
+    p90: float
+    histogram: Optional[Histogram] = None
+
+
 class AgentAggregate(BaseModel):
     agent_id: str
     avg_sentiment: Optional[float]
     avg_talk_ratio: Optional[float]
     total_calls: int
+    avg_duration_seconds: Optional[float] = None
+    # Estimated from merged per-day t-digest sketches
+    sentiment: Optional[MetricDistribution] = None
+    talk_ratio: Optional[MetricDistribution] = None
+    duration_seconds: Optional[MetricDistribution] = None
 
 
 class AgentsLeaderboardResponse(BaseModel):
     items: List[AgentAggregate]
+
+
+class AgentTimeseriesPoint(BaseModel):
+    agent_id: str
+    bucket_start: date
+    total_calls: int
+    avg_sentiment: Optional[float]
+    avg_talk_ratio: Optional[float]
+    avg_duration_seconds: Optional[float]
+
+
+class AgentTimeseriesResponse(BaseModel):
+    bucket: str
+    items: List[AgentTimeseriesPoint]
+
+
+class PhraseCount(BaseModel):
+    phrase: str
+    # Count-min estimate: never below the true count
+    count: int
+
+
+class AgentPhrasesResponse(BaseModel):
+    agent_id: str
+    calls_seen: int
+    phrases_seen: int
+    # How far a count may be over (with ~98% probability)
+    error_bound: float
+    items: List[PhraseCount]
+    # Estimates for the phrases asked for with ?phrase=
+    lookups: List[PhraseCount] = []
+
+
+class TopicAgentSentiment(BaseModel):
+    agent_id: str
+    total_calls: int
+    avg_sentiment: Optional[float]
+
+
+class TopicSummary(BaseModel):
+    cluster_id: int
+    size: int
+    top_terms: List[str]
+    representative_call_ids: List[str]
+    agents: List[TopicAgentSentiment]
+
+
+class TopicsResponse(BaseModel):
+    items: List[TopicSummary]
+
+
+#  WebSocket Schemas
+# First message of a /ws/ingest stream
+class LiveCallStart(BaseModel):
+    agent_id: str = Field(..., min_length=1, max_length=64)
+    customer_id: str = Field(..., min_length=1, max_length=64)
+    language: str = Field("English", max_length=16)
+    # Defaults to when the stream opened; naive times are UTC
+    start_time: Optional[datetime] = None
+    # Defaults to how long the stream was open
+    duration_seconds: Optional[int] = Field(None, ge=0)
+    # Overwrite the stored call with this id, if there is one
+    replace: bool = False
@@ -0,0 +1,51 @@
+# Serving mode with state shared across workers:
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# preload_app imports main:app once in the master; when_ready() then loads the
+# embedding matrix (and models with PRELOAD_MODELS=1) before any worker is
+# forked, so all workers share those pages copy-on-write. The nightly
+# scheduler is elected inside the workers (see app/core/scheduler.py).
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 60
+
+# Send the app's own loggers (boot report, preload, scheduler election) to
+# stderr next to gunicorn's
+logconfig_dict = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "root": {"level": "INFO", "handlers": ["console"]},
+    "loggers": {
+        "gunicorn.error": {"level": "INFO", "handlers": [], "propagate": True},
+        "gunicorn.access": {"level": "INFO", "handlers": [], "propagate": True},
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": "generic",
+            "stream": "ext://sys.stderr",
+        }
+    },
+    "formatters": {
+        "generic": {
+            "format": "%(asctime)s [%(process)d] [%(levelname)s] %(name)s: %(message)s"
+        }
+    },
+}
+
+
+def when_ready(server):
+    from app.core.preload import preload_state
+
+    preload_state()
+
+
+def post_fork(server, worker):
+    # Connections created in the master must not be reused by the children
+    from app.db import dispose_engines
+
+    dispose_engines(close=False)
@@ -1,13 +1,23 @@
+import logging
+import os
+
 from fastapi import FastAPI
 
 from app.api.v1.endpoints import router as api_router
-from app.api.v1.ws import ws_router
+from app.api.v1.ws import stream_stats, ws_router
+from app.core.admission import admission_stats
+from app.core.live import live_stats
+from app.core.preload import is_preloaded, preload_state
+from app.core.procstats import memory_stats, open_fds, process_uptime
 from app.core.scheduler import shutdown_scheduler, start_scheduler
+from app.db import db_stats
+
+log = logging.getLogger(__name__)
 
 app = FastAPI(title="Call Analytics API", version="1.0.0")
 # Attach the REST API routes (v1) to the app
 app.include_router(api_router)
-# Attach the WebSocket routes (for live sentiment streaming)
+# Attach the WebSocket routes (sentiment streaming, live call ingestion)
 app.include_router(ws_router)
 
 
@@ -15,7 +25,17 @@ app.include_router(ws_router)
 # These functions run automatically when the app starts/stops.
 @app.on_event("startup")
 def _startup():
+    # Under gunicorn (gunicorn.conf.py) state is preloaded in the master before
+    # fork; a plain uvicorn process can opt in with PRELOAD_STATE=1.
+    if os.getenv("PRELOAD_STATE") == "1" and not is_preloaded():
+        preload_state()
     start_scheduler()
+    log.info(
+        "Worker pid %d ready %.2fs after process start; memory=%s",
+        os.getpid(),
+        process_uptime(),
+        memory_stats(),
+    )
 
 
 @app.on_event("shutdown")
@@ -27,3 +47,28 @@ def _shutdown():
 @app.get("/healthz")
 def health():
     return {"status": "ok"}
+
+
+# Connection pool utilization per engine, and health / lag of each replica
+@app.get("/healthz/db")
+def health_db():
+    return db_stats()
+
+
+# Admission queues, shed counts and LLM fallbacks of the expensive routes
+@app.get("/healthz/admission")
+def health_admission():
+    return admission_stats()
+
+
+# WebSocket streams, live calls and their model workers, memory, file
+# descriptors and pool use of this worker (polled by scripts/ws_load_test.py)
+@app.get("/healthz/ws")
+def health_ws():
+    return {
+        "streams": stream_stats(),
+        "live": live_stats(),
+        "memory": memory_stats(),
+        "fds": open_fds(),
+        "db": db_stats(),
+    }
@@ -1,102 +1,295 @@
+import argparse
 import os
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from sqlalchemy import or_, select, union, update
 from sqlalchemy.orm import Session
-from transformers import pipeline
 
-from app.db.session import SessionLocal
+from app.core.dedup import fingerprint, flag_duplicates
+from app.core.embedding_index import EmbeddingIndex
+from app.core.inference import BACKENDS, DEFAULT_BACKEND, load_backend
+from app.core.insights_cache import (
+    INSIGHTS_MODEL,
+    lookup_insights,
+    store_insights,
+    transcript_hash,
+)
+from app.core.partitions import ensure_future_partitions
+from app.core.phrases import update_phrase_sketches
+from app.core.profiling import PROFILE_FORMATS, profile_run
+from app.core.rollups import all_call_days, refresh_agent_rollups, touched_days
+from app.core.sentiment import (
+    build_timeline,
+    normalize_sentiment,
+    overall_score,
+    split_windows,
+)
+from app.core.snapshot import publish_snapshot
+from app.core.talk_ratio import compute_agent_talk_ratio
+from app.core.topics import transcripts_by_id, update_topics
+from app.db import SessionLocal
 from app.models.call import Call
 
-MODEL_NAME = "all-MiniLM-L6-v2"
 EMBEDDING_BATCH_SIZE = 32
+SENTIMENT_BATCH_SIZE = 64
+FINGERPRINT_BATCH_ROWS = 1000
 
 
-def compute_agent_talk_ratio(transcript: str) -> float:
+def score_sentiment_windows(classify, transcripts: list[str]) -> list[list]:
     """
-    Calculate the ratio of words spoken by the agent
-    compared to the total number of words in the transcript.
+    Run sentiment over sliding windows of every transcript in the batch.
 
-    - Only counts lines starting with "**Customer Service Agent:**"
-    - Returns a value between 0 and 1.
+    - Windows of all transcripts are flattened into one list, so the backend
+      packs them into shared inference batches
+    - Scores are regrouped per transcript into a [[start, end, score], ...] timeline
     """
-    agent_lines = [
-        line
-        for line in transcript.splitlines()
-        if line.startswith("**Customer Service Agent:**")
+    spans_per_call = [split_windows(t) for t in transcripts]
+    windows = [
+        t[s:e] for t, spans in zip(transcripts, spans_per_call) for s, e in spans
     ]
-    words_agent = sum(len(line.split()) for line in agent_lines)
-    total_words = len(transcript.split())
 
-    return (words_agent / total_words) if total_words else 0.0
+    outputs = classify(windows, batch_size=SENTIMENT_BATCH_SIZE)
+    scores = [normalize_sentiment(o) for o in outputs]
 
+    timelines = []
+    pos = 0
+    for spans in spans_per_call:
+        timelines.append(build_timeline(spans, scores[pos : pos + len(spans)]))
+        pos += len(spans)
+    return timelines
 
-def normalize_sentiment(label_score):
+
+def stale_call_ids(session: Session) -> list[str]:
+    """
+    Ids of the calls whose insights are missing or were computed from another
+    transcript (hash changed) or another model version.
+
+    - Missing and hash-stale calls are read from the partial
+      ix_calls_insights_pending, index-only
+    - Other model versions are ranges around INSIGHTS_MODEL on
+      ix_calls_insights_model (IS DISTINCT FROM can't use an index)
+    One OR over both would be planned as a full scan of every partition.
+    """
+    pending = select(Call.call_id).where(
+        or_(
+            Call.embedding.is_(None),
+            Call.content_hash.is_(None),
+            Call.insights_hash.is_distinct_from(Call.content_hash),
+        )
+    )
+    other_model = select(Call.call_id).where(
+        or_(
+            Call.insights_model.is_(None),
+            Call.insights_model < INSIGHTS_MODEL,
+            Call.insights_model > INSIGHTS_MODEL,
+        )
+    )
+    return [str(c) for c in session.execute(union(pending, other_model)).scalars()]
+
+
+def fingerprint_missing(session: Session) -> list[str]:
     """
-    Convert a Hugging Face sentiment output to a numeric score:
-    - Positive → positive number
-    - Negative → negative number
-    - Magnitude = confidence score from the model
+    MinHash-fingerprint the calls loaded before fingerprints existed (or by
+    another writer) and flag their near-duplicates. Returns every call whose
+    duplicate flag may have changed. Commits per batch.
     """
-    label = label_score["label"].lower()
-    score = label_score["score"]
-    if "neg" in label:
-        return -score
-    return score
+    changed: set[str] = set()
+    while True:
+        # Index-only on ix_calls_unfingerprinted
+        rows = session.execute(
+            select(Call.call_id, Call.start_time)
+            .where(Call.lsh_bands.is_(None))
+            .limit(FINGERPRINT_BATCH_ROWS)
+        ).all()
+        if not rows:
+            break
+        ids = [str(r.call_id) for r in rows]
+        texts = transcripts_by_id(session, ids)
+        updates = []
+        for call_id, start_time in rows:
+            minhash, bands = fingerprint(texts.get(str(call_id)))
+            updates.append(
+                {
+                    "call_id": call_id,
+                    "start_time": start_time,
+                    "minhash": minhash,
+                    "lsh_bands": bands,
+                }
+            )
+        session.execute(update(Call), updates)
+        session.commit()
+        changed |= flag_duplicates(session, ids)
+        session.commit()
+    return sorted(changed)
 
 
-def main():
+def main(
+    rebuild_rollups: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    refit_topics: bool = False,
+    rebuild_phrases: bool = False,
+):
     """
-    1. Loads embeddings and sentiment models
-    2. Retrieves calls without embeddings from the DB
-    3. Calculates embeddings, sentiment, and talk ratio
+    1. Loads embeddings and sentiment models on the chosen inference backend
+    2. Retrieves calls whose insights are missing or stale
+    3. Reuses cached embeddings / sentiment for already seen transcripts,
+       runs the models only on new text, and computes talk ratio
     4. Saves updated records back to the DB
+    5. Fingerprints calls that have no MinHash signature yet and flags their
+       near-duplicates, then refreshes the agent daily rollups for the days
+       the processed and re-flagged calls fall on (or for every day with
+       `rebuild_rollups`)
+    6. Folds the newly embedded calls into the topic clusters (mini-batch
+       k-means; fitted from scratch on the first run or with `refit_topics`)
+       and refreshes the per-topic summaries
+    7. Adds the phrases of calls not counted yet to their agent's phrase
+       sketch (from scratch with `rebuild_phrases`)
+    8. Makes sure the calls partitions for the coming months exist
+    9. Publishes a new embedding snapshot, which API workers memory-map
     """
     session: Session = SessionLocal()
 
     # Step 1: Load models
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    sentiment_pipeline = pipeline(
-        "sentiment-analysis",
-        model="distilbert/distilbert-base-uncased-finetuned-sst-2-english",
-        device=-1,
-        truncation=True,
-    )
+    models = load_backend(backend)
 
-    print("Processing calls for analytics...")
+    print(f"Processing calls for analytics ({models.name} backend)...")
 
-    # Srep 2: retreive calls from DB
-    calls_to_process = session.query(Call).filter(Call.embedding.is_(None)).all()
+    # Srep 2: retreive calls from DB, one batch at a time
+    stale_ids = stale_call_ids(session)
+    processed_ids: list[str] = []
 
-    for i in range(0, len(calls_to_process), EMBEDDING_BATCH_SIZE):
-        chunk = calls_to_process[i : i + EMBEDDING_BATCH_SIZE]
-        transcripts = [c.transcript or "" for c in chunk]
+    for i in range(0, len(stale_ids), EMBEDDING_BATCH_SIZE):
+        ids = stale_ids[i : i + EMBEDDING_BATCH_SIZE]
+        chunk = session.query(Call).filter(Call.call_id.in_(ids)).all()
+        texts = transcripts_by_id(session, ids)
+        for call in chunk:
+            if call.content_hash is None:
+                call.content_hash = transcript_hash(texts.get(str(call.call_id)))
 
-        # Step 3: Create embeddings
-        embeddings = model.encode(
-            transcripts,
-            batch_size=EMBEDDING_BATCH_SIZE,
-            convert_to_numpy=True,
-            show_progress_bar=True,
+        # Step 3: Only text never seen with this model goes through inference
+        insights = lookup_insights(
+            session, (c.content_hash for c in chunk), INSIGHTS_MODEL
         )
+        missing: dict[str, str] = {}
+        for call in chunk:
+            if call.content_hash not in insights:
+                missing.setdefault(call.content_hash, texts.get(str(call.call_id), ""))
+
+        if missing:
+            hashes = list(missing)
+            transcripts = [missing[h] for h in hashes]
+            embeddings = models.embed(transcripts, batch_size=EMBEDDING_BATCH_SIZE)
+            # Sentiment over the whole transcript, not just its first 512 chars
+            timelines = score_sentiment_windows(models.classify, transcripts)
 
-        for idx, call in enumerate(chunk):
+            fresh = {
+                h: (embeddings[j].tolist(), timelines[j]) for j, h in enumerate(hashes)
+            }
+            store_insights(session, INSIGHTS_MODEL, fresh)
+            insights.update(fresh)
 
-            text_for_sent = call.transcript[:512] if call.transcript else ""
-            sentiment = sentiment_pipeline(text_for_sent)[0]
+        for call in chunk:
+            embedding, timeline = insights[call.content_hash]
 
             # Step 4: Update table data
-            call.embedding = embeddings[idx].tolist()
-            call.customer_sentiment_score = normalize_sentiment(sentiment)
-            call.agent_talk_ratio = compute_agent_talk_ratio(call.transcript or "")
+            call.embedding = embedding
+            call.sentiment_timeline = timeline
+            call.customer_sentiment_score = overall_score(timeline or [])
+            call.agent_talk_ratio = compute_agent_talk_ratio(
+                texts.get(str(call.call_id), "")
+            )
+            call.insights_hash = call.content_hash
+            call.insights_model = INSIGHTS_MODEL
+            # New embedding: the clustering stage (step 6) re-assigns the call
+            call.topic_cluster = None
             session.add(call)
 
         session.commit()
-        print(f"Updated {len(chunk)} calls.")
+        processed_ids.extend(str(c.call_id) for c in chunk)
+        print(
+            f"Updated {len(chunk)} calls "
+            f"({len(missing)} transcripts inferred, the rest from cache)."
+        )
+
+    # Step 5: Near-duplicate flags, then re-aggregate only the days touched
+    # by this run
+    flagged = fingerprint_missing(session)
+    if flagged:
+        print(f"Fingerprinted calls; {len(flagged)} duplicate flags re-checked.")
+    if rebuild_rollups:
+        days = all_call_days(session)
+    else:
+        days = touched_days(session, processed_ids + flagged)
+    rows = refresh_agent_rollups(session, days)
+    session.commit()
+    print(f"Refreshed {rows} agent rollup rows over {len(days)} days.")
+
+    # Step 6: Topic clusters
+    topics = update_topics(session, refit=refit_topics)
+    session.commit()
+    print(
+        f"Assigned {topics['assigned']} calls to {topics['clusters']} topics"
+        f"{' (fitted from scratch)' if topics['fitted'] else ''}."
+    )
+
+    # Step 7: Per-agent phrase sketches
+    phrases = update_phrase_sketches(session, rebuild=rebuild_phrases)
+    print(
+        f"Counted phrases of {phrases['calls']} calls "
+        f"into {phrases['agents']} agent sketches."
+    )
+
+    # Step 8: Monthly partitions ahead of the data
+    created = ensure_future_partitions(session)
+    session.commit()
+    if created:
+        print(f"Created partitions: {', '.join(created)}.")
+
+    # Step 9: Embedding snapshot for the API workers
+    index = EmbeddingIndex.from_db(session)
+    session.rollback()
+    generation = publish_snapshot(index, meta={"insights_model": INSIGHTS_MODEL})
+    print(f"Published embedding snapshot {generation} ({len(index)} calls).")
 
     session.close()
     print("Processing complete.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Populate AI insights for calls.")
+    parser.add_argument(
+        "--rebuild-rollups",
+        action="store_true",
+        help="recompute agent rollups and sketches for every day, not just touched ones",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="inference backend (default: $INFERENCE_BACKEND or torch)",
+    )
+    parser.add_argument(
+        "--refit-topics",
+        action="store_true",
+        help="fit the topic clusters from scratch instead of updating them",
+    )
+    parser.add_argument(
+        "--rebuild-phrases",
+        action="store_true",
+        help="recount every call's phrases into empty agent phrase sketches",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="speedscope",
+        choices=PROFILE_FORMATS,
+        help="write a sampling profile with SQL timings to $PROFILE_DIR",
+    )
+    args = parser.parse_args()
+    with profile_run("ai_insights_populator", args.profile):
+        main(
+            rebuild_rollups=args.rebuild_rollups,
+            backend=args.backend,
+            refit_topics=args.refit_topics,
+            rebuild_phrases=args.rebuild_phrases,
+        )
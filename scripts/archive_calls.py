@@ -0,0 +1,57 @@
+import argparse
+from datetime import date, datetime, timezone
+
+from app.core.archive import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_DIR,
+    FORMATS,
+    archive_calls,
+    default_cutoff,
+)
+from app.db import SessionLocal
+
+
+def main():
+    """
+    1. Streams every call older than the cutoff (default: ARCHIVE_AFTER_DAYS
+       ago) into compressed files under --dir, one file per month
+    2. Reads each file back and verifies it before anything is deleted
+    3. Indexes the archived calls (GET /calls/{call_id} still finds them),
+       deletes them from Postgres and drops fully archived month partitions
+    """
+    parser = argparse.ArgumentParser(
+        description="Move old calls from Postgres to the archive tier."
+    )
+    parser.add_argument(
+        "--before",
+        type=date.fromisoformat,
+        metavar="YYYY-MM-DD",
+        help="archive calls that started before this date (UTC)",
+    )
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    cutoff = (
+        datetime(
+            args.before.year, args.before.month, args.before.day, tzinfo=timezone.utc
+        )
+        if args.before
+        else default_cutoff(args.older_than_days)
+    )
+    session = SessionLocal()
+    try:
+        stats = archive_calls(session, cutoff, fmt=args.format, root=args.dir)
+    finally:
+        session.close()
+
+    for path in stats["files"]:
+        print(f"wrote {path}")
+    for name in stats["dropped"]:
+        print(f"dropped {name}")
+    print(f"Archived {stats['archived']} calls older than {cutoff:%Y-%m-%d}.")
+
+
+if __name__ == "__main__":
+    main()
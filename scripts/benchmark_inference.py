@@ -0,0 +1,107 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from app.core.inference import load_backend
+from app.core.sentiment import normalize_sentiment, split_windows
+
+DATA_PATH = "data/transcripts.jsonl"
+
+
+def load_texts(path: str, limit: int) -> list[str]:
+    texts = []
+    with open(path, "r") as f:
+        for line in f:
+            texts.append(json.loads(line)["transcript"] or "")
+            if len(texts) >= limit:
+                break
+    return texts
+
+
+def run(backend, transcripts: list[str], windows: list[str]) -> dict:
+    """
+    Embed the transcripts and classify the sentiment windows, as the
+    populator does, timing each step.
+    """
+    backend.embed(transcripts[:4])  # warm-up: first call pays graph / thread setup
+
+    t0 = time.perf_counter()
+    embeddings = backend.embed(transcripts)
+    t1 = time.perf_counter()
+    sentiment = backend.classify(windows)
+    t2 = time.perf_counter()
+
+    return {
+        "embeddings": embeddings,
+        "scores": np.array([normalize_sentiment(s) for s in sentiment]),
+        "labels": [s["label"] for s in sentiment],
+        "embed_per_sec": len(transcripts) / (t1 - t0),
+        "windows_per_sec": len(windows) / (t2 - t1),
+        "seconds": t2 - t0,
+    }
+
+
+def main():
+    """
+    1. Loads transcripts and cuts them into the populator's sentiment windows
+    2. Runs the torch reference and the candidate backend over the same input
+    3. Reports parity (embedding cosine, sentiment label agreement and score
+       delta) and throughput; exits non-zero if parity is below the thresholds
+    """
+    parser = argparse.ArgumentParser(
+        description="Accuracy parity and throughput of an inference backend vs torch."
+    )
+    parser.add_argument("--backend", default="onnx-int8", choices=["onnx", "onnx-int8"])
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--min-label-agreement", type=float, default=0.97)
+    args = parser.parse_args()
+
+    transcripts = load_texts(args.data, args.limit)
+    windows = [t[s:e] for t in transcripts for s, e in split_windows(t)]
+    print(f"{len(transcripts)} transcripts, {len(windows)} sentiment windows")
+
+    ref = run(load_backend("torch"), transcripts, windows)
+    cand = run(load_backend(args.backend), transcripts, windows)
+
+    # Both backends return L2-normalised embeddings, so the row-wise dot
+    # product is the cosine similarity
+    cosine = (ref["embeddings"] * cand["embeddings"]).sum(axis=1)
+    agreement = float(np.mean([a == b for a, b in zip(ref["labels"], cand["labels"])]))
+    delta = np.abs(ref["scores"] - cand["scores"])
+
+    report = {
+        "backend": args.backend,
+        "embedding_cosine_min": float(cosine.min()),
+        "embedding_cosine_mean": float(cosine.mean()),
+        "sentiment_label_agreement": agreement,
+        "sentiment_score_delta_mean": float(delta.mean()),
+        "sentiment_score_delta_max": float(delta.max()),
+        "torch_seconds": round(ref["seconds"], 3),
+        f"{args.backend}_seconds": round(cand["seconds"], 3),
+        "speedup": round(ref["seconds"] / cand["seconds"], 2),
+        "embed_per_sec": {
+            "torch": round(ref["embed_per_sec"], 1),
+            args.backend: round(cand["embed_per_sec"], 1),
+        },
+        "windows_per_sec": {
+            "torch": round(ref["windows_per_sec"], 1),
+            args.backend: round(cand["windows_per_sec"], 1),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+    ok = (
+        report["embedding_cosine_min"] >= args.min_cosine
+        and agreement >= args.min_label_agreement
+    )
+    print("Parity check passed." if ok else "Parity check FAILED.")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import json
+import sys
+
+from sqlalchemy import text
+
+from app.db import engine
+
+# The hot queries behind the list, filter and leaderboard paths. None of them
+# reads the transcript, so they run unchanged on either side of the
+# transcript split and their buffer counts can be compared directly.
+QUERIES = {
+    "list_count_30d": """
+        SELECT count(*) FROM calls
+        WHERE start_time >= now() - interval '30 days'
+    """,
+    "list_page": """
+        SELECT call_id, agent_id, start_time, customer_sentiment_score
+        FROM calls ORDER BY start_time DESC LIMIT 50
+    """,
+    "filter_sentiment": """
+        SELECT count(*) FROM calls
+        WHERE customer_sentiment_score BETWEEN 0.2 AND 1.0
+    """,
+    "agent_aggregates": """
+        SELECT agent_id, count(*), avg(customer_sentiment_score),
+               avg(agent_talk_ratio), avg(duration_seconds)
+        FROM calls GROUP BY agent_id
+    """,
+}
+
+# Summed over the partitions when the tables are partitioned (the parent of
+# a partitioned table has no storage of its own)
+SIZES_SQL = """
+    SELECT t.relname,
+           sum(pg_relation_size(c.oid))::bigint AS heap_bytes,
+           sum(coalesce(pg_relation_size(c.reltoastrelid), 0))::bigint AS toast_bytes,
+           sum(pg_total_relation_size(c.oid))::bigint AS total_bytes
+    FROM pg_class t
+    CROSS JOIN LATERAL pg_partition_tree(t.oid) p
+    JOIN pg_class c ON c.oid = p.relid
+    WHERE t.relname IN ('calls', 'call_transcripts') AND t.relkind IN ('r', 'p')
+    GROUP BY t.relname
+"""
+
+
+def explain(conn, sql: str) -> dict:
+    """
+    Buffers touched (shared hit + read) and timing of one run of sql.
+    """
+    plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"))
+    top = plan.scalar()[0]
+    node = top["Plan"]
+    return {
+        "shared_hit": node.get("Shared Hit Blocks", 0),
+        "shared_read": node.get("Shared Read Blocks", 0),
+        "buffers": node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0),
+        "ms": round(top["Execution Time"], 3),
+    }
+
+
+def measure(repeat: int) -> dict:
+    with engine.connect() as conn:
+        sizes = {
+            r.relname: {
+                "heap_bytes": r.heap_bytes,
+                "toast_bytes": r.toast_bytes,
+                "total_bytes": r.total_bytes,
+            }
+            for r in conn.execute(text(SIZES_SQL))
+        }
+        queries = {}
+        for name, sql in QUERIES.items():
+            runs = [explain(conn, sql) for _ in range(repeat)]
+            # Buffers touched don't depend on caching; the last run is warm
+            queries[name] = {**runs[-1], "cold_ms": runs[0]["ms"]}
+    return {"relations": sizes, "queries": queries}
+
+
+def compare(before: dict, after: dict) -> dict:
+    return {
+        name: {
+            "buffers_before": before["queries"][name]["buffers"],
+            "buffers_after": q["buffers"],
+            "buffers_ratio": round(
+                q["buffers"] / max(before["queries"][name]["buffers"], 1), 3
+            ),
+            "ms_before": before["queries"][name]["ms"],
+            "ms_after": q["ms"],
+        }
+        for name, q in after["queries"].items()
+        if name in before["queries"]
+    }
+
+
+def main():
+    """
+    1. Reports heap / TOAST / total size of calls (and call_transcripts)
+    2. Runs the hot metadata queries under EXPLAIN (ANALYZE, BUFFERS) and
+       reports shared buffers touched and execution time
+    3. With --compare, diffs two saved reports (e.g. before and after the
+       transcript split migration plus VACUUM FULL calls)
+    """
+    parser = argparse.ArgumentParser(
+        description="Shared-buffer cost of the hot call queries."
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="also write the report to this JSON file")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two reports"
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        json.dump(compare(before, after), sys.stdout, indent=2)
+        print()
+        return
+
+    report = measure(args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,44 @@
+import argparse
 import json
 from datetime import datetime
 
 from sqlalchemy.orm import Session
 
-from app.db.session import SessionLocal
-from app.models.call import Call
+from app.core.dedup import fingerprint, flag_duplicates
+from app.core.insights_cache import transcript_hash
+from app.core.partitions import ensure_partitions_for
+from app.core.profiling import PROFILE_FORMATS, profile_run
+from app.core.rollups import refresh_agent_rollups, touched_days
+from app.db import SessionLocal
+from app.models.call import Call, CallTranscript
 
 DATA_PATH = "data/transcripts.jsonl"  # the location of transcripts json
 
 
 def load_calls_into_db():
     """
-    Populates the DB with the data in the json file
+    Populates the DB with the data in the json file, flags the new and
+    changed calls that near-duplicate another transcript (MinHash LSH, see
+    app.core.dedup), then refreshes the agent daily rollups for every day
+    the import touched
     """
     session: Session = SessionLocal()
     try:
+        # The months being imported need their calls partitions. Created in
+        # their own short transaction: CREATE TABLE ... PARTITION OF locks the
+        # parent table until commit.
+        with open(DATA_PATH, "r") as f:
+            start_times = {
+                datetime.fromisoformat(json.loads(line)["start_time"]) for line in f
+            }
+        ensure_partitions_for(session, start_times)
+        session.commit()
+
+        call_ids = []
         with open(DATA_PATH, "r") as f:
             for line in f:
                 item = json.loads(line)
+                minhash, lsh_bands = fingerprint(item["transcript"])
                 call = Call(
                     call_id=item["call_id"],
                     agent_id=item["agent_id"],
@@ -25,9 +46,35 @@ def load_calls_into_db():
                     language=item["language"],
                     start_time=datetime.fromisoformat(item["start_time"]),
                     duration_seconds=item["duration_seconds"],
-                    transcript=item["transcript"],
+                    # Same key as the call, so a re-import updates the
+                    # existing transcript row instead of inserting another
+                    transcript_row=CallTranscript(
+                        call_id=item["call_id"], transcript=item["transcript"]
+                    ),
+                    # A changed hash marks the call's insights as stale
+                    content_hash=transcript_hash(item["transcript"]),
+                    minhash=minhash,
+                    lsh_bands=lsh_bands,
                 )
-                session.merge(call)
+                merged = session.merge(call)
+                # Unchanged re-imports don't need their days re-aggregated
+                if merged in session.new or session.is_modified(merged):
+                    call_ids.append(item["call_id"])
+
+        # Nothing is flushed yet (autoflush is off), so this still sees the
+        # old start times of updated calls; the second pass sees the new ones.
+        days = touched_days(session, call_ids)
+        session.commit()
+        days |= touched_days(session, call_ids)
+
+        # Needs the fingerprints committed above: candidates are found in the
+        # stored band index. Calls pulled into or out of a cluster move
+        # between the deduplicated rollups of their days.
+        flagged = sorted(flag_duplicates(session, call_ids))
+        days |= touched_days(session, flagged)
+        session.commit()
+
+        refresh_agent_rollups(session, days)
         session.commit()
         print("All records imported successfully.")
     except Exception as e:
@@ -38,4 +85,14 @@ def load_calls_into_db():
 
 
 if __name__ == "__main__":
-    load_calls_into_db()
+    parser = argparse.ArgumentParser(description="Load transcripts into the DB.")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="speedscope",
+        choices=PROFILE_FORMATS,
+        help="write a sampling profile with SQL timings to $PROFILE_DIR",
+    )
+    args = parser.parse_args()
+    with profile_run("load_transcripts", args.profile):
+        load_calls_into_db()
@@ -0,0 +1,51 @@
+import argparse
+from datetime import date
+
+from app.core.partitions import (
+    PARTITION_MONTHS_AHEAD,
+    PARTITIONED_TABLES,
+    drop_partitions_before,
+    ensure_future_partitions,
+    list_partitions,
+)
+from app.db import SessionLocal
+
+
+def main():
+    """
+    1. Creates the calls / call_transcripts partitions for this month and
+       the next --ahead months (the nightly populator does the same)
+    2. With --drop-before, drops every partition holding only calls older
+       than that date; the rows go with their tables, instantly
+    3. Lists the partitions of each table with their bounds
+    """
+    parser = argparse.ArgumentParser(
+        description="Create, list and drop monthly calls partitions."
+    )
+    parser.add_argument("--ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    parser.add_argument(
+        "--drop-before",
+        type=date.fromisoformat,
+        metavar="YYYY-MM-DD",
+        help="drop the partitions that end on or before this date",
+    )
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        for name in ensure_future_partitions(session, ahead=args.ahead):
+            print(f"created {name}")
+        if args.drop_before:
+            for name in drop_partitions_before(session, args.drop_before):
+                print(f"dropped {name}")
+        session.commit()
+
+        for table in PARTITIONED_TABLES:
+            for name, lower, upper in list_partitions(session, table):
+                print(f"{table}\t{name}\t{lower or 'DEFAULT'}\t{upper or ''}")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,106 +1,316 @@
+"""
+Generate synthetic call transcripts with an LLM, concurrently and resumably.
+
+- Requests go through one pooled httpx.AsyncClient to the chat completions
+  API at OPENAI_API_BASE (point it at a local stub to test), at most
+  --concurrency at a time
+- A token bucket keeps the estimated tokens per minute under --tpm
+- 429s, 5xx and transport errors are retried with exponential backoff and
+  jitter, honouring Retry-After
+- One writer task appends finished transcripts to the output file, which
+  is opened once and flushed in batches
+- Call ids are derived from --seed, so a rerun with the same seed skips
+  every call_id already in the output and generates only the rest
+"""
+
+import argparse
 import asyncio
 import json
 import os
 import random
+import time
+import uuid
 from datetime import datetime, timedelta
-from threading import Lock
+from typing import Dict, List, Optional, Set
 
-import openai
+import httpx
 from faker import Faker
 
 fake = Faker()
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 # Simulated agent IDs (lets pretend these are our real call center agents)
 AGENT_IDS = ["A1", "A2", "A3", "A4", "A5"]
 DESTINATION_FILE = "transcripts.jsonl"
 
-# Thread lock to ensure only one thread writes to the file at a time
-file_lock = Lock()
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+MODEL = "gpt-4-turbo"
+MAX_TOKENS = 1000
+DEFAULT_CONCURRENCY = int(os.getenv("GEN_CONCURRENCY", "8"))
+# Estimated (prompt + completion) tokens per minute
+DEFAULT_TPM = int(os.getenv("GEN_TOKENS_PER_MINUTE", "90000"))
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+REQUEST_TIMEOUT = 60.0
+# The writer flushes after this many lines or seconds, whichever comes first
+FLUSH_LINES = 20
+FLUSH_SECONDS = 1.0
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+# Namespace for the call_ids derived from (seed, index)
+CALL_ID_NAMESPACE = uuid.UUID("8f7c3c1e-2b5d-4f0e-9a61-3e1d0c9b7a42")
 
 
-def generate_customer_query():
+def generate_customer_query(rng: random.Random) -> str:
     """
     Randomly pick a customer query type and return a sentence for it.
     """
-    query_type = random.choice(
-        ["order_status", "billing", "account", "technical_issue"]
-    )
+    query_type = rng.choice(["order_status", "billing", "account", "technical_issue"])
     if query_type == "order_status":
-        return f"Can you update me on the status of my order #ORD{fake.random_number(digits=6)}?"
+        return f"Can you update me on the status of my order #ORD{rng.randrange(10**6):06d}?"
     elif query_type == "billing":
-        return f"I received a wrong charge on my bill, can you review it for me?"
+        return "I received a wrong charge on my bill, can you review it for me?"
     elif query_type == "account":
-        return f"I'm unable to log into my account. Could you help me with a password reset?"
-    elif query_type == "technical_issue":
-        return f"I'm experiencing issues with the {fake.word()} feature. It’s not working correctly."
+        return "I'm unable to log into my account. Could you help me with a password reset?"
+    return f"I'm experiencing issues with the {fake.word()} feature. It’s not working correctly."
 
 
-async def generate_transcript_with_llm(call_id: str, customer_id: str, agent_id: str):
-    language = "English"
-    start_time = datetime.now() - timedelta(minutes=random.randint(1, 120))
-    duration_seconds = random.randint(60, 1200)
-    customer_query = generate_customer_query()
+def plan_calls(num_transcripts: int, seed: int) -> List[Dict]:
+    """
+    The calls to generate: the same ids, agents, customers and queries for
+    the same (num_transcripts, seed), which is what makes resuming work.
+    """
+    rng = random.Random(seed)
+    fake.seed_instance(seed)
+    return [
+        {
+            "call_id": str(uuid.uuid5(CALL_ID_NAMESPACE, f"{seed}:{i}")),
+            "customer_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "agent_id": rng.choice(AGENT_IDS),
+            "customer_query": generate_customer_query(rng),
+        }
+        for i in range(num_transcripts)
+    ]
 
-    prompt = f"Generate a customer service conversation between an agent and a customer. The customer says: {customer_query}"
 
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1000,
-            temperature=0.1,
-        )
-        cleaned_response = response["choices"][0]["message"]["content"]
-
-        result = {
-            "call_id": call_id,
-            "agent_id": agent_id,
-            "customer_id": customer_id,
-            "language": language,
-            "start_time": start_time.isoformat(),
-            "duration_seconds": duration_seconds,
-            "transcript": cleaned_response,
-        }
+def completed_call_ids(path: str) -> Set[str]:
+    """
+    call_ids already in the output. A torn last line (a crash mid-write, so
+    no trailing newline) is cut off, so appending resumes on a clean line
+    boundary. A complete line that doesn't parse is skipped with a warning
+    and left in place; the lines after it still count.
+    """
+    if not os.path.exists(path):
+        return set()
+    done: Set[str] = set()
+    with open(path, "rb+") as f:
+        good = 0
+        for number, line in enumerate(f, 1):
+            if not line.endswith(b"\n"):
+                # Only the last line can lack a newline
+                f.truncate(good)
+                break
+            good += len(line)
+            try:
+                done.add(json.loads(line)["call_id"])
+            except (ValueError, KeyError, TypeError):
+                print(f"Warning: skipping malformed line {number} of {path}")
+    return done
 
-        # Write to file asynchronously
-        await asyncio.to_thread(write_line_to_file, result)
 
-    except Exception as e:
-        print(f"Error generating transcript for call_id={call_id}: {e}")
+class TokenBucket:
+    """
+    Async token bucket: `rate_per_minute` tokens refill continuously, up to
+    one minute's worth. acquire(n) waits until n are available.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, n: float) -> None:
+        n = min(n, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n - self.tokens) / self.rate)
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+async def complete(client: httpx.AsyncClient, bucket: TokenBucket, prompt: str) -> str:
+    """
+    One chat completion, rate limited and retried; raises once the retries
+    run out or on an error that retrying won't fix.
+    """
+    # ~4 characters per token, plus the whole completion budget
+    await bucket.acquire(len(prompt) / 4 + MAX_TOKENS)
+    payload = {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": MAX_TOKENS,
+        "temperature": 0.1,
+    }
+    for attempt in range(MAX_RETRIES + 1):
+        response: Optional[httpx.Response] = None
+        try:
+            response = await client.post("/chat/completions", json=payload)
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response.json()["choices"][0]["message"]["content"]
+        except httpx.TransportError:
+            pass
+        if attempt == MAX_RETRIES:
+            break
+        await asyncio.sleep(_retry_delay(attempt, response))
+    raise RuntimeError(f"gave up after {MAX_RETRIES + 1} attempts")
 
 
-def write_line_to_file(transcript):
+async def writer(path: str, lines: asyncio.Queue) -> int:
     """
-    Write a single transcript as JSON to the transcripts file.
-    Uses a file lock to avoid write collisions.
+    The only task touching the output file: appends what the workers queue,
+    flushing every FLUSH_LINES lines or FLUSH_SECONDS. A None ends it.
     """
-    line = json.dumps(transcript)
-    with file_lock:
-        with open(DESTINATION_FILE, "a") as f:
-            f.write(line + "\n")
-            f.flush()
-    print(f"Saved transcript for call_id={transcript['call_id']}")
+    written = 0
+    pending = 0
+    with open(path, "a", encoding="utf-8") as f:
+        while True:
+            try:
+                item = await asyncio.wait_for(lines.get(), timeout=FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                item = ...
+            if item is None:
+                break
+            if item is not ...:
+                f.write(json.dumps(item) + "\n")
+                written += 1
+                pending += 1
+            if pending and (pending >= FLUSH_LINES or item is ...):
+                f.flush()
+                pending = 0
+        f.flush()
+        os.fsync(f.fileno())
+    return written
+
+
+async def generate_transcript_with_llm(
+    client: httpx.AsyncClient, bucket: TokenBucket, call: Dict, lines: asyncio.Queue
+) -> bool:
+    prompt = (
+        "Generate a customer service conversation between an agent and a "
+        f"customer. The customer says: {call['customer_query']}"
+    )
+    try:
+        transcript = await complete(client, bucket, prompt)
+    except Exception as e:
+        print(f"Error generating transcript for call_id={call['call_id']}: {e}")
+        return False
+
+    await lines.put(
+        {
+            "call_id": call["call_id"],
+            "agent_id": call["agent_id"],
+            "customer_id": call["customer_id"],
+            "language": "English",
+            "start_time": (
+                datetime.now() - timedelta(minutes=random.randint(1, 120))
+            ).isoformat(),
+            "duration_seconds": random.randint(60, 1200),
+            "transcript": transcript,
+        }
+    )
+    return True
 
 
-async def generate_synthetic_transcripts(num_transcripts=200):
+async def generate_synthetic_transcripts(
+    num_transcripts: int = 200,
+    seed: int = 0,
+    path: str = DESTINATION_FILE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    tokens_per_minute: int = DEFAULT_TPM,
+    api_base: str = OPENAI_API_BASE,
+    api_key: Optional[str] = None,
+) -> Dict[str, int]:
     """
-    Create N synthetic call transcripts in parallel.
-    Each call gets a random agent, customer, and call ID.
+    Generate the planned calls missing from path, `concurrency` workers at
+    a time. Returns counts of written, skipped (already there) and failed.
     """
-    tasks = []
-    for _ in range(num_transcripts):
-        call_id = fake.uuid4()
-        customer_id = fake.uuid4()
-        agent_id = random.choice(AGENT_IDS)
-        transcript = generate_transcript_with_llm(call_id, customer_id, agent_id)
-        tasks.append(transcript)
-    await asyncio.gather(*tasks)
+    done = completed_call_ids(path)
+    todo: asyncio.Queue = asyncio.Queue()
+    for call in plan_calls(num_transcripts, seed):
+        if call["call_id"] not in done:
+            todo.put_nowait(call)
+    skipped = num_transcripts - todo.qsize()
+
+    lines: asyncio.Queue = asyncio.Queue()
+    bucket = TokenBucket(tokens_per_minute)
+    failed = 0
+
+    async def worker() -> None:
+        nonlocal failed
+        while not todo.empty():
+            call = todo.get_nowait()
+            if not await generate_transcript_with_llm(client, bucket, call, lines):
+                failed += 1
+
+    key = api_key or os.getenv("OPENAI_API_KEY", "")
+    async with httpx.AsyncClient(
+        base_url=api_base,
+        headers={"Authorization": f"Bearer {key}"},
+        timeout=REQUEST_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=concurrency, max_keepalive_connections=concurrency
+        ),
+    ) as client:
+        writing = asyncio.create_task(writer(path, lines))
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            await lines.put(None)
+            written = await writing
+    return {"written": written, "skipped": skipped, "failed": failed}
+
 
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic call transcripts with an LLM."
+    )
+    parser.add_argument("-n", "--num", type=int, default=200)
+    parser.add_argument(
+        "--seed", type=int, default=0, help="same seed = same call_ids (resumable)"
+    )
+    parser.add_argument("--out", default=DESTINATION_FILE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM)
+    parser.add_argument("--api-base", default=OPENAI_API_BASE)
+    args = parser.parse_args()
 
-async def main():
-    await generate_synthetic_transcripts()
+    started = time.monotonic()
+    stats = asyncio.run(
+        generate_synthetic_transcripts(
+            args.num,
+            seed=args.seed,
+            path=args.out,
+            concurrency=args.concurrency,
+            tokens_per_minute=args.tpm,
+            api_base=args.api_base,
+        )
+    )
+    print(
+        f"Wrote {stats['written']} transcripts, skipped {stats['skipped']} already "
+        f"in {args.out}, {stats['failed']} failed "
+        f"({time.monotonic() - started:.1f}s)."
+    )
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,318 @@
+"""
+Load test for the live sentiment stream, /ws/sentiment/{call_id}.
+
+Opens --clients concurrent WebSocket viewers spread round-robin over the
+call_ids, started evenly across --ramp seconds, and reads their frames.
+Meanwhile it polls the server's /healthz/ws for open streams, RSS, file
+descriptors and DB pool use. The JSON report has:
+
+- clients: connected, failed, closed normally or abnormally, dropped on
+  purpose (--drop: that share of viewers vanishes without a close
+  handshake after --drop-after frames, to exercise disconnect handling)
+- connect_ms: WebSocket handshake time
+- inter_frame_ms and jitter_ms: gaps between a viewer's frames, and their
+  distance from the server's stream interval
+- delivery_ms: receive time minus the frame's "ts" (client and server
+  clocks must agree, e.g. same host)
+- server: the polled samples, baseline and peaks, and the cost per open
+  stream (RSS, fds, pool connections)
+
+Run it against a single worker (plain uvicorn) for per-stream costs: with
+several gunicorn workers /healthz/ws answers from whichever one accepts it.
+Set WS_STREAM_INTERVAL on the server for shorter streams. --label names
+the run, to tell reports of different stream implementations apart.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
+
+CONNECT_TIMEOUT = 30.0
+
+
+def _summary(values: Sequence[float], scale: float = 1000.0) -> Dict[str, float]:
+    """
+    count / mean / p50 / p90 / p99 / max, scaled (seconds to ms by default).
+    """
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pct(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * scale, 3),
+        "p50": pct(0.50),
+        "p90": pct(0.90),
+        "p99": pct(0.99),
+        "max": round(ordered[-1] * scale, 3),
+    }
+
+
+def _raise_fd_limit(needed: int) -> None:
+    # Every viewer is a socket; the default soft limit is often 1024
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = hard if hard == resource.RLIM_INFINITY else min(hard, needed)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+async def viewer(
+    url: str, delay: float, hold: float, drop_after: Optional[int]
+) -> Dict:
+    """
+    One viewer: waits its turn in the ramp, then reads frames until the
+    server ends the stream, `hold` seconds pass, or it drops on purpose.
+    """
+    await asyncio.sleep(delay)
+    result: Dict = {
+        "connect_s": None,
+        "frames": 0,
+        "gaps": [],
+        "delivery": [],
+        "outcome": None,
+    }
+    started = time.perf_counter()
+    try:
+        async with connect(url, open_timeout=CONNECT_TIMEOUT) as ws:
+            result["connect_s"] = time.perf_counter() - started
+            deadline = time.perf_counter() + hold if hold else None
+            last = None
+            while True:
+                timeout = None if deadline is None else deadline - time.perf_counter()
+                if timeout is not None and timeout <= 0:
+                    result["outcome"] = "held"
+                    break
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout)
+                except asyncio.TimeoutError:
+                    result["outcome"] = "held"
+                    break
+                now = time.perf_counter()
+                frame = json.loads(message)
+                result["delivery"].append(
+                    time.time() - datetime.fromisoformat(frame["ts"]).timestamp()
+                )
+                if last is not None:
+                    result["gaps"].append(now - last)
+                last = now
+                result["frames"] += 1
+                if drop_after is not None and result["frames"] >= drop_after:
+                    # Vanish without a close frame, like a dead mobile client
+                    ws.transport.abort()
+                    result["outcome"] = "dropped"
+                    break
+    except ConnectionClosedOK:
+        result["outcome"] = "closed_normal"
+    except ConnectionClosedError:
+        result["outcome"] = "closed_abnormal"
+    except Exception as e:
+        result["outcome"] = "failed"
+        result["error"] = type(e).__name__
+    return result
+
+
+async def sample_server(
+    http: httpx.AsyncClient, samples: List[Dict], every: float, stop: asyncio.Event
+) -> None:
+    started = time.perf_counter()
+    while True:
+        try:
+            stats = (await http.get("/healthz/ws")).json()
+            pools = [stats["db"]["primary"], *stats["db"]["replicas"]]
+            samples.append(
+                {
+                    "t": round(time.perf_counter() - started, 3),
+                    "streams": stats["streams"]["active"],
+                    "rss_mb": stats["memory"].get(
+                        "rss_mb", stats["memory"].get("peak_rss_mb")
+                    ),
+                    "fds": stats["fds"],
+                    "db_checked_out": sum(p.get("checked_out", 0) for p in pools),
+                    "send_mean_ms": stats["streams"]["send_mean_ms"],
+                }
+            )
+        except (httpx.HTTPError, ValueError, KeyError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), every)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+
+def _server_report(samples: List[Dict], before: Dict, after: Dict) -> Dict:
+    if not samples:
+        return {"samples": []}
+    base = samples[0]
+    peak = {
+        key: max((s[key] for s in samples if s[key] is not None), default=None)
+        for key in ("streams", "rss_mb", "fds", "db_checked_out")
+    }
+    per_stream = {}
+    if peak["streams"]:
+        for key in ("rss_mb", "fds", "db_checked_out"):
+            if peak[key] is not None and base[key] is not None:
+                per_stream[key] = round((peak[key] - base[key]) / peak["streams"], 4)
+    return {
+        "baseline": base,
+        "peak": peak,
+        "per_stream": per_stream,
+        # What the server counted during the run
+        "streams": {
+            key: after["streams"][key] - before["streams"][key]
+            for key in ("opened", "completed", "disconnected", "frames")
+        },
+        "send_max_ms": after["streams"]["send_max_ms"],
+        "samples": samples,
+    }
+
+
+async def run_load_test(
+    base_url: str,
+    clients: int,
+    ramp: float = 10.0,
+    hold: float = 0.0,
+    call_ids: Optional[List[str]] = None,
+    drop: float = 0.0,
+    drop_after: int = 3,
+    sample_every: float = 1.0,
+    label: str = "",
+    seed: int = 0,
+) -> Dict:
+    """
+    Run the load test against base_url (http://host:port) and return the report.
+    """
+    _raise_fd_limit(clients + 256)
+    ws_base = "ws" + base_url[len("http") :]
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+        if not call_ids:
+            items = (await http.get("/api/v1/calls", params={"limit": 200})).json()
+            call_ids = [item["call_id"] for item in items["items"]]
+        if not call_ids:
+            raise SystemExit("No calls to stream; load transcripts first.")
+        before = (await http.get("/healthz/ws")).json()
+        interval = before["streams"]["interval_s"]
+
+        rng = random.Random(seed)
+        dropping = set(rng.sample(range(clients), int(round(drop * clients))))
+        samples: List[Dict] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_server(http, samples, sample_every, stop))
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                viewer(
+                    f"{ws_base}/ws/sentiment/{call_ids[i % len(call_ids)]}",
+                    delay=ramp * i / clients,
+                    hold=hold,
+                    drop_after=drop_after if i in dropping else None,
+                )
+                for i in range(clients)
+            )
+        )
+        elapsed = time.perf_counter() - started
+        # The server notices a dropped viewer on its next send: wait for the
+        # open streams to fall back to where they were
+        settle = time.perf_counter() + 2 * interval + 5.0
+        while True:
+            after = (await http.get("/healthz/ws")).json()
+            active = after["streams"]["active"]
+            if active <= before["streams"]["active"] or time.perf_counter() > settle:
+                break
+            await asyncio.sleep(min(interval, 0.5))
+        stop.set()
+        await sampler
+
+    outcomes: Dict[str, int] = {}
+    for r in results:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    errors: Dict[str, int] = {}
+    for r in results:
+        if "error" in r:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    gaps = [g for r in results for g in r["gaps"]]
+    return {
+        "label": label,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "base_url": base_url,
+            "clients": clients,
+            "ramp_s": ramp,
+            "hold_s": hold,
+            "call_ids": len(call_ids),
+            "drop": drop,
+            "drop_after": drop_after,
+            "interval_s": interval,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "clients": {
+            "connected": sum(r["connect_s"] is not None for r in results),
+            **outcomes,
+            "errors": errors,
+        },
+        "frames": sum(r["frames"] for r in results),
+        "connect_ms": _summary([r["connect_s"] for r in results if r["connect_s"]]),
+        "inter_frame_ms": _summary(gaps),
+        "jitter_ms": _summary([abs(g - interval) for g in gaps]),
+        "delivery_ms": _summary([d for r in results for d in r["delivery"]]),
+        "server": _server_report(samples, before, after),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds to start all")
+    parser.add_argument(
+        "--hold", type=float, default=0.0, help="seconds per viewer (0: whole stream)"
+    )
+    parser.add_argument("--call-ids", help="comma-separated (default: from the API)")
+    parser.add_argument("--drop", type=float, default=0.0, help="share that drops")
+    parser.add_argument("--drop-after", type=int, default=3, help="frames")
+    parser.add_argument("--sample-every", type=float, default=1.0)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", default="ws_load_report.json")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_load_test(
+            args.url,
+            args.clients,
+            ramp=args.ramp,
+            hold=args.hold,
+            call_ids=args.call_ids.split(",") if args.call_ids else None,
+            drop=args.drop,
+            drop_after=args.drop_after,
+            sample_every=args.sample_every,
+            label=args.label,
+        )
+    )
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    server = report["server"]
+    print(
+        f"{report['clients']['connected']}/{args.clients} connected, "
+        f"{report['frames']} frames in {report['elapsed_s']}s; "
+        f"jitter p99 {report['jitter_ms'].get('p99')} ms; "
+        f"peak {server.get('peak', {}).get('streams')} streams, "
+        f"per stream {server.get('per_stream')}. Report: {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,9 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 
-from app.api.v1 import endpoints as ep  # to override get_db
+from app.core.partitions import add_months, ensure_future_partitions, month_start
+from app.core.rollups import refresh_agent_rollups, touched_days
+from app.db import get_db, get_read_db
 from app.models.call import Base, Call
 from main import app
 
@@ -47,7 +49,15 @@ def db_engine():
 def db_session_factory(db_engine):
     Base.metadata.drop_all(db_engine)
     Base.metadata.create_all(db_engine)
-    return sessionmaker(bind=db_engine, autoflush=False, autocommit=False)
+    factory = sessionmaker(bind=db_engine, autoflush=False, autocommit=False)
+
+    # calls is partitioned by month; seeded rows are always near now
+    with factory() as session:
+        ensure_future_partitions(
+            session, ahead=2, today=add_months(month_start(datetime.utcnow()), -1)
+        )
+        session.commit()
+    return factory
 
 
 @pytest.fixture(scope="function")
@@ -110,20 +120,27 @@ def client(db_session, monkeypatch) -> TestClient:
             embedding=_unit_vec(3),
             agent_talk_ratio=0.55,
             customer_sentiment_score=0.05,
+            sentiment_timeline=[[0, 40, -0.42], [30, 73, 0.51]],
         ),
     ]
+    seeded_ids = [str(r.call_id) for r in rows]
     for r in rows:
         db_session.add(r)
     db_session.commit()
 
-    # Overriding get_db to use the test session
+    # The analytics endpoints read the rollups the loader / populator maintain
+    refresh_agent_rollups(db_session, touched_days(db_session, seeded_ids))
+    db_session.commit()
+
+    # Overriding get_db / get_read_db to use the test session
     def override_get_db():
         try:
             yield db_session
         finally:
             pass
 
-    app.dependency_overrides[ep.get_db] = override_get_db
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     monkeypatch.delenv("OPENAI_API_KEY", raising=False)
 
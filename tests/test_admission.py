@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1 import endpoints
+from app.core import admission
+from app.core.admission import AdmissionLimit
+
+
+def test_limit_queues_then_sheds_when_full_or_late():
+    async def scenario():
+        limit = AdmissionLimit("demo", max_concurrent=1, max_queue=1, queue_timeout=0.2)
+        first = await limit.acquire()
+        assert not first.degraded
+
+        # Second waits for the slot; third finds the queue full
+        waiting = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as full:
+            await limit.acquire()
+        assert full.value.status_code == 503
+        assert int(full.value.headers["Retry-After"]) >= 1
+
+        limit.release(first)
+        second = await waiting
+        assert second.degraded and limit.active == 1
+
+        # Nobody releases: the queued request hits its deadline
+        with pytest.raises(HTTPException) as late:
+            await limit.acquire()
+        assert "timeout" in late.value.detail
+        limit.release(second)
+        return limit.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0 and stats["waiting"] == 0
+    assert stats["admitted"] == 2
+    assert stats["shed_queue_full"] == 1 and stats["shed_timeout"] == 1
+
+
+def test_slot_handed_to_a_waiter_that_gives_up_is_not_lost(monkeypatch):
+    async def late_wait_for(fut, timeout):
+        # The deadline passes right after release() handed the slot over
+        await fut
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        limit = AdmissionLimit("demo", max_concurrent=1, max_queue=2, queue_timeout=1)
+        first = await limit.acquire()
+        monkeypatch.setattr(admission.asyncio, "wait_for", late_wait_for)
+        late = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        monkeypatch.undo()
+        behind = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+
+        limit.release(first)
+        with pytest.raises(HTTPException):
+            await late
+        # The slot went on to the next waiter instead of leaking
+        second = await behind
+        assert limit.active == 1
+        limit.release(second)
+
+        # Cancelled while queued, after the hand-over or before it
+        third = await limit.acquire()
+        cancelled = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        limit.release(third)
+        cancelled.cancel()
+        try:
+            limit.release(await cancelled)
+        except asyncio.CancelledError:
+            pass
+        return limit.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def _embedded_call_id(client) -> str:
+    # Agent A2's seeded call has an embedding
+    items = client.get("/api/v1/calls?agent_id=A2&limit=1").json()["items"]
+    return items[0]["call_id"]
+
+
+def test_saturated_route_sheds_with_retry_after(client, monkeypatch):
+    monkeypatch.setitem(
+        admission.LIMITS,
+        "recommendations",
+        AdmissionLimit(
+            "recommendations", max_concurrent=0, max_queue=0, queue_timeout=1
+        ),
+    )
+    r = client.get(f"/api/v1/calls/{_embedded_call_id(client)}/recommendations")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"].isdigit()
+    # Cheap routes are unaffected
+    assert client.get("/healthz").status_code == 200
+
+    stats = client.get("/healthz/admission").json()
+    assert stats["routes"]["recommendations"]["shed_queue_full"] == 1
+
+
+def test_pressure_degrades_nudges_to_rule_based(client, monkeypatch):
+    calls = []
+
+    class FakeOpenAI:
+        class ChatCompletion:
+            @staticmethod
+            def create(**kw):
+                calls.append(kw)
+                return {"choices": [{"message": {"content": "1. Ask more"}}]}
+
+    monkeypatch.setattr(endpoints, "_openai_module", lambda: FakeOpenAI)
+    call_id = _embedded_call_id(client)
+
+    # Plenty of room: the LLM is asked
+    r = client.get(f"/api/v1/calls/{call_id}/recommendations")
+    assert r.status_code == 200 and r.json()["coaching_nudges"] == ["1. Ask more"]
+    assert len(calls) == 1
+
+    # Past the degrade threshold: rule-based nudges, no LLM call
+    monkeypatch.setitem(
+        admission.LIMITS,
+        "recommendations",
+        AdmissionLimit(
+            "recommendations",
+            max_concurrent=4,
+            max_queue=4,
+            queue_timeout=1,
+            degrade_at=0.0,
+        ),
+    )
+    r = client.get(f"/api/v1/calls/{call_id}/recommendations")
+    assert r.status_code == 200
+    assert r.json()["coaching_nudges"] != ["1. Ask more"]
+    assert len(calls) == 1
+    assert admission.LIMITS["recommendations"].stats()["degraded"] == 1
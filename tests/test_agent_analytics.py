@@ -1,3 +1,6 @@
+import pytest
+
+
 def test_agents_leaderboard(client):
     resp = client.get("/api/v1/analytics/agents")
     assert resp.status_code == 200
@@ -8,3 +11,74 @@ def test_agents_leaderboard(client):
     agent_ids = {row["agent_id"] for row in data["items"]}
     assert "A1" in agent_ids
     assert "A2" in agent_ids
+
+
+def test_agents_leaderboard_percentiles(client):
+    resp = client.get("/api/v1/analytics/agents", params={"histogram_bins": 4})
+    assert resp.status_code == 200
+    a2 = next(row for row in resp.json()["items"] if row["agent_id"] == "A2")
+    # Every seeded A2 call has sentiment -0.35 and 900s duration
+    assert a2["sentiment"]["p10"] == pytest.approx(-0.35, abs=1e-6)
+    assert a2["sentiment"]["p90"] == pytest.approx(-0.35, abs=1e-6)
+    assert a2["duration_seconds"]["p50"] == pytest.approx(900)
+    hist = a2["sentiment"]["histogram"]
+    assert len(hist["edges"]) == 5
+    assert sum(hist["counts"]) == a2["total_calls"]
+
+
+def test_agents_timeseries_from_rollups(client, db_session):
+    from app.models.call import Call
+
+    resp = client.get("/api/v1/analytics/agents/timeseries", params={"bucket": "week"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["bucket"] == "week"
+    a1 = [p for p in data["items"] if p["agent_id"] == "A1"]
+    assert a1
+    assert sum(p["total_calls"] for p in a1) == (
+        db_session.query(Call).filter(Call.agent_id == "A1").count()
+    )
+    for p in a1:
+        assert -1.0 <= p["avg_sentiment"] <= 1.0
+
+
+def test_agents_timeseries_rejects_unknown_bucket(client):
+    resp = client.get("/api/v1/analytics/agents/timeseries", params={"bucket": "hour"})
+    assert resp.status_code == 422
+
+
+def test_rollup_days_are_utc_whatever_the_session_time_zone(db_session):
+    import uuid
+    from datetime import datetime, timedelta, timezone
+
+    from sqlalchemy import text
+
+    from app.core.rollups import refresh_agent_rollups, touched_days
+    from app.models.call import Call
+    from app.models.rollup import AgentDailyRollup
+
+    # 23:30 UTC is already the next day in Kiritimati (UTC+14)
+    db_session.execute(text("SET TIME ZONE 'Pacific/Kiritimati'"))
+    agent = f"TZ-{uuid.uuid4().hex[:8]}"
+    call_id = str(uuid.uuid4())
+    day = (datetime.now(timezone.utc) - timedelta(days=1)).date()
+    db_session.add(
+        Call(
+            call_id=call_id,
+            agent_id=agent,
+            customer_id="C1",
+            language="English",
+            start_time=datetime(
+                day.year, day.month, day.day, 23, 30, tzinfo=timezone.utc
+            ),
+            duration_seconds=60,
+            transcript="hello",
+        )
+    )
+    db_session.flush()
+
+    assert touched_days(db_session, [call_id]) == {day}
+    refresh_agent_rollups(db_session, {day})
+    rows = db_session.query(AgentDailyRollup).filter(AgentDailyRollup.agent_id == agent)
+    assert {(r.day, r.call_count) for r in rows} == {(day, 1)}
+    db_session.rollback()
@@ -0,0 +1,156 @@
+import os
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app.core import archive
+from app.core.partitions import ensure_partitions
+from app.models.call import Call, CallTranscript
+from tests.conftest import _unit_vec
+
+
+def _old_call(start_time: datetime, **kw) -> Call:
+    return Call(
+        call_id=str(uuid.uuid4()),
+        agent_id="A7",
+        customer_id="C7",
+        language="English",
+        start_time=start_time,
+        duration_seconds=120,
+        transcript="**Customer:** Where is my refund from last year?",
+        embedding=_unit_vec(7),
+        agent_talk_ratio=0.5,
+        customer_sentiment_score=-0.2,
+        sentiment_timeline=[[0, 40, -0.2]],
+        **kw,
+    )
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "ndjson"])
+def test_archive_moves_old_calls_and_get_call_reads_them(
+    client, db_session, tmp_path, monkeypatch, fmt
+):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    ensure_partitions(db_session, [date(2002, 3, 1), date(2002, 4, 1)])
+    db_session.commit()
+    march = [
+        _old_call(datetime(2002, 3, d, 9, tzinfo=timezone.utc)) for d in (2, 15, 31)
+    ]
+    april_old = _old_call(datetime(2002, 4, 3, tzinfo=timezone.utc))
+    april_new = _old_call(datetime(2002, 4, 20, tzinfo=timezone.utc))
+    db_session.add_all(march + [april_old, april_new])
+    db_session.commit()
+    archived_ids = [str(c.call_id) for c in march + [april_old]]
+    kept_id = str(april_new.call_id)
+
+    stats = archive.archive_calls(
+        db_session,
+        datetime(2002, 4, 10, tzinfo=timezone.utc),
+        fmt=fmt,
+        batch_rows=2,
+    )
+    assert stats["archived"] == 4
+    assert [p.split(os.sep)[1] for p in stats["files"]] == [
+        "month=2002-03",
+        "month=2002-04",
+    ]
+    assert all(os.path.exists(tmp_path / p) for p in stats["files"])
+    # March is gone as a whole; April still holds the newer call
+    assert stats["dropped"] == ["calls_p2002_03", "call_transcripts_p2002_03"]
+
+    db_session.expire_all()
+    for cid in archived_ids:
+        assert db_session.get(Call, cid) is None
+        assert db_session.get(CallTranscript, cid) is None
+    assert db_session.get(Call, kept_id) is not None
+    assert not db_session.execute(text("SELECT to_regclass('calls_p2002_03')")).scalar()
+
+    r = client.get(f"/api/v1/calls/{archived_ids[1]}")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["archived"] is True
+    assert body["transcript"] == "**Customer:** Where is my refund from last year?"
+    assert body["embedding"] == _unit_vec(7)
+    assert body["sentiment_timeline"] == [[0, 40, -0.2]]
+    assert body["start_time"].startswith("2002-03-15T09:00:00")
+
+    r = client.get(f"/api/v1/calls/{archived_ids[3]}/embedding")
+    assert r.status_code == 200 and r.headers["X-Embedding-Dim"] == "384"
+
+    r = client.get(f"/api/v1/calls/{kept_id}")
+    assert r.status_code == 200 and r.json()["archived"] is False
+    assert client.get(f"/api/v1/calls/{uuid.uuid4()}").status_code == 404
+
+
+def test_archive_keeps_rows_when_the_file_does_not_verify(
+    db_session, tmp_path, monkeypatch
+):
+    ensure_partitions(db_session, [date(2003, 5, 1)])
+    db_session.commit()
+    call = _old_call(datetime(2003, 5, 5, tzinfo=timezone.utc))
+    db_session.add(call)
+    db_session.commit()
+
+    # A reader that loses the last row: the archive must not delete anything
+    read = archive.READERS["parquet"]
+    monkeypatch.setitem(archive.READERS, "parquet", lambda path: list(read(path))[:-1])
+    with pytest.raises(archive.ArchiveError):
+        archive.archive_calls(
+            db_session, datetime(2003, 6, 1, tzinfo=timezone.utc), root=str(tmp_path)
+        )
+    db_session.rollback()
+    db_session.expire_all()
+    assert db_session.get(Call, str(call.call_id)) is not None
+    # Neither a half-written file nor an index is left behind
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_archiving_a_duplicate_root_keeps_one_copy_listed(client, db_session, tmp_path):
+    from datetime import timedelta
+
+    from app.core.dedup import fingerprint
+
+    ensure_partitions(db_session, [date(2004, 2, 1)])
+    db_session.commit()
+    agent = f"ARC-{uuid.uuid4().hex[:8]}"
+    text_ = " ".join(f"word{i} about order {uuid.uuid4().hex[:6]}" for i in range(60))
+    minhash, bands = fingerprint(text_)
+    root = _old_call(
+        datetime(2004, 2, 3, tzinfo=timezone.utc),
+        minhash=minhash,
+        lsh_bands=bands,
+    )
+    root.agent_id = agent
+    root.transcript = text_
+    recent = datetime.now(timezone.utc) - timedelta(hours=2)
+    copies = [
+        _old_call(
+            recent + timedelta(minutes=i),
+            minhash=minhash,
+            lsh_bands=bands,
+            duplicate_of=root.call_id,
+        )
+        for i in range(2)
+    ]
+    for copy in copies:
+        copy.agent_id = agent
+        copy.transcript = text_
+    db_session.add_all([root] + copies)
+    db_session.commit()
+
+    archive.archive_calls(
+        db_session, datetime(2004, 3, 1, tzinfo=timezone.utc), root=str(tmp_path)
+    )
+
+    first, second = (str(c.call_id) for c in copies)
+    listed = client.get(
+        "/api/v1/calls", params={"agent_id": agent, "exclude_duplicates": True}
+    ).json()
+    assert [c["call_id"] for c in listed["items"]] == [first]
+    db_session.expire_all()
+    assert db_session.get(Call, second).duplicate_of == first
+
+    items = client.get("/api/v1/analytics/agents", params={"dedupe": True}).json()
+    assert next(a for a in items["items"] if a["agent_id"] == agent)["total_calls"] == 1
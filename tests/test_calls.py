@@ -1,5 +1,10 @@
+import csv
+import io
+import json
 from datetime import datetime, timedelta
 
+import pytest
+
 
 def test_list_calls_basic(client):
     resp = client.get("/api/v1/calls?limit=10")
@@ -43,3 +48,116 @@ def test_get_call_detail_ok(client):
     detail = resp.json()
     assert detail["call_id"] == call_id
     assert "embedding" in detail  # exposed by schema
+
+
+def test_list_items_match_call_schema(client):
+    from app.schemas.call import CallBase
+
+    items = client.get("/api/v1/calls?limit=5").json()["items"]
+    assert items
+    for it in items:
+        assert set(it) == set(CallBase.model_fields)
+        CallBase.model_validate(it)
+
+
+def test_embedding_binary_formats(client, db_session):
+    import base64
+
+    import numpy as np
+
+    from app.models.call import Call
+
+    call = db_session.query(Call).filter(Call.embedding.isnot(None)).first()
+    call_id = str(call.call_id)
+    as_json = client.get(f"/api/v1/calls/{call_id}").json()["embedding"]
+    expected = np.asarray(as_json, dtype=np.float32)
+
+    b64 = client.get(
+        f"/api/v1/calls/{call_id}", params={"embedding_format": "b64f32"}
+    ).json()["embedding"]
+    assert np.array_equal(np.frombuffer(base64.b64decode(b64), "<f4"), expected)
+
+    raw = client.get(f"/api/v1/calls/{call_id}/embedding")
+    assert raw.status_code == 200
+    assert raw.headers["content-type"] == "application/octet-stream"
+    assert raw.headers["x-embedding-dim"] == str(len(expected))
+    assert np.array_equal(np.frombuffer(raw.content, "<f4"), expected)
+
+
+def test_embedding_binary_missing(client, db_session):
+    from app.models.call import Call
+
+    unembedded = db_session.query(Call).filter(Call.embedding.is_(None)).first()
+    if unembedded is not None:
+        resp = client.get(f"/api/v1/calls/{unembedded.call_id}/embedding")
+        assert resp.status_code == 409
+    assert client.get("/api/v1/calls/nope/embedding").status_code == 404
+
+
+def test_export_calls_ndjson_filters_and_columns(client):
+    resp = client.get(
+        "/api/v1/calls/export",
+        params={"agent_id": "A1", "columns": "call_id,agent_id,start_time"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert rows
+    assert all(set(r) == {"call_id", "agent_id", "start_time"} for r in rows)
+    assert all(r["agent_id"] == "A1" for r in rows)
+
+
+def test_export_calls_csv_with_embedding(client):
+    resp = client.get(
+        "/api/v1/calls/export",
+        params={"format": "csv", "columns": "call_id", "include_embedding": True},
+    )
+    assert resp.status_code == 200
+    rows = list(csv.reader(io.StringIO(resp.text)))
+    assert rows[0] == ["call_id", "embedding"]
+    assert any(len(json.loads(r[1])) == 384 for r in rows[1:] if r[1])
+
+
+def test_export_calls_parquet(client):
+    pq = pytest.importorskip("pyarrow.parquet")
+    resp = client.get(
+        "/api/v1/calls/export",
+        params={"format": "parquet", "include_embedding": True},
+    )
+    assert resp.status_code == 200
+    table = pq.read_table(io.BytesIO(resp.content))
+    assert "transcript" in table.column_names
+    emb_type = table.schema.field("embedding").type
+    assert str(emb_type.value_type) == "float"
+    assert any(v is not None and len(v) == 384 for v in table["embedding"].to_pylist())
+
+
+def test_export_calls_unknown_column(client):
+    resp = client.get("/api/v1/calls/export", params={"columns": "call_id,nope"})
+    assert resp.status_code == 400
+
+
+def test_transcript_lives_in_side_table(client, db_session):
+    from sqlalchemy import inspect
+
+    from app.models.call import Call, CallTranscript
+
+    assert "transcript" not in {c.name for c in Call.__table__.columns}
+
+    call = db_session.query(Call).first()
+    # Not loaded with the call; fetched on first access
+    assert "transcript_row" in inspect(call).unloaded
+    call.transcript = "**Customer:** updated text"
+    db_session.commit()
+
+    row = db_session.get(CallTranscript, call.call_id)
+    assert row.transcript == "**Customer:** updated text"
+    detail = client.get(f"/api/v1/calls/{call.call_id}").json()
+    assert detail["transcript"] == "**Customer:** updated text"
+    at = call.start_time.isoformat()
+    listed = client.get(
+        "/api/v1/calls", params={"from_date": at, "to_date": at, "limit": 200}
+    ).json()["items"]
+    assert {it["call_id"]: it["transcript"] for it in listed}[str(call.call_id)] == (
+        "**Customer:** updated text"
+    )
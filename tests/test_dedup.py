@@ -0,0 +1,185 @@
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.core.dedup import (
+    DUPLICATE_THRESHOLD,
+    band_hashes,
+    fingerprint,
+    flag_duplicates,
+    signature,
+    similarity,
+)
+from app.core.rollups import refresh_agent_rollups, touched_days
+from app.models.call import Call
+from tests.conftest import _unit_vec
+
+
+def _transcript(seed: int, words: int = 600) -> str:
+    r = random.Random(seed)
+    vocab = [f"w{i}" for i in range(2000)]
+    lines = []
+    for i in range(0, words, 15):
+        speaker = "Customer Service Agent" if i % 30 == 0 else "Customer"
+        lines.append(f"**{speaker}:** " + " ".join(r.choices(vocab, k=15)))
+    return "\n".join(lines)
+
+
+def _edit(text: str, every: int = 200) -> str:
+    # A re-delivered copy: a word changed here and there, different punctuation
+    words = text.split(" ")
+    for i in range(7, len(words), every):
+        words[i] = "changed"
+    return " ".join(words).replace("\n", ".\n")
+
+
+def _add_calls(db_session, agent_id: str, texts, start: datetime, seed: int):
+    ids = []
+    for i, text in enumerate(texts):
+        minhash, bands = fingerprint(text)
+        call = Call(
+            call_id=str(uuid.uuid4()),
+            agent_id=agent_id,
+            customer_id="C",
+            language="English",
+            start_time=start + timedelta(minutes=i),
+            duration_seconds=60 * (i + 1),
+            transcript=text,
+            # Near-identical embeddings, so the copies would be top neighbours
+            embedding=[x + 1e-4 * i for x in _unit_vec(seed)],
+            agent_talk_ratio=0.5,
+            customer_sentiment_score=0.1 * i,
+            minhash=minhash,
+            lsh_bands=bands,
+        )
+        db_session.add(call)
+        ids.append(call.call_id)
+    db_session.commit()
+    return ids
+
+
+def test_signatures_estimate_jaccard_and_share_bands():
+    text = _transcript(1)
+    near, other = _edit(text), _transcript(2)
+    a, b, c = signature(text), signature(near), signature(other)
+
+    assert similarity(a.tobytes(), a.tobytes()) == 1.0
+    assert similarity(a.tobytes(), b.tobytes()) >= DUPLICATE_THRESHOLD
+    assert similarity(a.tobytes(), c.tobytes()) < 0.2
+    assert set(band_hashes(a)) & set(band_hashes(b))
+    assert not set(band_hashes(a)) & set(band_hashes(c))
+    # Speaker labels, case and punctuation don't count
+    assert (
+        similarity(
+            signature("**Customer:** Hello, THERE my friend how are you").tobytes(),
+            signature("hello there my friend... how are you?").tobytes(),
+        )
+        == 1.0
+    )
+    assert fingerprint("  ** ") == (None, [])
+
+
+def test_flag_duplicates_clusters_under_the_earliest_call(db_session):
+    seed = random.randrange(1 << 30)
+    agent = f"DUP-{seed}"
+    now = datetime.now(timezone.utc) - timedelta(hours=2)
+    text = _transcript(seed)
+    ids = _add_calls(
+        db_session, agent, [text, _edit(text), _transcript(seed + 1)], now, seed
+    )
+    flag_duplicates(db_session, ids)
+    db_session.commit()
+
+    flags = dict(
+        db_session.query(Call.call_id, Call.duplicate_of).filter(Call.call_id.in_(ids))
+    )
+    assert flags == {ids[0]: None, ids[1]: ids[0], ids[2]: None}
+
+    # An earlier copy arriving later takes over the cluster
+    (early,) = _add_calls(db_session, agent, [_edit(text, 250)], now, seed)
+    db_session.query(Call).filter(Call.call_id == early).update(
+        {"start_time": now - timedelta(hours=1)}
+    )
+    db_session.commit()
+    changed = flag_duplicates(db_session, [early])
+    db_session.commit()
+    assert {ids[0], ids[1]} <= changed
+    flags = dict(
+        db_session.query(Call.call_id, Call.duplicate_of).filter(
+            Call.call_id.in_(ids + [early])
+        )
+    )
+    assert flags == {early: None, ids[0]: early, ids[1]: early, ids[2]: None}
+
+    # A transcript rewritten into something else leaves its cluster
+    db_session.query(Call).filter(Call.call_id == early).update(
+        dict(zip(("minhash", "lsh_bands"), fingerprint(_transcript(seed + 2)))),
+        synchronize_session=False,
+    )
+    db_session.commit()
+    flag_duplicates(db_session, [early])
+    db_session.commit()
+    flags = dict(
+        db_session.query(Call.call_id, Call.duplicate_of).filter(
+            Call.call_id.in_(ids + [early])
+        )
+    )
+    assert flags == {early: None, ids[0]: None, ids[1]: ids[0], ids[2]: None}
+
+
+def test_endpoints_can_leave_duplicates_out(client, db_session):
+    from app.core.embedding_index import EmbeddingIndex, set_index
+
+    seed = random.randrange(1 << 30)
+    agent = f"DUP-{seed}"
+    text = _transcript(seed)
+    ids = _add_calls(
+        db_session,
+        agent,
+        [text, _edit(text), _edit(text, 300), _transcript(seed + 1)],
+        datetime.now(timezone.utc) - timedelta(hours=3),
+        seed,
+    )
+    flag_duplicates(db_session, ids)
+    refresh_agent_rollups(db_session, touched_days(db_session, ids))
+    db_session.commit()
+
+    listed = client.get("/api/v1/calls", params={"agent_id": agent}).json()
+    assert listed["total"] == 4
+    listed = client.get(
+        "/api/v1/calls", params={"agent_id": agent, "exclude_duplicates": True}
+    ).json()
+    assert {c["call_id"] for c in listed["items"]} == {ids[0], ids[3]}
+
+    def leaderboard(**params):
+        items = client.get("/api/v1/analytics/agents", params=params).json()["items"]
+        return next(a for a in items if a["agent_id"] == agent)
+
+    assert leaderboard()["total_calls"] == 4
+    deduped = leaderboard(dedupe=True)
+    assert deduped["total_calls"] == 2
+    assert deduped["avg_duration_seconds"] == (60 + 240) / 2
+    series = client.get(
+        "/api/v1/analytics/agents/timeseries", params={"agent_id": agent, "dedupe": 1}
+    ).json()["items"]
+    assert sum(p["total_calls"] for p in series) == 2
+
+    # From a member: neither its root nor the other copies come back
+    def recommended(**params):
+        resp = client.get(f"/api/v1/calls/{ids[1]}/recommendations", params=params)
+        return {r["call_id"] for r in resp.json()["recommendations"]}
+
+    assert {ids[0], ids[2]} <= recommended()
+    assert not {ids[0], ids[2]} & recommended(exclude_duplicates=True)
+    set_index(EmbeddingIndex.from_db(db_session))
+    try:
+        assert {ids[0], ids[2]} <= recommended()
+        assert not {ids[0], ids[2]} & recommended(exclude_duplicates=True)
+        batch = client.post(
+            "/api/v1/recommendations:batch",
+            json={"call_ids": [ids[1]], "k": 3, "exclude_duplicates": True},
+        ).json()
+    finally:
+        set_index(None)
+    recs = {r["call_id"] for r in batch["items"][0]["recommendations"]}
+    assert len(recs) == 3 and not {ids[0], ids[2]} & recs
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from app.core.inference import EMBEDDING_DIM, OnnxBackend, load_backend
+
+PAD = 999
+
+
+class StubTokenizer:
+    """
+    One token per word, id = word length, right-padded with PAD to the
+    longest text in the batch (like a Hugging Face tokenizer with padding=True).
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        self.batches.append(list(texts))
+        tokens = [[len(w) for w in t.split()][:max_length] or [1] for t in texts]
+        width = max(len(t) for t in tokens)
+        ids = np.full((len(texts), width), PAD, dtype=np.int32)
+        mask = np.zeros((len(texts), width), dtype=np.int32)
+        for row, t in enumerate(tokens):
+            ids[row, : len(t)] = t
+            mask[row, : len(t)] = 1
+        return {"input_ids": ids, "attention_mask": mask}
+
+
+class EmbedSession:
+    # Token vector [id, 1, 0, ...]; padding ids make huge values if not masked
+    def run(self, outputs, feed):
+        ids = feed["input_ids"].astype(np.float32)
+        hidden = np.zeros(ids.shape + (EMBEDDING_DIM,), dtype=np.float32)
+        hidden[..., 0] = ids
+        hidden[..., 1] = 1.0
+        return [hidden]
+
+
+class SentimentSession:
+    # Logits [0, words - 2]: short texts lean to label 0, long ones to label 1
+    def run(self, outputs, feed):
+        words = feed["attention_mask"].sum(axis=1).astype(np.float32)
+        return [np.stack([np.zeros_like(words), words - 2.0], axis=1)]
+
+
+@pytest.fixture
+def backend():
+    b = OnnxBackend.__new__(OnnxBackend)
+    b.name = "onnx"
+    b.embed_session, b.embed_tokenizer = EmbedSession(), StubTokenizer()
+    b.sent_session, b.sent_tokenizer = SentimentSession(), StubTokenizer()
+    b.id2label = {0: "NEGATIVE", 1: "POSITIVE"}
+    return b
+
+
+TEXTS = [
+    "a much longer text with quite a few words in it",
+    "hi",
+    "three word text",
+    "",
+    "exactly four words here",
+]
+
+
+def _expected_embedding(text):
+    lengths = [len(w) for w in text.split()] or [1]
+    vec = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    vec[0], vec[1] = np.mean(lengths), 1.0
+    return vec / np.linalg.norm(vec)
+
+
+def test_embed_keeps_input_order_and_masks_padding(backend):
+    out = backend.embed(TEXTS, batch_size=2)
+
+    assert out.shape == (len(TEXTS), EMBEDDING_DIM)
+    assert out.dtype == np.float32
+    for row, text in zip(out, TEXTS):
+        np.testing.assert_allclose(row, _expected_embedding(text), rtol=1e-6)
+    # Batched by length, shortest first, each padded only to its own longest
+    assert backend.embed_tokenizer.batches == [
+        ["", "hi"],
+        ["three word text", "exactly four words here"],
+        [TEXTS[0]],
+    ]
+
+
+def test_classify_softmax_argmax_and_labels(backend):
+    results = backend.classify(TEXTS, batch_size=3)
+
+    assert len(results) == len(TEXTS)
+    for res, text in zip(results, TEXTS):
+        margin = max(len(text.split()), 1) - 2.0
+        p_positive = 1.0 / (1.0 + np.exp(-margin))
+        if margin > 0:
+            assert res == {"label": "POSITIVE", "score": pytest.approx(p_positive)}
+        else:
+            assert res == {"label": "NEGATIVE", "score": pytest.approx(1 - p_positive)}
+    assert [len(b) for b in backend.sent_tokenizer.batches] == [3, 2]
+
+
+def test_empty_input(backend):
+    out = backend.embed([])
+    assert out.shape == (0, EMBEDDING_DIM)
+    assert backend.classify([]) == []
+    assert backend.embed_tokenizer.batches == backend.sent_tokenizer.batches == []
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="bogus"):
+        load_backend("bogus")
+
+
+def test_cached_export_is_reused(tmp_path, monkeypatch):
+    import app.core.inference as inference
+
+    def no_export(*args):
+        raise AssertionError("exported again")
+
+    monkeypatch.setattr(inference, "_export_onnx", no_export)
+    model_dir = tmp_path / "org__model"
+    model_dir.mkdir()
+    (model_dir / "model.onnx").write_bytes(b"")
+    path = inference.ensure_onnx_model("org/model", "sentiment", False, str(tmp_path))
+    assert path == str(model_dir / "model.onnx")
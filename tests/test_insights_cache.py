@@ -0,0 +1,20 @@
+from app.core.insights_cache import lookup_insights, store_insights, transcript_hash
+
+
+def test_transcript_hash_is_stable():
+    assert transcript_hash("hello") == transcript_hash("hello")
+    assert transcript_hash(None) == transcript_hash("")
+    assert transcript_hash("hello") != transcript_hash("hello!")
+
+
+def test_insights_cache_keyed_by_hash_and_model(db_session):
+    h = transcript_hash("**Customer:** where is my order?")
+    store_insights(db_session, "model-a", {h: ([0.1, 0.2], [[0, 10, 0.5]])})
+    # A second store of the same key is ignored, not an error
+    store_insights(db_session, "model-a", {h: ([9.9, 9.9], None)})
+    db_session.commit()
+
+    assert lookup_insights(db_session, [h], "model-a") == {
+        h: ([0.1, 0.2], [[0, 10, 0.5]])
+    }
+    assert lookup_insights(db_session, [h], "model-b") == {}
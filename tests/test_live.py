@@ -0,0 +1,273 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+import numpy as np
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.core import live
+from app.core.insights_cache import INSIGHTS_MODEL, transcript_hash
+from app.core.sentiment import split_windows
+from app.core.talk_ratio import TalkRatio, compute_agent_talk_ratio
+from app.models.call import Call
+from scripts.ai_insights_populator import score_sentiment_windows, stale_call_ids
+
+LINES = [
+    "**Customer Service Agent:** Thank you for calling, how can I help today?",
+    "**Customer:** My order arrived broken and I want a refund right away.",
+    "**Customer Service Agent:** I am sorry to hear that, let me check it.",
+    "**Customer:** Thanks, that is great service, I appreciate it.",
+]
+
+
+def _transcript(rng: random.Random, lines: int) -> str:
+    return "\n".join(rng.choice(LINES) for _ in range(lines))
+
+
+def _chunks(rng: random.Random, text: str, longest: int):
+    pos = 0
+    while pos < len(text):
+        n = rng.randint(1, longest)
+        yield text[pos : pos + n]
+        pos += n
+
+
+class FakeModels:
+    name = "fake"
+
+    def __init__(self):
+        self.batches = []
+
+    def classify(self, texts, batch_size=64):
+        self.batches.append(len(texts))
+        return [
+            {"label": "NEGATIVE" if "refund" in t else "POSITIVE", "score": 0.75}
+            for t in texts
+        ]
+
+    def embed(self, texts, batch_size=32):
+        return np.array(
+            [[len(t) % 7 + 1.0, 1.0] + [0.0] * 382 for t in texts], dtype=np.float32
+        )
+
+
+TOKEN = "ingest-secret"
+
+
+@pytest.fixture(autouse=True)
+def ingest_token(monkeypatch):
+    monkeypatch.setattr(live, "INGEST_TOKEN", TOKEN)
+
+
+def _ingest(call_id: str) -> str:
+    return f"/ws/ingest/{call_id}?token={TOKEN}"
+
+
+@pytest.fixture
+def models(monkeypatch):
+    fake = FakeModels()
+    monkeypatch.setattr(live, "_models", fake)
+    return fake
+
+
+def test_talk_ratio_and_windows_match_the_batch_computation():
+    rng = random.Random(11)
+    for _ in range(20):
+        text = _transcript(rng, rng.randint(0, 40)) + rng.choice(["", "\n", " ok"])
+        talk = TalkRatio()
+        call = live.LiveCall(str(uuid.uuid4()), "A", "C", "English")
+        spans = []
+        seen = ""
+        for chunk in _chunks(rng, text, 300):
+            seen += chunk
+            talk.add(chunk)
+            call.append(chunk)
+            assert talk.ratio == compute_agent_talk_ratio(seen)
+            spans += [span for span, _ in call.ready_windows()]
+        spans += [span for span, _ in call.ready_windows(final=True)]
+        assert spans == split_windows(text)
+
+
+@pytest.mark.timeout(10)
+def test_batch_worker_survives_cancelled_awaiters_and_model_errors():
+    gate = threading.Event()
+    calls = []
+
+    def model(texts):
+        gate.wait(5)
+        if "boom" in texts:
+            raise RuntimeError("model failed")
+        calls.append(list(texts))
+        return [t.upper() for t in texts]
+
+    async def scenario():
+        worker = live.BatchWorker("test", model, max_batch=1, max_wait=0)
+        first = asyncio.ensure_future(worker.run(["a"]))
+        await asyncio.sleep(0.05)
+        # Queued behind the running batch; the first of them is given up on
+        gone = asyncio.ensure_future(worker.run(["b"]))
+        kept = asyncio.ensure_future(worker.run(["c"]))
+        await asyncio.sleep(0.01)
+        gone.cancel()
+        await asyncio.sleep(0.01)
+        gate.set()
+        assert await first == ["A"]
+        assert await kept == ["C"]
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        with pytest.raises(RuntimeError):
+            await worker.run(["boom"])
+        assert await worker.run(["d"]) == ["D"]
+
+    asyncio.run(scenario())
+    assert ["b"] not in calls
+
+
+@pytest.mark.timeout(20)
+def test_ingested_call_streams_live_and_is_stored(client, db_session, models):
+    text = _transcript(random.Random(3), 30)
+    call_id = str(uuid.uuid4())
+    agent = f"LIVE-{uuid.uuid4().hex[:8]}"
+    chunks = list(_chunks(random.Random(4), text, 200))
+
+    with client.websocket_connect(_ingest(call_id)) as ingest:
+        ingest.send_json({"type": "start", "agent_id": agent, "customer_id": "C9"})
+        segments = []
+        for chunk in chunks[:10]:
+            ingest.send_json({"type": "chunk", "text": chunk})
+            progress = ingest.receive_json()
+            segments += progress["segments"]
+        assert segments
+        assert progress["agent_talk_ratio"] == round(
+            compute_agent_talk_ratio("".join(chunks[:10])), 4
+        )
+
+        with client.websocket_connect(f"/ws/sentiment/{call_id}") as viewer:
+            # Segments scored so far, then the rest as they are scored
+            for chunk in chunks[10:]:
+                ingest.send_json({"type": "chunk", "text": chunk})
+                ingest.receive_json()
+            ingest.send_json({"type": "end"})
+            stored = ingest.receive_json()
+
+            frames = []
+            with pytest.raises(WebSocketDisconnect):
+                while True:
+                    frames.append(json.loads(viewer.receive_text()))
+
+    timeline = score_sentiment_windows(models.classify, [text])[0]
+    assert stored["type"] == "stored"
+    assert stored["segments"] == len(timeline)
+    assert [f["span"] + [f["sentiment"]] for f in frames] == timeline
+    assert all(f["live"] for f in frames)
+
+    db_session.expire_all()
+    call = db_session.query(Call).filter(Call.call_id == call_id).one()
+    assert call.agent_id == agent
+    assert call.transcript == text
+    assert call.sentiment_timeline == timeline
+    assert call.agent_talk_ratio == compute_agent_talk_ratio(text)
+    assert call.embedding[:2] == [len(text) % 7 + 1.0, 1.0]
+    assert call.content_hash == call.insights_hash == transcript_hash(text)
+    assert call.insights_model == INSIGHTS_MODEL
+    assert call.lsh_bands
+    # Nothing left for the populator's insights stage
+    assert call_id not in stale_call_ids(db_session)
+    assert live.get_live(call_id) is None
+
+
+@pytest.mark.timeout(20)
+def test_ingest_rejects_malformed_and_concurrent_streams(client, db_session, models):
+    call_id = str(uuid.uuid4())
+    with client.websocket_connect(_ingest(call_id)) as ws:
+        ws.send_json({"type": "chunk", "text": "hello"})
+        assert ws.receive_json()["type"] == "error"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+        assert closed.value.code == 1008
+
+    with client.websocket_connect(_ingest(call_id)) as first:
+        first.send_json({"type": "start", "agent_id": "A1", "customer_id": "C"})
+        with client.websocket_connect(_ingest(call_id)) as second:
+            second.send_json({"type": "start", "agent_id": "A1", "customer_id": "C"})
+            assert second.receive_json()["type"] == "error"
+            with pytest.raises(WebSocketDisconnect) as closed:
+                second.receive_text()
+            assert closed.value.code == 4409
+        first.send_json({"type": "end"})
+        assert first.receive_json()["type"] == "discarded"
+
+    assert db_session.query(Call).filter(Call.call_id == call_id).count() == 0
+    stats = client.get("/healthz/ws").json()["live"]
+    assert stats["active"] == 0
+    assert stats["discarded"] >= 1
+
+
+@pytest.mark.timeout(20)
+def test_call_is_stored_when_the_client_goes_away(client, db_session, models):
+    call_id = str(uuid.uuid4())
+    with client.websocket_connect(_ingest(call_id)) as ws:
+        ws.send_json({"type": "start", "agent_id": "A1", "customer_id": "C"})
+        ws.send_json({"type": "chunk", "text": LINES[1]})
+        ws.receive_json()
+        # Leaving the block would cancel the handler (a server doesn't)
+        ws.close()
+        while live.get_live(call_id) is not None:
+            time.sleep(0.05)
+
+    db_session.expire_all()
+    call = db_session.query(Call).filter(Call.call_id == call_id).one()
+    assert call.transcript == LINES[1]
+    assert call.customer_sentiment_score == -0.75
+
+
+def _rejected(ws, code: int) -> None:
+    assert ws.receive_json()["type"] == "error"
+    with pytest.raises(WebSocketDisconnect) as closed:
+        ws.receive_text()
+    assert closed.value.code == code
+
+
+@pytest.mark.timeout(20)
+def test_ingest_needs_a_token_and_replace_to_overwrite(client, db_session, models):
+    existing = db_session.query(Call).filter(Call.agent_id == "A3").first()
+    call_id = str(existing.call_id)
+    start = {"type": "start", "agent_id": "A3", "customer_id": "C"}
+
+    with client.websocket_connect(f"/ws/ingest/{call_id}?token=wrong") as ws:
+        _rejected(ws, 4401)
+    with client.websocket_connect(
+        f"/ws/ingest/{call_id}", headers={"Authorization": f"Bearer {TOKEN}"}
+    ) as ws:
+        ws.send_json(start)
+        _rejected(ws, 4409)
+    assert live.get_live(call_id) is None
+
+    with client.websocket_connect(_ingest(call_id)) as ws:
+        ws.send_json({**start, "replace": True})
+        ws.send_json({"type": "chunk", "text": LINES[3]})
+        ws.receive_json()
+        ws.send_json({"type": "end"})
+        assert ws.receive_json()["type"] == "stored"
+    db_session.expire_all()
+    assert existing.transcript == LINES[3]
+
+
+@pytest.mark.timeout(20)
+def test_failure_mid_stream_closes_with_an_error(client, db_session, models):
+    def broken(texts, batch_size=64):
+        raise RuntimeError("model down")
+
+    models.classify = broken
+    call_id = str(uuid.uuid4())
+    with client.websocket_connect(_ingest(call_id)) as ws:
+        ws.send_json({"type": "start", "agent_id": "A1", "customer_id": "C"})
+        # Long enough to complete a window, so the model is called
+        ws.send_json({"type": "chunk", "text": "\n".join(LINES * 12)})
+        _rejected(ws, 1011)
+    assert live.get_live(call_id) is None
+    assert db_session.query(Call).filter(Call.call_id == call_id).count() == 0
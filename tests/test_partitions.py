@@ -0,0 +1,77 @@
+import uuid
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from app.core.partitions import (
+    drop_partitions_before,
+    ensure_partitions,
+    list_partitions,
+    month_start,
+    partition_name,
+)
+from app.models.call import Call, CallTranscript
+
+
+def _plan(session, sql: str) -> str:
+    return "\n".join(r[0] for r in session.execute(text(f"EXPLAIN {sql}")))
+
+
+def test_range_queries_prune_to_their_months(db_session):
+    this_month = month_start(datetime.now(timezone.utc).date())
+    names = [name for name, _, _ in list_partitions(db_session, "calls")]
+    assert partition_name("calls", this_month) in names
+    assert len(names) > 1
+
+    plan = _plan(
+        db_session,
+        f"SELECT count(*) FROM calls WHERE start_time >= '{this_month} 00:00:00+00'"
+        f" AND start_time < '{this_month} 00:00:00+00'::timestamptz"
+        " + interval '1 month'",
+    )
+    scanned = [n for n in names if n in plan]
+    assert scanned == [partition_name("calls", this_month)]
+
+
+def test_moved_calls_keep_their_transcript_and_old_months_drop(db_session):
+    created = ensure_partitions(db_session, [date(2001, 1, 1), date(2001, 2, 1)])
+    assert "calls_p2001_01" in created and "call_transcripts_p2001_02" in created
+    assert ensure_partitions(db_session, [date(2001, 1, 9)]) == []
+    db_session.commit()
+
+    call_id = str(uuid.uuid4())
+    db_session.add(
+        Call(
+            call_id=call_id,
+            agent_id="A9",
+            customer_id="C9",
+            start_time=datetime(2001, 1, 15, tzinfo=timezone.utc),
+            duration_seconds=60,
+            transcript="old call",
+        )
+    )
+    db_session.commit()
+
+    # A new start time moves the call, and its transcript, to another month
+    call = db_session.get(Call, call_id)
+    call.start_time = datetime(2001, 2, 3, tzinfo=timezone.utc)
+    db_session.commit()
+    where = db_session.execute(
+        text(
+            "SELECT tableoid::regclass::text FROM call_transcripts WHERE call_id = :c"
+        ),
+        {"c": call_id},
+    ).scalar()
+    assert where == "call_transcripts_p2001_02"
+
+    dropped = drop_partitions_before(db_session, date(2001, 3, 1))
+    db_session.commit()
+    assert sorted(dropped) == [
+        "call_transcripts_p2001_01",
+        "call_transcripts_p2001_02",
+        "calls_p2001_01",
+        "calls_p2001_02",
+    ]
+    db_session.expire_all()
+    assert db_session.get(Call, call_id) is None
+    assert db_session.get(CallTranscript, call_id) is None
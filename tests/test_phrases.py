@@ -0,0 +1,90 @@
+import random
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from app.core.insights_cache import transcript_hash
+from app.core.phrases import phrases, update_phrase_sketches
+from app.core.sketches import CountMinSketch
+from app.models.call import Call
+
+
+def test_phrases_skip_stopword_edges_and_sentence_breaks():
+    counts = phrases(
+        "**Customer:** I want a refund. Refund now!\n"
+        "**Customer Service Agent:** I can escalate the refund request"
+    )
+    assert counts["refund"] == 3
+    assert counts["escalate"] == 1
+    assert counts["refund request"] == 1
+    assert counts["escalate the refund"] == 1
+    # Stopword at an edge, across a sentence break, or a speaker label
+    assert "the refund" not in counts
+    assert "refund refund" not in counts
+    assert "customer" not in counts
+
+
+def test_count_min_sketch_never_undercounts_and_merges():
+    rng = random.Random(7)
+    stream = Counter(f"p{int(rng.paretovariate(1.2))}" for _ in range(20000))
+    halves = [CountMinSketch(width=512), CountMinSketch(width=512)]
+    for i, (item, count) in enumerate(stream.items()):
+        halves[i % 2].add({item: count})
+
+    sketch = CountMinSketch.from_bytes(CountMinSketch.merge(halves).to_bytes())
+    assert sketch.total == 20000
+    items = list(stream)
+    estimates = sketch.estimate(items)
+    assert all(e >= stream[i] for i, e in zip(items, estimates))
+    over = sum(e - stream[i] > sketch.error_bound for i, e in zip(items, estimates))
+    assert over <= 0.05 * len(items)
+    assert sketch.estimate(["never-seen"])[0] <= sketch.error_bound
+
+
+def _add_calls(db_session, agent_id, transcripts):
+    now = datetime.now(timezone.utc) - timedelta(hours=1)
+    for i, text in enumerate(transcripts):
+        db_session.add(
+            Call(
+                call_id=str(uuid.uuid4()),
+                agent_id=agent_id,
+                customer_id="C",
+                language="English",
+                start_time=now + timedelta(minutes=i),
+                duration_seconds=60,
+                transcript=text,
+                content_hash=transcript_hash(text),
+            )
+        )
+    db_session.commit()
+
+
+def test_agent_phrases_are_counted_incrementally(client, db_session):
+    agent = f"PH-{uuid.uuid4().hex[:8]}"
+    refund = "**Customer:** A refund for my order, please. Cancel my subscription."
+    escalate = "**Customer:** Please escalate this. A refund, please."
+    _add_calls(db_session, agent, [refund, refund, escalate])
+    update_phrase_sketches(db_session)
+
+    url = f"/api/v1/analytics/agents/{agent}/phrases"
+    data = client.get(url, params={"k": 3}).json()
+    assert data["calls_seen"] == 3
+    assert data["items"][0] == {"phrase": "refund", "count": 3}
+    assert len(data["items"]) == 3
+
+    # Only the new call is counted on the next run
+    _add_calls(db_session, agent, [escalate])
+    assert update_phrase_sketches(db_session)["calls"] == 1
+    assert update_phrase_sketches(db_session)["calls"] == 0
+    data = client.get(
+        url,
+        params={"words": 3, "phrase": ["ESCALATE!", "refund", "chargeback"]},
+    ).json()
+    assert data["calls_seen"] == 4
+    assert {"phrase": "cancel my subscription", "count": 2} in data["items"]
+    assert all(len(p["phrase"].split()) == 3 for p in data["items"])
+    lookups = {p["phrase"]: p["count"] for p in data["lookups"]}
+    assert lookups["escalate"] == 2 and lookups["refund"] == 4
+    assert lookups["chargeback"] <= data["error_bound"]
+
+    assert client.get("/api/v1/analytics/agents/nobody/phrases").status_code == 404
@@ -0,0 +1,66 @@
+import json
+import time
+
+from sqlalchemy import text
+
+from app.core import profiling
+
+
+def _enable(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL", 0.001)
+
+
+def test_profile_samples_python_frames_and_sql(db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL", 0.001)
+
+    def slow_python():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+
+    with profiling.profiling("unit") as profile:
+        with profile.watching():
+            slow_python()
+            db_session.execute(text("SELECT pg_sleep(0.05)"))
+
+    doc = profile.speedscope()
+    names = [f["name"] for f in doc["shared"]["frames"]]
+    assert any(n.endswith("slow_python") for n in names)
+    assert "sql: SELECT pg_sleep(0.05)" in names
+    (stmt,) = doc["sql"]["by_statement"]
+    assert stmt["count"] == 1 and stmt["total_ms"] >= 50
+
+    path = profile.write("collapsed", str(tmp_path))
+    lines = open(path).read().splitlines()
+    assert any("slow_python" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert json.load(open(path.replace(".collapsed.txt", ".sql.json")))["count"] == 1
+
+
+def test_request_is_profiled_only_with_the_token(client, tmp_path, monkeypatch):
+    _enable(monkeypatch, tmp_path)
+
+    r = client.get("/api/v1/calls?limit=5", headers={"X-Profile": "s3cret"})
+    assert r.status_code == 200
+    with open(r.headers["X-Profile"]) as f:
+        doc = json.load(f)
+    assert doc["name"] == "GET /api/v1/calls"
+    assert doc["profiles"][0]["type"] == "sampled"
+    assert doc["sql"]["count"] >= 1
+
+    r = client.get("/api/v1/calls?limit=5&profile=s3cret")
+    assert r.headers["X-Profile"].endswith(".speedscope.json")
+
+    for headers in ({}, {"X-Profile": "wrong"}):
+        r = client.get("/api/v1/calls?limit=5", headers=headers)
+        assert r.status_code == 200 and "X-Profile" not in r.headers
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_profiling_is_off_without_a_configured_token(client, tmp_path, monkeypatch):
+    _enable(monkeypatch, tmp_path)
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    r = client.get("/api/v1/calls?limit=1&profile=")
+    assert r.status_code == 200 and "X-Profile" not in r.headers
@@ -0,0 +1,434 @@
+"""
+Query plans of what the endpoints and scripts run, on a realistically sized
+database (PLAN_CALLS calls over twelve monthly partitions, seeded in bulk
+into transcript_ai_insights_plans).
+
+Every statement a scenario issues is captured just before it runs and
+EXPLAIN (ANALYZE, BUFFERS)-ed inside a savepoint that is rolled back, so
+UPDATEs and DELETEs are measured without their effects. Each scenario then
+checks that:
+
+- no calls / call_transcripts partition is read with a sequential scan
+  (unless the scenario reads every row by design)
+- the indexes it relies on show up in the plans
+- no single statement touches more than its budget of shared buffers
+"""
+
+import hashlib
+import re
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.core.dedup import flag_duplicates
+from app.core.partitions import add_months, ensure_partitions, month_start
+from app.core.phrases import update_phrase_sketches
+from app.core.rollups import refresh_agent_rollups, touched_days
+from app.core.topics import _assign_pending, transcripts_by_id
+from app.db import get_db, get_read_db
+from app.models.call import Base, Call, CallTranscript
+from main import app
+from scripts.ai_insights_populator import (
+    EMBEDDING_BATCH_SIZE,
+    INSIGHTS_MODEL,
+    fingerprint_missing,
+    stale_call_ids,
+)
+from tests.conftest import TEST_DB_URL
+
+PLAN_DB = "transcript_ai_insights_plans"
+PLAN_CALLS = 60_000
+AGENTS = 40
+# Small vectors keep the seed fast; real ones are TOASTed, so the heap rows
+# are about the same width either way
+DIM = 8
+
+PARTITION_RE = re.compile(r"^(calls|call_transcripts)_p\d{4}_\d{2}$")
+EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+# Seeded shape (i = 1 .. PLAN_CALLS, oldest first): 1% without an
+# embedding, 1% with a stale insights hash, 0.5% not fingerprinted, 2%
+# near-duplicates, 1% with phrases not counted yet. (`0 * i` makes Postgres
+# draw a new random vector per row instead of one for all.)
+SEED_CALLS = """
+INSERT INTO calls (call_id, agent_id, customer_id, language, start_time,
+    duration_seconds, embedding, agent_talk_ratio, customer_sentiment_score,
+    content_hash, insights_hash, insights_model, topic_cluster, minhash,
+    lsh_bands, duplicate_of, phrases_hash)
+SELECT md5(i::text), 'A' || lpad((i % :agents)::text, 2, '0'), 'C' || (i % 5000),
+    CASE WHEN i % 10 = 0 THEN 'Spanish' ELSE 'English' END,
+    :start + (i::float / :n) * (:end - :start),
+    60 + (i * 7919) % 1800,
+    CASE WHEN i % 100 <> 0 THEN
+        ARRAY(SELECT random() + 0 * i FROM generate_series(1, :dim)) END,
+    (i % 97) / 97.0, ((i * 31) % 201) / 100.0 - 1,
+    md5('t' || i),
+    CASE WHEN i % 100 = 1 THEN md5('old' || i) ELSE md5('t' || i) END,
+    :model, i % 12,
+    decode(repeat(md5('m' || i), 32), 'hex'),
+    CASE WHEN i % 200 <> 2 THEN
+        ARRAY(SELECT hashtextextended(i || ':' || b, 0)
+              FROM generate_series(1, 16) b) END,
+    CASE WHEN i % 50 = 3 THEN md5((i - 1)::text) END,
+    CASE WHEN i % 100 <> 4 THEN md5('t' || i) END
+FROM generate_series(1, :n) i
+"""
+SEED_TRANSCRIPTS = """
+INSERT INTO call_transcripts (call_id, start_time, transcript)
+SELECT call_id, start_time,
+    '**Customer:** I want a refund for order ' || call_id || '. '
+    || repeat('**Customer Service Agent:** Let me check the policy. ', 8)
+FROM calls
+"""
+SEED_ROLLUPS = """
+INSERT INTO agent_daily_rollups (agent_id, day, deduplicated, call_count,
+    sentiment_sum, sentiment_count, talk_ratio_sum, talk_ratio_count,
+    duration_sum)
+SELECT agent_id, start_time::date, d, count(*), sum(customer_sentiment_score),
+    count(*), sum(agent_talk_ratio), count(*), sum(duration_seconds)
+FROM calls, (VALUES (false), (true)) v(d)
+WHERE NOT d OR duplicate_of IS NULL
+GROUP BY 1, 2, 3
+"""
+
+
+def _call_id(i: int) -> str:
+    return hashlib.md5(str(i).encode()).hexdigest()
+
+
+def _seed(engine) -> None:
+    Base.metadata.create_all(engine)
+    # Bulk-loaded first, indexed after: one build per index instead of
+    # PLAN_CALLS insertions into each
+    indexes = [i for t in (Call.__table__, CallTranscript.__table__) for i in t.indexes]
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=365)
+    with Session(engine) as session:
+        for index in indexes:
+            index.drop(session.connection())
+        first = month_start(start.date())
+        ensure_partitions(session, [add_months(first, m) for m in range(14)])
+        session.execute(
+            text(SEED_CALLS),
+            dict(
+                n=PLAN_CALLS,
+                agents=AGENTS,
+                dim=DIM,
+                start=start,
+                end=end,
+                model=INSIGHTS_MODEL,
+            ),
+        )
+        session.execute(text(SEED_TRANSCRIPTS))
+        session.execute(text(SEED_ROLLUPS))
+        for index in indexes:
+            index.create(session.connection())
+        session.commit()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+
+
+@pytest.fixture(scope="module")
+def plan_engine():
+    admin = create_engine(
+        make_url(TEST_DB_URL).set(database="postgres"),
+        poolclass=NullPool,
+        isolation_level="AUTOCOMMIT",
+    )
+    try:
+        with admin.connect() as conn:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {PLAN_DB} WITH (FORCE)"))
+            conn.execute(text(f"CREATE DATABASE {PLAN_DB}"))
+    except Exception as exc:
+        pytest.skip(f"can't create {PLAN_DB}: {exc}")
+
+    engine = create_engine(
+        make_url(TEST_DB_URL).set(database=PLAN_DB), poolclass=NullPool
+    )
+    try:
+        _seed(engine)
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.connect() as conn:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {PLAN_DB} WITH (FORCE)"))
+        admin.dispose()
+
+
+@pytest.fixture(scope="module")
+def parent_index(plan_engine):
+    # Plans name each partition's own index; map them back to the
+    # partitioned index they belong to
+    with plan_engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                """
+                SELECT child.relname, parent.relname
+                FROM pg_inherits i
+                JOIN pg_class child ON child.oid = i.inhrelid
+                JOIN pg_class parent ON parent.oid = i.inhparent
+                WHERE child.relkind = 'i'
+                """
+            )
+        )
+        return dict(rows.all())
+
+
+class _Plans:
+    """
+    Collects EXPLAIN (ANALYZE, BUFFERS) of every distinct statement run on a
+    connection, taken just before the statement itself runs.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.plans: dict = {}
+
+    def __enter__(self):
+        event.listen(self.conn, "before_cursor_execute", self._explain)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.conn, "before_cursor_execute", self._explain)
+
+    def _explain(self, conn, cursor, statement, parameters, context, executemany):
+        if statement in self.plans or not EXPLAINABLE_RE.match(statement):
+            return
+        if executemany:
+            # Per-row statements: the first row stands for the others
+            parameters = parameters[0]
+        with cursor.connection.cursor() as cur:
+            cur.execute("SAVEPOINT plan_check")
+            cur.execute(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters
+            )
+            self.plans[statement] = cur.fetchone()[0][0]["Plan"]
+            cur.execute("ROLLBACK TO SAVEPOINT plan_check")
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+def _buffers(node: dict) -> int:
+    return node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0)
+
+
+@pytest.fixture
+def plans(plan_engine):
+    """
+    (session, client, capture) on one connection whose transaction is rolled
+    back at the end; commits inside the code under test become savepoints.
+    """
+    conn = plan_engine.connect()
+    outer = conn.begin()
+    session = Session(
+        bind=conn, autoflush=False, join_transaction_mode="create_savepoint"
+    )
+
+    def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    try:
+        yield session, TestClient(app), _Plans(conn)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_read_db, None)
+        session.close()
+        outer.rollback()
+        conn.close()
+
+
+AGENT = "A07"
+CALL = _call_id(20_007)
+RECENT = (date.today() - timedelta(days=7)).isoformat()
+
+
+def _list_by_agent(session, client, capture):
+    with capture:
+        resp = client.get("/api/v1/calls", params={"agent_id": AGENT, "offset": 100})
+    assert resp.json()["total"] == PLAN_CALLS // AGENTS
+
+
+def _list_by_agent_and_sentiment(session, client, capture):
+    params = {"agent_id": AGENT, "min_sentiment": 0.5, "exclude_duplicates": True}
+    with capture:
+        assert client.get("/api/v1/calls", params=params).json()["items"]
+
+
+def _list_recent(session, client, capture):
+    with capture:
+        resp = client.get("/api/v1/calls", params={"from_date": RECENT})
+    assert resp.json()["items"]
+
+
+def _call_detail(session, client, capture):
+    with capture:
+        assert client.get(f"/api/v1/calls/{CALL}").status_code == 200
+        assert client.get(f"/api/v1/calls/{CALL}/embedding").status_code == 200
+
+
+def _filtered_recommendations(session, client, capture):
+    url = f"/api/v1/calls/{CALL}/recommendations"
+    with capture:
+        assert client.get(url, params={"agent_id": ["A01", "A02"]}).status_code == 200
+        assert client.get(url, params={"from_date": RECENT}).status_code == 200
+
+
+def _recommendations(session, client, capture):
+    body = {"call_ids": [CALL, _call_id(7)], "k": 3}
+    with capture:
+        assert client.get(f"/api/v1/calls/{CALL}/recommendations").status_code == 200
+        resp = client.post("/api/v1/recommendations:batch", json=body)
+    assert resp.status_code == 200
+
+
+def _export_by_agent(session, client, capture):
+    with capture:
+        resp = client.get("/api/v1/calls/export", params={"agent_id": AGENT})
+    assert len(resp.text.splitlines()) == PLAN_CALLS // AGENTS
+
+
+def _agent_analytics(session, client, capture):
+    series = {"agent_id": AGENT, "bucket": "week", "dedupe": True}
+    with capture:
+        leaderboard = client.get(
+            "/api/v1/analytics/agents", params={"from_date": RECENT}
+        )
+        assert client.get("/api/v1/analytics/agents/timeseries", params=series).json()
+    assert len(leaderboard.json()["items"]) == AGENTS
+
+
+def _populator_stale_calls(session, client, capture):
+    with capture:
+        ids = stale_call_ids(session)
+        # One batch, as the populator loads them
+        batch = ids[:EMBEDDING_BATCH_SIZE]
+        session.query(Call).filter(Call.call_id.in_(batch)).all()
+        texts = transcripts_by_id(session, batch)
+    # Without an embedding, or with a stale insights hash
+    assert len(ids) == PLAN_CALLS // 50
+    assert all(texts.values())
+
+
+def _populator_fingerprints(session, client, capture):
+    with capture:
+        fingerprint_missing(session)
+    assert not session.query(Call).filter(Call.lsh_bands.is_(None)).count()
+
+
+def _loader_duplicates(session, client, capture):
+    # What the loader runs for one file's worth of calls
+    ids = [_call_id(i) for i in range(PLAN_CALLS - 20, PLAN_CALLS)]
+    with capture:
+        changed = flag_duplicates(session, ids)
+        refresh_agent_rollups(session, touched_days(session, list(changed)))
+    assert changed >= set(ids)
+
+
+def _populator_phrases(session, client, capture):
+    with capture:
+        assert update_phrase_sketches(session)["calls"] == PLAN_CALLS // 100
+
+
+def _populator_topics(session, client, capture):
+    # A week of re-embedded calls waiting for their topic
+    session.execute(
+        update(Call).where(Call.start_time >= RECENT).values(topic_cluster=None)
+    )
+    centroids = np.eye(12, DIM, dtype=np.float32)
+    with capture:
+        assert _assign_pending(session, centroids, np.ones(12, dtype=np.int64))
+
+
+# (scenario, indexes its plans must use, budget of shared buffers per
+# statement, whether it may read partitions sequentially). Budgets are about
+# twice what the plans touch at PLAN_CALLS calls.
+SCENARIOS = [
+    (_list_by_agent, {"ix_calls_agent_id_start_time"}, 1200, False),
+    (_list_by_agent_and_sentiment, {"ix_calls_agent_id_start_time"}, 800, False),
+    (_list_recent, {"ix_calls_start_time"}, 400, False),
+    (_call_detail, {"calls_pkey", "call_transcripts_pkey"}, 100, False),
+    (
+        _filtered_recommendations,
+        {"ix_calls_agent_id_start_time", "ix_calls_start_time"},
+        1200,
+        False,
+    ),
+    # Unfiltered, the candidates are the first 1000 embedded calls found
+    (_recommendations, {"calls_pkey"}, 400, True),
+    # A fortieth of the table: at this size, joining the transcripts by
+    # scanning them is as cheap as probing them
+    (_export_by_agent, {"ix_calls_agent_id_start_time"}, 12000, True),
+    (
+        _agent_analytics,
+        {"ix_agent_daily_rollups_day", "agent_daily_rollups_pkey"},
+        600,
+        False,
+    ),
+    (
+        _populator_stale_calls,
+        {"ix_calls_insights_pending", "ix_calls_insights_model"},
+        2000,
+        False,
+    ),
+    # Catch-up batches look calls up by call_id alone, a probe of every
+    # partition per call; for hundreds of calls a scan is cheaper, and the
+    # duplicate reset pays the probes (the loader's batches are small)
+    (
+        _populator_fingerprints,
+        {"ix_calls_unfingerprinted", "ix_calls_lsh_bands"},
+        60000,
+        True,
+    ),
+    (
+        _loader_duplicates,
+        {"ix_calls_lsh_bands", "calls_pkey", "ix_calls_start_time"},
+        4000,
+        False,
+    ),
+    (_populator_phrases, {"ix_calls_phrases_pending"}, 9000, True),
+    (_populator_topics, {"ix_calls_topic_cluster"}, 500, False),
+]
+
+
+@pytest.mark.parametrize(
+    "scenario, indexes, budget, seq_scans",
+    SCENARIOS,
+    ids=[s[0].__name__.lstrip("_") for s in SCENARIOS],
+)
+def test_query_plans(plans, parent_index, scenario, indexes, budget, seq_scans):
+    session, client, capture = plans
+    scenario(session, client, capture)
+    assert capture.plans, "scenario ran no queries"
+
+    used = set()
+    for statement, plan in capture.plans.items():
+        nodes = list(_nodes(plan))
+        used.update(
+            parent_index.get(n["Index Name"], n["Index Name"])
+            for n in nodes
+            if "Index Name" in n
+        )
+        scanned = [
+            n["Relation Name"]
+            for n in nodes
+            if n["Node Type"] == "Seq Scan" and PARTITION_RE.match(n["Relation Name"])
+            # Empty partitions (the months ahead) cost nothing
+            and _buffers(n)
+        ]
+        assert seq_scans or not scanned, f"seq scan on {scanned}:\n{statement}"
+        assert (
+            _buffers(plan) <= budget
+        ), f"{_buffers(plan)} shared buffers > {budget}:\n{statement}"
+    assert indexes <= used, f"{sorted(indexes - used)} not used"
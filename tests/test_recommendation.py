@@ -1,3 +1,6 @@
+import pytest
+
+
 def _find_with_embedding(client):
     data = client.get("/api/v1/calls?limit=50").json()
     for it in data["items"]:
@@ -16,3 +19,141 @@ def test_recommendations_ok(client):
     assert data["base_call_id"] == call_id
     assert 0 <= len(data["recommendations"]) <= 5
     assert 1 <= len(data["coaching_nudges"]) <= 3
+
+
+def test_recommendations_from_preloaded_index(client, db_session):
+    from app.core.embedding_index import EmbeddingIndex, set_index
+
+    call_id = _find_with_embedding(client)
+    set_index(EmbeddingIndex.from_db(db_session))
+    try:
+        resp = client.get(f"/api/v1/calls/{call_id}/recommendations")
+    finally:
+        set_index(None)
+    assert resp.status_code == 200
+    recs = resp.json()["recommendations"]
+    assert 1 <= len(recs) <= 5
+    assert call_id not in {r["call_id"] for r in recs}
+    sims = [r["similarity"] for r in recs]
+    assert sims == sorted(sims, reverse=True)
+
+
+def test_recommendations_batch(client, db_session):
+    from app.core.embedding_index import EmbeddingIndex, set_index
+    from app.models.call import Call
+
+    embedded = [
+        str(c.call_id)
+        for c in db_session.query(Call).filter(Call.embedding.isnot(None)).limit(3)
+    ]
+    unembedded = db_session.query(Call).filter(Call.embedding.is_(None)).first()
+    call_ids = embedded + ["does-not-exist"]
+    if unembedded is not None:
+        call_ids.append(str(unembedded.call_id))
+
+    single = {
+        cid: client.get(f"/api/v1/calls/{cid}/recommendations").json()
+        for cid in embedded
+    }
+    set_index(EmbeddingIndex.from_db(db_session))
+    try:
+        resp = client.post(
+            "/api/v1/recommendations:batch", json={"call_ids": call_ids, "k": 5}
+        )
+    finally:
+        set_index(None)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [it["base_call_id"] for it in data["items"]] == embedded
+    assert set(data["missing"]) == set(call_ids) - set(embedded)
+    for it in data["items"]:
+        assert it["base_call_id"] not in {r["call_id"] for r in it["recommendations"]}
+        assert 1 <= len(it["coaching_nudges"]) <= 3
+        # Same nudges as the single-call endpoint
+        assert it["coaching_nudges"] == single[it["base_call_id"]]["coaching_nudges"]
+
+
+def test_recommendations_batch_validates_size(client):
+    resp = client.post("/api/v1/recommendations:batch", json={"call_ids": []})
+    assert resp.status_code == 422
+
+
+def test_filtered_recommendations_match_with_and_without_index(client, db_session):
+    from app.core.embedding_index import EmbeddingIndex, set_index
+    from app.models.call import Call
+
+    call_id = _find_with_embedding(client)
+    params = {"exclude_agent_id": ["A2"], "min_sentiment": 0.0, "language": "English"}
+    url = f"/api/v1/calls/{call_id}/recommendations"
+
+    from_db = client.get(url, params=params).json()["recommendations"]
+    set_index(EmbeddingIndex.from_db(db_session))
+    try:
+        from_index = client.get(url, params=params).json()["recommendations"]
+    finally:
+        set_index(None)
+
+    # Seeded embeddings repeat across tests, so compare scores, not tied ids
+    assert [r["similarity"] for r in from_index] == pytest.approx(
+        [r["similarity"] for r in from_db], abs=1e-5
+    )
+    ids = [r["call_id"] for r in from_index + from_db]
+    for c in db_session.query(Call).filter(Call.call_id.in_(ids)):
+        assert c.agent_id != "A2"
+        assert c.customer_sentiment_score >= 0.0
+
+
+def test_naive_date_bounds_are_utc_with_and_without_index(client, db_session):
+    from datetime import datetime, timedelta
+
+    from sqlalchemy import text
+
+    from app.core.embedding_index import EmbeddingIndex, set_index
+
+    # Postgres would read a naive bound in the session's time zone
+    db_session.execute(text("SET TIME ZONE 'America/New_York'"))
+    call_id = _find_with_embedding(client)
+    since = (datetime.utcnow() - timedelta(minutes=25)).isoformat()
+    url = f"/api/v1/calls/{call_id}/recommendations"
+
+    from_db = client.get(url, params={"from_date": since}).json()["recommendations"]
+    set_index(EmbeddingIndex.from_db(db_session))
+    try:
+        from_index = client.get(url, params={"from_date": since}).json()
+    finally:
+        set_index(None)
+
+    # The calls seeded 20 and 5 minutes ago are in range on both paths
+    assert from_db
+    assert [r["similarity"] for r in from_index["recommendations"]] == pytest.approx(
+        [r["similarity"] for r in from_db], abs=1e-5
+    )
+    bad = client.get(url, params={"from_date": "yesterday"})
+    assert bad.status_code == 422
+
+
+def test_index_mask_treats_unknown_values_like_null():
+    import numpy as np
+
+    from app.core.embedding_index import EmbeddingIndex
+
+    index = EmbeddingIndex(
+        np.asarray(["c", "a", "b"]),
+        EmbeddingIndex.normalize(np.eye(3, dtype=np.float32)),
+        agent_ids=["A2", "A1", None],
+        languages=["English", "English", "Spanish"],
+        start_ts=np.asarray([300.0, 100.0, np.nan]),
+        sentiment=np.asarray([0.5, np.nan, -0.2]),
+    )
+    # Rows are sorted by call_id: a, b, c
+    assert index.mask() is None
+    assert index.mask(agent_ids=["A1", "nobody"]).tolist() == [True, False, False]
+    assert index.mask(exclude_agent_ids=["A1"]).tolist() == [False, True, True]
+    assert index.mask(languages=["Spanish"]).tolist() == [False, True, False]
+    assert index.mask(from_ts=200.0).tolist() == [False, False, True]
+    assert index.mask(max_sentiment=0.0).tolist() == [False, True, False]
+
+    mask = index.mask(exclude_agent_ids=["A2"])
+    assert [cid for cid, _ in index.top_k(np.ones(3), 5, exclude="a", mask=mask)] == [
+        "b"
+    ]
@@ -0,0 +1,41 @@
+from sqlalchemy import text
+
+from app.core import scheduler
+
+
+def _lock_free(db_engine) -> bool:
+    # Probe from another session, releasing the lock again if it was free
+    with db_engine.connect() as conn:
+        key = {"key": scheduler.SCHEDULER_LOCK_KEY}
+        free = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), key).scalar()
+        if free:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), key)
+        return bool(free)
+
+
+def test_one_leader_across_connections(db_engine, monkeypatch):
+    monkeypatch.setattr(scheduler, "engine", db_engine)
+    monkeypatch.setattr(scheduler, "_lock_conn", None)
+    try:
+        assert scheduler._acquire_leader_lock()
+        # Confirming the lock it already holds succeeds
+        assert scheduler._acquire_leader_lock()
+        assert not _lock_free(db_engine)
+
+        # Another process (its own connection) loses the election
+        leader_conn = scheduler._lock_conn
+        scheduler._lock_conn = None
+        assert not scheduler._acquire_leader_lock()
+        assert scheduler._lock_conn is None
+        scheduler._lock_conn = leader_conn
+
+        # The leader's connection dies: the lock is freed, and the leader
+        # reconnects and takes it back before its next job
+        pid = leader_conn.execute(text("SELECT pg_backend_pid()")).scalar()
+        with db_engine.connect() as conn:
+            conn.execute(text("SELECT pg_terminate_backend(:pid, 5000)"), {"pid": pid})
+        assert scheduler._acquire_leader_lock()
+        assert scheduler._lock_conn is not leader_conn
+    finally:
+        scheduler._release_leader_lock()
+    assert _lock_free(db_engine)
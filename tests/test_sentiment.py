@@ -0,0 +1,40 @@
+from app.core.sentiment import build_timeline, overall_score, split_windows
+
+
+def test_windows_cover_the_text_and_end_on_word_boundaries():
+    text = " ".join(f"word{i:03d}" for i in range(300))
+    spans = split_windows(text, size=100, stride=75)
+
+    assert spans[0][0] == 0
+    assert spans[-1][1] == len(text)
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert end - start <= 100
+        # Cut at a space, never inside a word, and neighbours overlap
+        assert text[end] == " "
+        assert next_start < end
+        assert text[next_start - 1] == " "
+    words = [w for s, e in spans for w in text[s:e].split()]
+    assert all(len(w) == 7 for w in words)
+
+
+def test_short_and_whitespace_only_text():
+    assert split_windows("") == []
+    assert split_windows(" \n\t  ") == []
+    assert split_windows("Hello there.") == [(0, 12)]
+
+    # A window of nothing but whitespace is skipped; the text after it is not
+    text = "a" * 40 + " " * 200 + "b" * 40
+    spans = split_windows(text, size=100, stride=100)
+    assert all(text[s:e].strip() for s, e in spans)
+    assert any(nxt[0] > prev[1] for prev, nxt in zip(spans, spans[1:]))
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert "".join(text[s:e] for s, e in spans).count("b") == 40
+
+
+def test_overall_score_is_length_weighted():
+    assert overall_score([]) is None
+    timeline = build_timeline([(0, 300), (300, 400)], [0.5, -0.91234])
+    assert timeline == [[0, 300, 0.5], [300, 400, -0.9123]]
+    assert overall_score(timeline) == (300 * 0.5 + 100 * -0.9123) / 400
+    # Zero-length segments still count, with weight 1
+    assert overall_score([[5, 5, 0.2]]) == 0.2
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.core import embedding_index, snapshot
+from app.core.embedding_index import EmbeddingIndex, get_index, set_index
+
+
+def _index(n: int, seed: int) -> EmbeddingIndex:
+    rng = np.random.default_rng(seed)
+    return EmbeddingIndex(
+        np.asarray([f"call-{seed}-{i:03d}" for i in range(n)]),
+        EmbeddingIndex.normalize(rng.random((n, 8), dtype=np.float32)),
+        agent_ids=[["A1", "A2", None][i % 3] for i in range(n)],
+        languages=["English"] * n,
+        start_ts=np.arange(n, dtype=np.float64),
+        sentiment=np.linspace(-1, 1, n).astype(np.float32),
+    )
+
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(embedding_index, "SNAPSHOT_CHECK_SECONDS", 0.0)
+    set_index(None)
+    yield tmp_path
+    set_index(None)
+
+
+def test_snapshot_round_trips_as_read_only_memory_maps(snapshots):
+    built = _index(50, seed=1)
+    generation = snapshot.publish_snapshot(built, meta={"insights_model": "m"})
+    assert snapshot.current_generation() == generation
+    assert not [p for p in os.listdir(snapshots) if p.startswith(".")]
+
+    mapped = snapshot.load_snapshot()
+    assert mapped.generation == generation
+    assert isinstance(mapped.vectors, np.memmap)
+    assert isinstance(mapped.call_ids, np.memmap)
+    assert not mapped.vectors.flags.writeable
+    assert mapped.vectors.dtype == np.float32 and mapped.vectors.shape == (50, 8)
+    np.testing.assert_array_equal(mapped.call_ids, built.call_ids)
+
+    query = built.vectors[7]
+    mask = built.mask(agent_ids=["A2"], min_sentiment=-0.5)
+    assert mapped.top_k(
+        query, 5, mask=mapped.mask(agent_ids=["A2"], min_sentiment=-0.5)
+    ) == built.top_k(query, 5, mask=mask)
+
+
+def test_get_index_hot_reloads_new_generations_and_prunes_old(snapshots, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_KEEP", 2)
+    assert get_index() is None
+
+    first = snapshot.publish_snapshot(_index(10, seed=1))
+    current = get_index()
+    assert current is not None and current.generation == first
+
+    # A publish that died half way is never picked up
+    os.makedirs(snapshots / ".tmp-half-written")
+    second = snapshot.publish_snapshot(_index(20, seed=2))
+    reloaded = get_index()
+    assert reloaded.generation == second and len(reloaded) == 20
+    # Requests still holding the old index keep a working mapping
+    assert len(current.top_k(current.vectors[0], 3)) == 3
+
+    third = snapshot.publish_snapshot(_index(30, seed=3))
+    assert get_index().generation == third
+    left = {p for p in os.listdir(snapshots) if not p.startswith(".")}
+    assert left == {"CURRENT", second, third}
+    assert len(current.top_k(current.vectors[0], 3)) == 3
+
+
+def test_pinned_index_and_broken_snapshots_are_left_alone(snapshots):
+    snapshot.publish_snapshot(_index(10, seed=1))
+    pinned = _index(5, seed=9)
+    set_index(pinned)
+    assert get_index() is pinned
+
+    set_index(None)
+    good = get_index()
+    # CURRENT naming a generation that isn't there: keep serving the old one
+    (snapshots / "CURRENT").write_text("20990101T000000000000Z")
+    assert get_index() is good
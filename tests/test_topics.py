@@ -0,0 +1,130 @@
+import numpy as np
+
+from app.core.topics import (
+    TOPIC_INIT_PASSES,
+    fit,
+    minibatch_step,
+    normalize,
+    top_terms,
+    update_topics,
+)
+from app.models.call import Call
+from app.models.topic import TopicCluster
+
+
+def _blobs(rng, centers, n):
+    points = np.repeat(centers, n, axis=0) + rng.normal(0, 0.05, (len(centers) * n, 16))
+    return normalize(points), np.repeat(np.arange(len(centers)), n)
+
+
+def test_minibatch_kmeans_recovers_blobs_and_updates_incrementally():
+    rng = np.random.default_rng(7)
+    centers = normalize(rng.normal(size=(3, 16)))
+    vectors, truth = _blobs(rng, centers, 200)
+
+    centroids, seen = fit(vectors, 3, rng, passes=3, batch_rows=64)
+    labels = (vectors @ centroids.T).argmax(axis=1)
+    # Every true blob maps onto exactly one cluster
+    assert {len(set(labels[truth == b])) for b in range(3)} == {1}
+    assert len(set(labels)) == 3
+
+    before = centroids.copy()
+    batch, _ = _blobs(rng, centers[:1], 10)
+    minibatch_step(centroids, seen, batch)
+    moved = np.abs(centroids - before).max(axis=1) > 0
+    assert moved.sum() == 1
+    assert seen.sum() == 3 * 3 * 200 + 10
+
+
+def test_top_terms_prefer_cluster_specific_words():
+    terms = top_terms(
+        {
+            0: ["**Customer:** my refund for the invoice", "refund invoice please"],
+            1: ["**Customer:** the app keeps crashing", "app crashing after update"],
+        },
+        n=2,
+    )
+    assert set(terms[0]) == {"refund", "invoice"}
+    assert set(terms[1]) == {"app", "crashing"}
+
+
+def test_topics_endpoint_from_precomputed_tables(client, db_session):
+    stats = update_topics(db_session, n_clusters=2, refit=True)
+    db_session.commit()
+    embedded = db_session.query(Call).filter(Call.embedding.isnot(None)).count()
+    assert stats == {"clusters": 2, "assigned": embedded, "fitted": True}
+    # Every call was in the fit sample: assigning it doesn't count it again
+    seen = db_session.query(TopicCluster.points_seen).all()
+    assert sum(n for (n,) in seen) == TOPIC_INIT_PASSES * embedded
+
+    data = client.get("/api/v1/analytics/topics").json()
+    assert sum(t["size"] for t in data["items"]) == embedded
+    for topic in data["items"]:
+        assert sum(a["total_calls"] for a in topic["agents"]) == topic["size"]
+        assert 1 <= len(topic["representative_call_ids"]) <= 5
+        assert topic["top_terms"]
+
+    # A newly embedded call is folded in without refitting
+    new = db_session.query(Call).filter(Call.embedding.is_(None)).first()
+    new.embedding = [0.1] * 384
+    db_session.commit()
+    assert update_topics(db_session)["fitted"] is False
+    db_session.commit()
+    assert new.topic_cluster is not None
+
+    a3 = client.get("/api/v1/analytics/topics", params={"agent_id": "A3"}).json()
+    assert a3["items"]
+    assert all(a["agent_id"] == "A3" for t in a3["items"] for a in t["agents"])
+
+
+def test_incremental_run_refreshes_only_what_it_touched(db_session, monkeypatch):
+    from app.core import topics
+    from app.models.topic import AgentTopicStat
+
+    update_topics(db_session, n_clusters=3, refit=True)
+    db_session.commit()
+    before = {
+        t.cluster_id: (list(t.centroid), t.points_seen, t.top_terms)
+        for t in db_session.query(TopicCluster)
+    }
+
+    scanned = []
+    nearest = topics._nearest_calls
+
+    def spy(session, centroids, keep, clusters=None):
+        scanned.append(clusters)
+        return nearest(session, centroids, keep, clusters)
+
+    monkeypatch.setattr(topics, "_nearest_calls", spy)
+
+    # Re-scored and re-embedded: the populator clears its cluster
+    call = (
+        db_session.query(Call)
+        .filter(Call.embedding.isnot(None), Call.agent_id.isnot(None))
+        .first()
+    )
+    call.topic_cluster = None
+    call.customer_sentiment_score = 0.123
+    db_session.commit()
+    assert update_topics(db_session) == {"clusters": 3, "assigned": 1, "fitted": False}
+    db_session.commit()
+
+    assert scanned == [{call.topic_cluster}]
+    for t in db_session.query(TopicCluster):
+        if t.cluster_id != call.topic_cluster:
+            assert (list(t.centroid), t.points_seen, t.top_terms) == before[
+                t.cluster_id
+            ]
+
+    def agent_stats():
+        db_session.expire_all()
+        return sorted(
+            (s.cluster_id, s.agent_id, s.call_count, s.sentiment_count)
+            + (round(s.sentiment_sum, 6),)
+            for s in db_session.query(AgentTopicStat)
+        )
+
+    incremental = agent_stats()
+    topics.refresh_agent_topic_stats(db_session)
+    assert agent_stats() == incremental
+    db_session.rollback()
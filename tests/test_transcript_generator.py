@@ -0,0 +1,133 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scripts import synthetic_transcript_generator as gen
+
+
+class StubLLM:
+    """
+    Local stand-in for the chat completions API: every 5th request gets a
+    429, every 7th a 500, and the peak number of requests in flight is kept.
+    """
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.requests += 1
+                    n = stub.requests
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    if n % 5 == 0:
+                        self._reply(429, {"error": "slow down"}, {"Retry-After": "0"})
+                    elif n % 7 == 0:
+                        self._reply(500, {"error": "boom"})
+                    else:
+                        prompt = body["messages"][0]["content"]
+                        content = f"**Agent:** Hello\n**Customer:** {prompt[-20:]}"
+                        self._reply(
+                            200, {"choices": [{"message": {"content": content}}]}
+                        )
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def _reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(gen, "BACKOFF_BASE", 0.01)
+    server = StubLLM()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def _run(path, stub, n=30, concurrency=4):
+    return asyncio.run(
+        gen.generate_synthetic_transcripts(
+            n,
+            seed=7,
+            path=str(path),
+            concurrency=concurrency,
+            tokens_per_minute=10**9,
+            api_base=stub.url,
+            api_key="test",
+        )
+    )
+
+
+def _ids(path):
+    return [json.loads(line)["call_id"] for line in path.read_text().splitlines()]
+
+
+def test_generates_concurrently_within_the_limit_and_retries(stub, tmp_path):
+    out = tmp_path / "transcripts.jsonl"
+    stats = _run(out, stub)
+
+    assert stats == {"written": 30, "skipped": 0, "failed": 0}
+    ids = _ids(out)
+    assert sorted(ids) == sorted(c["call_id"] for c in gen.plan_calls(30, 7))
+    # Injected 429s and 500s were retried, never more than 4 in flight
+    assert stub.requests > 30
+    assert 1 < stub.max_in_flight <= 4
+
+
+def test_rerun_resumes_after_a_torn_last_line(stub, tmp_path):
+    out = tmp_path / "transcripts.jsonl"
+    _run(out, stub, n=10)
+    lines = out.read_text().splitlines(keepends=True)
+    # Keep six complete lines and half of the seventh, as after a crash
+    out.write_text("".join(lines[:6]) + lines[6][:15])
+    before = stub.requests
+
+    stats = _run(out, stub, n=10)
+    assert stats["skipped"] == 6 and stats["written"] == 4
+    ids = _ids(out)
+    assert len(ids) == len(set(ids)) == 10
+    # Only the four missing calls were asked for (plus their retries)
+    assert stub.requests - before < 10
+
+
+def test_malformed_line_in_the_middle_is_skipped_not_truncated(stub, tmp_path, capsys):
+    out = tmp_path / "transcripts.jsonl"
+    _run(out, stub, n=10)
+    lines = out.read_text().splitlines(keepends=True)
+    out.write_text("".join(lines[:3]) + "{not json\n" + "".join(lines[3:]))
+
+    done = gen.completed_call_ids(str(out))
+    assert len(done) == 10
+    assert "malformed line 4" in capsys.readouterr().out
+    # Nothing after the bad line was lost
+    assert out.read_text().count("\n") == 11
@@ -21,3 +21,20 @@ def test_ws_sentiment_stream(client):
         assert -1.0 <= msg1["sentiment"] <= 1.0
         assert "ts" in msg1
         assert msg2["call_id"] == call_id
+
+
+@pytest.mark.timeout(10)
+def test_ws_sentiment_replays_timeline(client):
+    call_id = None
+    for it in client.get("/api/v1/calls?limit=50").json()["items"]:
+        detail = client.get(f"/api/v1/calls/{it['call_id']}").json()
+        if detail["sentiment_timeline"]:
+            call_id, timeline = it["call_id"], detail["sentiment_timeline"]
+            break
+    assert call_id is not None
+
+    with client.websocket_connect(f"/ws/sentiment/{call_id}") as ws:
+        msg = json.loads(ws.receive_text())
+        assert msg["segment"] == 0
+        assert msg["sentiment"] == timeline[0][2]
+        assert msg["span"] == timeline[0][:2]
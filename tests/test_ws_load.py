@@ -0,0 +1,66 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from app.api.v1 import ws
+from main import app
+from scripts.ws_load_test import run_load_test
+
+
+@pytest.fixture
+def live_server(client, monkeypatch):
+    # Short streams: 8 frames, 20 ms apart
+    monkeypatch.setattr(ws, "STREAM_INTERVAL", 0.02)
+    monkeypatch.setattr(ws, "STREAM_TICKS", 8)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(
+            app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"
+        )
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(timeout=10)
+
+
+@pytest.mark.timeout(60)
+def test_load_harness_reports_streams_drops_and_server_cost(live_server):
+    report = asyncio.run(
+        run_load_test(
+            live_server,
+            clients=40,
+            ramp=0.2,
+            drop=0.25,
+            drop_after=2,
+            sample_every=0.05,
+            label="baseline",
+        )
+    )
+
+    assert report["label"] == "baseline"
+    clients = report["clients"]
+    assert clients["connected"] == 40
+    assert clients["closed_normal"] == 30 and clients["dropped"] == 10
+    assert report["frames"] == 30 * 8 + 10 * 2
+    assert report["inter_frame_ms"]["count"] == 30 * 7 + 10
+    assert report["jitter_ms"]["p50"] >= 0 and report["connect_ms"]["count"] == 40
+
+    server = report["server"]
+    # Every stream the harness opened was seen by the server, and every
+    # dropped viewer was noticed and cleaned up
+    assert server["streams"]["opened"] == 40
+    assert server["streams"]["completed"] == 30
+    assert server["streams"]["disconnected"] == 10
+    assert server["peak"]["streams"] >= 1
+    assert server["baseline"]["fds"] > 0 and server["samples"]